@@ -1,8 +1,9 @@
-from typing import List
+import numpy as np
 from openai import OpenAI
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
 from app.core.config import settings
+from app.services.vectors import embed_texts
 
 # Model i batch parametri
 EMBED_MODEL = "text-embedding-3-small"  # 1536 dimenzija, idealno za tvoju bazu
@@ -23,17 +24,17 @@ class EmbeddingAgent(BaseAgent):
         # Dodaj "instruct" prefiks radi stabilnijeg embeddinga
         texts = [f"search_document: {t}" for t in texts]
 
-        embeddings: List[List[float]] = []
+        # Jedna (n, dim) float32 matrica; batch-evi se upisuju direktno u nju
+        embeddings: np.ndarray | None = None
         for i in range(0, len(texts), BATCH_SIZE):
             batch = texts[i:i + BATCH_SIZE]
             try:
-                resp = self.client.embeddings.create(
-                    model=EMBED_MODEL,
-                    input=batch
-                )
-                embeddings.extend([d.embedding for d in resp.data])
+                batch_matrix = embed_texts(self.client, batch, EMBED_MODEL)
             except Exception as e:
                 raise Exception(f"Embedding batch failed at {i}: {e}")
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch_matrix.shape[1]), dtype=np.float32)
+            embeddings[i:i + len(batch_matrix)] = batch_matrix
 
         if len(embeddings) != len(texts):
             raise Exception(f"Embedding count mismatch: {len(embeddings)} vs {len(texts)}")
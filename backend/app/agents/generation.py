@@ -1,6 +1,6 @@
 from typing import Any, Dict
 from app.core.config import settings
-from app.services.prompting import build_answer_prompt
+from app.services.prompting import pack_answer_prompt
 from app.services.llm_client import llm_complete
 
 
@@ -21,7 +21,9 @@ class GenerationAgent:
             Ažurirani kontekst sa 'answer' stringom
         """
         chunks = ctx.get("retrieval", {}).get("hits", [])
-        prompt = build_answer_prompt(user_query=ctx["query"], chunks=chunks)
+        prompt, packed = pack_answer_prompt(user_query=ctx["query"], chunks=chunks)
+        # Koliko je konteksta stvarno ušlo u prompt (tokeni, odbačeni chunk-ovi)
+        ctx["context_usage"] = packed.usage()
         out = llm_complete(prompt, model=settings.CHAT_MODEL, n=1)[0]
         ctx["answer"] = (out or "").strip()
         return ctx
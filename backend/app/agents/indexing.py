@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
-from app.models.chunk import DocumentChunk
+from app.services.chunk_store import insert_chunks
+from app.services.vectors import stack_embeddings
 import uuid
 
 
@@ -19,18 +20,23 @@ class IndexingAgent(BaseAgent):
         if len(embeddings) != len(context.chunks):
             raise Exception("Mismatch between chunks and embeddings count")
         
-        indexed_count = 0
+        owner_id = uuid.UUID(context.owner_id) if context.owner_id else None
+        embeddings = stack_embeddings(embeddings)
         
-        for idx, (chunk_text, embedding) in enumerate(zip(context.chunks, embeddings)):
-            chunk = DocumentChunk(
-                document_id=uuid.UUID(context.document_id),
-                chunk_index=idx,
-                content=chunk_text,
-                embedding=embedding,
-                chunk_metadata={}
-            )
-            self.db.add(chunk)
-            indexed_count += 1
+        rows = [
+            {
+                "document_id": context.document_id,
+                "owner_id": owner_id,
+                "chunk_index": idx,
+                "content": chunk_text,
+                # filename ulazi u search_vector sa težinom A
+                "metadata": {"filename": context.filename},
+                "embedding": embeddings[idx],
+            }
+            for idx, chunk_text in enumerate(context.chunks)
+        ]
+        insert_chunks(self.db, rows)
+        indexed_count = len(rows)
         
         self.db.commit()
         
@@ -1,4 +1,5 @@
 from .extract import ExtractAgent
+from .analysis import AnalysisAgent
 from .structure import StructureAgent
 from .meta import MetaAgent
 from .table import TableAgent
@@ -9,6 +10,7 @@ from .dag import IngestDAG
 
 __all__ = [
     "ExtractAgent",
+    "AnalysisAgent",
     "StructureAgent",
     "MetaAgent",
     "TableAgent",
@@ -0,0 +1,218 @@
+from typing import List, Dict, Any, Optional, Tuple
+from .base import IngestAgent
+from .llm import chat_json
+from .types import IngestContext, DocumentAnalysis, DocumentSegment, ExtractedEntity, TableData, TextBlock
+from app.core.config import settings
+
+try:
+    from app.services.llm_client import get_async_llm_client
+except ImportError:
+    get_async_llm_client = None
+
+
+# Za strukturu je dovoljan početak bloka; ostatak bi samo trošio ulazne tokene
+BLOCK_PREVIEW_CHARS = 300
+TABLE_PREVIEW_ROWS = 5
+
+SEGMENT_TYPES = {"heading", "section", "paragraph", "list", "table"}
+
+
+def _as_int(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _as_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def block_preview(block: TextBlock) -> str:
+    """Tekst bloka u jednom redu, skraćen na BLOCK_PREVIEW_CHARS"""
+    text = " ".join(block.text.split())
+    if len(text) > BLOCK_PREVIEW_CHARS:
+        text = text[:BLOCK_PREVIEW_CHARS] + " ..."
+    return text
+
+
+def parse_structure(items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """LLM "structure" lista -> {indeks bloka: anotacija}"""
+    annotations: Dict[int, Dict[str, Any]] = {}
+    for item in items:
+        if isinstance(item, dict):
+            annotations[_as_int(item.get("block"), -1)] = item
+    return annotations
+
+
+def build_segments(
+    annotations: Dict[int, Dict[str, Any]],
+    blocks: List[TextBlock],
+    start: int,
+    end: int,
+    source: str
+) -> List[DocumentSegment]:
+    """Segment po bloku blocks[start:end]; tekst dolazi iz bloka, LLM daje samo tip i nivo"""
+    segments = []
+    for idx in range(start, end):
+        block = blocks[idx]
+        item = annotations.get(idx, {})
+        segment_type = item.get("type")
+        if segment_type not in SEGMENT_TYPES:
+            segment_type = "table" if block.block_type == "table" else "paragraph"
+        level = min(max(_as_int(item.get("level")), 0), 3) if segment_type == "heading" else 0
+        if segment_type == "heading" and level == 0:
+            level = 1
+        segments.append(DocumentSegment(
+            text=block.text,
+            segment_type=segment_type,
+            level=level,
+            metadata={"source": source, "block_type": block.block_type}
+        ))
+    return segments
+
+
+class AnalysisAgent(IngestAgent):
+    """
+    AnalysisAgent - Jedan structured-output LLM poziv po dokumentu umjesto
+    zasebnih poziva u StructureAgent, MetaAgent i TableAgent.
+    Vraća strukturu (po indeksu bloka, bez ponavljanja teksta), tip dokumenta,
+    jezik, ključne riječi, entitete i ispravke header-a tabela u context.analysis.
+    Agenti koji ga navode kao opcionalnu zavisnost koriste rezultat ako postoji.
+    """
+
+    def __init__(self, max_chars: int = settings.INGEST_ANALYSIS_CHARS):
+        super().__init__("AnalysisAgent", dependencies=["ExtractAgent"])
+        self.max_chars = max_chars
+        self.llm_available = bool(settings.OPENAI_API_KEY) and get_async_llm_client is not None
+
+    def should_execute(self, context: IngestContext) -> bool:
+        return self.llm_available and bool(context.blocks or context.raw_text)
+
+    async def process(self, context: IngestContext):
+        """Jedan LLM poziv za cijelu analizu dokumenta"""
+        llm = get_async_llm_client()
+        if llm is None:
+            return
+
+        blocks_text, covered = self._blocks_preview(context)
+        tables_text, table_indices = self._tables_preview(context)
+
+        prompt = f"""Analiziraj dokument "{context.filename}". Blokovi teksta su numerisani ([broj]), dugi blokovi su skraćeni.
+
+{blocks_text}
+{tables_text}
+Odgovori sa JSON:
+{{
+  "doc_type": "invoice|contract|report|email|memo|letter|policy|manual|other",
+  "confidence": 0.0-1.0,
+  "language": "bos|eng|other",
+  "keywords": ["ključna", "riječ", "..."],
+  "structure": [
+    {{"block": 0, "type": "heading|section|list|table", "level": 0-3}}
+  ],
+  "entities": [
+    {{"text": "...", "type": "PERSON|ORG|DATE|MONEY|LOCATION|ID|OTHER"}}
+  ],
+  "tables": [
+    {{"index": 0, "headers": ["Poboljšan Naziv 1", "..."], "column_types": ["text|number|date|currency|boolean", "..."], "description": "Šta ova tabela predstavlja"}}
+  ]
+}}
+
+Pravila:
+- structure navodi samo blokove koji nisu obični paragrafi; nivo naslova 1=glavni, 2=podnaslov, 3=sekcija
+- entities: imena, kompanije, datumi, novčani iznosi, lokacije, šifre/brojevi dokumenata
+- tables: jasni nazivi kolona na bosanskom jeziku, isti broj kolona kao original"""
+
+        try:
+            data = await chat_json(llm, prompt, temperature=0.2, max_tokens=2000, json_mode=True)
+        except Exception as e:
+            # Bez analize agenti rade kao ranije (vlastiti LLM pozivi ili heuristike)
+            context.add_error(f"LLM analiza dokumenta greška: {str(e) or type(e).__name__}")
+            return
+
+        context.analysis = DocumentAnalysis(
+            segments=build_segments(parse_structure(data.get("structure") or []), context.blocks, 0, covered, "analysis"),
+            blocks_covered=covered,
+            doc_type=data.get("doc_type") or "other",
+            doc_type_confidence=_as_float(data.get("confidence")),
+            language=data.get("language") or "unknown",
+            keywords=[str(k) for k in data.get("keywords") or []],
+            entities=self._parse_entities(data.get("entities") or []),
+            tables=self._parse_tables(data.get("tables") or [], table_indices, context.tables)
+        )
+
+        context.set_metric("analysis_blocks_covered", covered)
+        context.set_metric("analysis_prompt_chars", len(prompt))
+
+    def _blocks_preview(self, context: IngestContext) -> Tuple[str, int]:
+        """Numerisani pregledi blokova do budžeta; vraća (tekst, broj pokrivenih blokova)"""
+        if not context.blocks:
+            return context.raw_text[:self.max_chars], 0
+
+        lines = []
+        used = 0
+        for idx, block in enumerate(context.blocks):
+            line = f"[{idx}] {block_preview(block)}"
+            if lines and used + len(line) > self.max_chars:
+                break
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines), len(lines)
+
+    def _tables_preview(self, context: IngestContext) -> Tuple[str, List[int]]:
+        """Pregled tabela sa više od 2 reda (kao TableAgent LLM mode)"""
+        parts = []
+        indices = []
+        for idx, table in enumerate(context.tables):
+            if len(table.rows) <= 2:
+                continue
+            rows = [" | ".join(table.headers)]
+            rows.extend(" | ".join(str(cell) for cell in row) for row in table.rows[:TABLE_PREVIEW_ROWS])
+            parts.append(f"Tabela {idx}:\n" + "\n".join(rows))
+            indices.append(idx)
+        if not parts:
+            return "", indices
+        return "\nTabele:\n\n" + "\n\n".join(parts) + "\n", indices
+
+    def _parse_entities(self, items: List[Dict[str, Any]]) -> List[ExtractedEntity]:
+        entities = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get("text"):
+                continue
+            entities.append(ExtractedEntity(
+                text=str(item["text"]),
+                entity_type=item.get("type") or "OTHER",
+                start=0,  # LLM doesn't provide exact position
+                end=0,
+                confidence=0.8
+            ))
+        return entities
+
+    def _parse_tables(
+        self,
+        items: List[Dict[str, Any]],
+        indices: List[int],
+        tables: List[TableData]
+    ) -> Dict[int, Dict[str, Any]]:
+        """Samo tabele poslane u promptu; header-i se zadržavaju samo uz isti broj kolona"""
+        allowed = set(indices)
+        result: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            idx = _as_int(item.get("index"), -1)
+            if idx not in allowed:
+                continue
+            headers: Optional[List[str]] = item.get("headers")
+            if not isinstance(headers, list) or len(headers) != len(tables[idx].headers):
+                headers = None
+            result[idx] = {
+                "headers": [str(h) for h in headers] if headers else None,
+                "column_types": item.get("column_types") or [],
+                "description": item.get("description") or "",
+            }
+        return result
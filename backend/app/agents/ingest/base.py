@@ -7,9 +7,16 @@ import time
 class IngestAgent(ABC):
     """Bazna klasa za sve ingest agente"""
     
-    def __init__(self, name: str, dependencies: Optional[List[str]] = None):
+    def __init__(
+        self,
+        name: str,
+        dependencies: Optional[List[str]] = None,
+        optional_dependencies: Optional[List[str]] = None
+    ):
         self.name = name
         self.dependencies = dependencies or []
+        # Čekaju se samo ako su registrovani u DAG-u
+        self.optional_dependencies = optional_dependencies or []
     
     async def execute(self, context: IngestContext) -> AgentResult:
         """Izvršava agenta i vraća rezultat"""
@@ -14,19 +14,21 @@ class IngestDAG:
     def add_agent(self, agent: IngestAgent):
         """Dodaj agenta u DAG"""
         self.agents.append(agent)
-        self.dependency_graph[agent.name] = agent.dependencies
+        self.dependency_graph[agent.name] = agent.dependencies + agent.optional_dependencies
     
     async def execute(self, context: IngestContext) -> IngestContext:
         """Izvršava sve agente po dependency order-u"""
         executed = set()
         results = []
+        registered = {agent.name for agent in self.agents}
         
         # Topological sort + execution
         while len(executed) < len(self.agents):
             ready_agents = [
                 agent for agent in self.agents
                 if agent.name not in executed and
-                all(dep in executed for dep in agent.dependencies)
+                all(dep in executed for dep in agent.dependencies) and
+                all(dep in executed for dep in agent.optional_dependencies if dep in registered)
             ]
             
             if not ready_agents:
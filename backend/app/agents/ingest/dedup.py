@@ -1,21 +1,36 @@
 import hashlib
-import re
-from typing import List, Set, Dict
-from collections import defaultdict
+from typing import List, Dict, Optional
+import numpy as np
+from sqlalchemy.orm import Session
 from .base import IngestAgent
+from .lsh import band_hashes, find_duplicate_clusters, optimal_params
+from .minhash import MinHasher, content_key
 from .types import IngestContext, ProcessedChunk
+from app.core.config import settings
+from app.services.dedup_index import find_corpus_duplicates, lsh_schemes
 
 
 class DedupAgent(IngestAgent):
     """
     DedupAgent - Deduplikacija chunk-ova pomoću MinHash i LSH.
-    Pronalazi i označava duplicate/near-duplicate chunks.
+    Pronalazi i označava duplicate/near-duplicate chunks, unutar dokumenta
+    i (uz db) protiv već indeksiranih chunk-ova istog vlasnika.
     """
     
-    def __init__(self, similarity_threshold: float = 0.85, shingle_size: int = 3):
+    def __init__(
+        self,
+        db: Optional[Session] = None,
+        similarity_threshold: float = settings.DEDUP_THRESHOLD,
+        shingle_size: int = 3,
+        num_perm: int = 128
+    ):
         super().__init__("DedupAgent", dependencies=["StructureAgent"])
+        self.db = db
         self.similarity_threshold = similarity_threshold
         self.shingle_size = shingle_size
+        self.minhasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        # Broj bandova/redova optimalan za prag sličnosti
+        self.bands, self.rows = optimal_params(similarity_threshold, num_perm)
     
     async def process(self, context: IngestContext):
         """Deduplicira chunk-ove"""
@@ -23,162 +38,122 @@ class DedupAgent(IngestAgent):
         if not context.chunks:
             return
         
-        # Step 1: Create MinHash signatures for all chunks
-        signatures = []
-        for chunk in context.chunks:
-            signature = self._create_minhash(chunk.text)
-            signatures.append(signature)
-        
-        # Step 2: Find duplicates using LSH
-        duplicates_map = self._lsh_find_duplicates(signatures, context.chunks)
-        
-        # Step 3: Mark duplicates in chunks
+        texts = [chunk.text for chunk in context.chunks]
+        
+        # Step 1: Exact duplikati (128-bit hash normalizovanog teksta) - bez MinHash-a
+        roots = self._exact_duplicates(texts)
+        unique = [idx for idx in range(len(texts)) if idx not in roots]
+        
+        # Step 2: MinHash signature matrica samo za preostale unique chunk-ove
+        signatures = self.minhasher.signatures([texts[idx] for idx in unique])
+        hashes = band_hashes(signatures, self.bands, self.rows)
+        
+        # Step 3: Near-duplicates using LSH ({duplicate_pos: canonical_pos} nad unique)
+        clusters = find_duplicate_clusters(signatures, self.similarity_threshold, self.bands, self.rows, hashes)
+        for position, canonical in clusters.items():
+            roots[unique[position]] = unique[canonical]
+        # Exact duplikat near-duplikata pokazuje na korijen klastera
+        for idx, first in roots.items():
+            roots[idx] = roots.get(first, first)
+        duplicates_map = self._cluster_hashes(roots, context.chunks)
+        
+        # Step 4: Chunk-ovi koji već postoje u korpusu -> link na postojeći chunk
+        found = self._find_corpus_duplicates(signatures, hashes, clusters, context)
+        corpus_map = {unique[position]: chunk_id for position, chunk_id in found.items()}
+        for idx, root in roots.items():
+            if root in corpus_map:
+                corpus_map[idx] = corpus_map[root]
+        
+        # Step 5: Mark duplicates in chunks
+        positions = {idx: position for position, idx in enumerate(unique)}
         dedup_count = 0
         for idx, chunk in enumerate(context.chunks):
-            if idx in duplicates_map:
+            if idx in corpus_map:
+                chunk.is_duplicate = True
+                chunk.deduplicated_with = corpus_map[idx]
+                chunk.metadata["duplicate_of"] = corpus_map[idx]
+                dedup_count += 1
+            elif idx in duplicates_map:
                 chunk.is_duplicate = True
                 chunk.deduplicated_with = duplicates_map[idx]
+                chunk.duplicate_of_index = context.chunks[roots[idx]].chunk_index
                 dedup_count += 1
+            else:
+                # IndexAgent upisuje signature u chunk_minhash/chunk_lsh_bands
+                chunk.signature = signatures[positions[idx]]
+                chunk.band_hashes = hashes[positions[idx]]
+                chunk.lsh_scheme = (self.bands, self.rows)
         
         # Metrics
         context.set_metric("duplicate_chunks", dedup_count)
+        context.set_metric("exact_duplicate_chunks", len(texts) - len(unique))
+        context.set_metric("corpus_duplicate_chunks", len(corpus_map))
         context.set_metric("unique_chunks", len(context.chunks) - dedup_count)
     
-    def _create_minhash(self, text: str, num_hashes: int = 128) -> List[float]:
-        """
-        Kreira MinHash signature za tekst.
-        MinHash je probabilistički algoritam za procjenu Jaccard similarity.
-        """
-        # Normalize text
-        normalized = self._normalize_text(text)
-        
-        # Create shingles (n-grams)
-        shingles = self._create_shingles(normalized)
-        
-        if not shingles:
-            return [0] * num_hashes
-        
-        # Initialize signature with infinity
-        signature = [float('inf')] * num_hashes
-        
-        # For each shingle, compute hash with different seeds
-        for shingle in shingles:
-            for i in range(num_hashes):
-                # Hash with seed i
-                hash_val = self._hash_with_seed(shingle, i)
-                
-                # Keep minimum
-                if hash_val < signature[i]:
-                    signature[i] = hash_val
-        
-        return signature
-    
-    def _normalize_text(self, text: str) -> str:
-        """Normalizuj tekst za comparison"""
-        # Lowercase
-        text = text.lower()
-        
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove punctuation (keep alphanumeric and spaces)
-        text = re.sub(r'[^\w\s]', '', text)
-        
-        return text.strip()
+    def _exact_duplicates(self, texts: List[str]) -> Dict[int, int]:
+        """{duplicate_idx: idx prvog pojavljivanja} za tekstove identične nakon normalizacije."""
+        first_seen: Dict[bytes, int] = {}
+        duplicates = {}
+        for idx, text in enumerate(texts):
+            first = first_seen.setdefault(content_key(text), idx)
+            if first != idx:
+                duplicates[idx] = first
+        return duplicates
     
-    def _create_shingles(self, text: str) -> Set[str]:
-        """Kreira word shingles (n-grams) iz teksta"""
-        words = text.split()
-        
-        if len(words) < self.shingle_size:
-            return {text}
-        
-        shingles = set()
-        for i in range(len(words) - self.shingle_size + 1):
-            shingle = ' '.join(words[i:i + self.shingle_size])
-            shingles.add(shingle)
-        
-        return shingles
-    
-    def _hash_with_seed(self, text: str, seed: int) -> int:
-        """Hash string sa seed-om"""
-        hash_input = f"{seed}:{text}".encode('utf-8')
-        hash_bytes = hashlib.sha256(hash_input).digest()
-        
-        # Convert first 8 bytes to int
-        return int.from_bytes(hash_bytes[:8], byteorder='big')
-    
-    def _lsh_find_duplicates(
+    def _find_corpus_duplicates(
         self,
-        signatures: List[List[int]],
-        chunks: List[ProcessedChunk]
+        signatures: np.ndarray,
+        hashes: np.ndarray,
+        clusters: Dict[int, int],
+        context: IngestContext
     ) -> Dict[int, str]:
         """
-        LSH (Locality Sensitive Hashing) za pronalaženje duplicates.
-        Vraća dict {duplicate_idx: original_hash}
+        Provjeri kanonske chunk-ove (redovi signatures bez klastera) protiv chunk_lsh_bands.
+        Vraća {red: postojeći chunk_id}; članovi klastera nasljeđuju link svog kanonskog chunk-a.
         """
-        # LSH parameters
-        num_bands = 16
-        rows_per_band = len(signatures[0]) // num_bands if signatures else 0
-        
-        if rows_per_band == 0:
+        if self.db is None or not settings.DEDUP_CROSS_DOCUMENT:
             return {}
         
-        # Hash tables for each band
-        band_buckets: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(num_bands)]
-        
-        # Populate LSH buckets
-        for idx, signature in enumerate(signatures):
-            for band_idx in range(num_bands):
-                # Extract band
-                start = band_idx * rows_per_band
-                end = start + rows_per_band
-                band = tuple(signature[start:end])
-                
-                # Hash band
-                band_hash = hash(band)
-                
-                # Add to bucket
-                band_buckets[band_idx][band_hash].append(idx)
-        
-        # Find candidate pairs (chunks in same bucket)
-        candidate_pairs = set()
-        
-        for band_bucket in band_buckets:
-            for bucket_chunks in band_bucket.values():
-                if len(bucket_chunks) > 1:
-                    # All pairs in this bucket are candidates
-                    for i in range(len(bucket_chunks)):
-                        for j in range(i + 1, len(bucket_chunks)):
-                            pair = tuple(sorted([bucket_chunks[i], bucket_chunks[j]]))
-                            candidate_pairs.add(pair)
+        canonical = [position for position in range(len(signatures)) if position not in clusters]
+        try:
+            # Band-ovi upisani pod ranijim šemama (drugi DEDUP_THRESHOLD) se traže njihovim hash-evima
+            query_hashes = [hashes[canonical]] + [
+                band_hashes(signatures[canonical], bands, rows)
+                for bands, rows in lsh_schemes(self.db)
+                if (bands, rows) != (self.bands, self.rows) and bands * rows <= signatures.shape[1]
+            ]
+            found = find_corpus_duplicates(
+                self.db,
+                context.user_id,
+                signatures[canonical],
+                np.hstack(query_hashes),
+                self.similarity_threshold
+            )
+        except Exception as e:
+            self.db.rollback()
+            context.add_error(f"Cross-document dedup greška: {str(e)}")
+            return {}
         
-        # Verify candidates with exact similarity
+        corpus_map = {canonical[position]: chunk_id for position, chunk_id in found.items()}
+        for idx, root in clusters.items():
+            if root in corpus_map:
+                corpus_map[idx] = corpus_map[root]
+        return corpus_map
+    
+    def _cluster_hashes(self, clusters: Dict[int, int], chunks: List[ProcessedChunk]) -> Dict[int, str]:
+        """
+        Svi članovi klastera pokazuju na hash prvog chunk-a klastera.
+        Vraća dict {duplicate_idx: original_hash}
+        """
+        chunk_hashes = {}  # Map canonical idx to content hash
         duplicates_map = {}
-        chunk_hashes = {}  # Map idx to content hash
-        
-        for idx1, idx2 in candidate_pairs:
-            similarity = self._jaccard_similarity(signatures[idx1], signatures[idx2])
-            
-            if similarity >= self.similarity_threshold:
-                # idx2 is duplicate of idx1
-                # Keep the first occurrence (idx1), mark idx2 as duplicate
-                
-                if idx1 not in chunk_hashes:
-                    chunk_hashes[idx1] = self._hash_text(chunks[idx1].text)
-                
-                duplicates_map[idx2] = chunk_hashes[idx1]
+        for idx, canonical in clusters.items():
+            if canonical not in chunk_hashes:
+                chunk_hashes[canonical] = self._hash_text(chunks[canonical].text)
+            duplicates_map[idx] = chunk_hashes[canonical]
         
         return duplicates_map
     
-    def _jaccard_similarity(self, sig1: List[int], sig2: List[int]) -> float:
-        """Procijeni Jaccard similarity iz MinHash signatures"""
-        if len(sig1) != len(sig2):
-            return 0.0
-        
-        matches = sum(1 for a, b in zip(sig1, sig2) if a == b)
-        return matches / len(sig1)
-    
     def _hash_text(self, text: str) -> str:
         """Kreira hash ID za tekst"""
         return hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
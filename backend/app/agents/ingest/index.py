@@ -1,9 +1,15 @@
-from typing import List
+import json
+import uuid
+from typing import Dict, List, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from .base import IngestAgent
 from .types import IngestContext
-from app.models.chunk import DocumentChunk
+from app.core.config import settings
+from app.services.chunk_store import insert_chunk_links, insert_chunks
+from app.services.dedup_index import store_chunk_signatures
+from app.services.vectors import embed_texts
 
 try:
     from app.services.llm_client import get_llm_client
@@ -15,7 +21,7 @@ class IndexAgent(IngestAgent):
     """
     IndexAgent - Kreira embeddings i indeksira chunk-ove u bazi.
     - Batch embeddings za performanse
-    - Skip duplicates
+    - Skip duplicates (duplikati se ne upisuju, nego linkuju u chunk_links)
     - ANALYZE hint za optimizaciju indeksa
     """
     
@@ -41,21 +47,24 @@ class IndexAgent(IngestAgent):
         # Filter out duplicates - indeksiramo samo unique chunk-ove
         unique_chunks = [chunk for chunk in context.chunks if not chunk.is_duplicate]
         
-        if not unique_chunks:
-            context.add_error("Svi chunk-ovi su duplikati")
-            return
-        
         # Step 1: Generate embeddings in batches
-        await self._generate_embeddings(unique_chunks, context)
+        if unique_chunks:
+            await self._generate_embeddings(unique_chunks, context)
+        else:
+            context.add_log("IndexAgent", "info", "Svi chunk-ovi su duplikati - upisuju se samo linkovi")
+        
+        # Step 2: Insert into database (chunk-ovi + linkovi duplikata)
+        linked = await self._insert_chunks(unique_chunks, context)
         
-        # Step 2: Insert into database
-        await self._insert_chunks(unique_chunks, context)
+        # Step 3: Filterabilni metapodaci dokumenta (doc_type, document_date, tags)
+        await self._update_document_metadata(context)
         
-        # Step 3: Optimize indexes with ANALYZE
+        # Step 4: Optimize indexes with ANALYZE
         await self._analyze_indexes()
         
         # Metrics
         context.set_metric("indexed_chunks", len(unique_chunks))
+        context.set_metric("linked_chunks", linked)
         context.set_metric("duplicate_chunks_skipped", len(context.chunks) - len(unique_chunks))
     
     async def _generate_embeddings(self, chunks: List, context: IngestContext):
@@ -73,8 +82,8 @@ class IndexAgent(IngestAgent):
                 # Get texts from batch
                 texts = [chunk.text for chunk in batch]
                 
-                # Batch embedding request
-                embeddings = await llm.create_embeddings(texts)
+                # Batch embedding request -> (n, dim) float32 matrica
+                embeddings = embed_texts(llm, texts, settings.EMBEDDINGS_MODEL)
                 
                 # Assign embeddings to chunks
                 for chunk, embedding in zip(batch, embeddings):
@@ -90,45 +99,94 @@ class IndexAgent(IngestAgent):
                 context.add_error(f"Embedding batch {batch_idx} greška: {str(e)}")
                 # Continue with next batch
     
-    async def _insert_chunks(self, chunks: List, context: IngestContext):
-        """Upiši chunk-ove u bazu"""
+    async def _insert_chunks(self, chunks: List, context: IngestContext) -> int:
+        """Upiši chunk-ove (bulk, binarni vector parametri) i linkove duplikata; vraća broj linkova"""
         
-        inserted_count = 0
-        
-        for chunk in chunks:
-            if not chunk.embedding:
-                continue
-            
-            try:
-                # Create chunk record
-                db_chunk = DocumentChunk(
-                    document_id=int(context.document_id),
-                    chunk_index=chunk.chunk_index,
-                    text_content=chunk.text,
-                    embedding=chunk.embedding,
-                    metadata_={
-                        "char_count": len(chunk.text),
-                        **chunk.metadata
-                    }
-                )
-                
-                self.db.add(db_chunk)
-                inserted_count += 1
-                
-            except Exception as e:
-                context.add_error(f"Insert chunk {chunk.chunk_index} greška: {str(e)}")
+        owner_id = uuid.UUID(str(context.user_id)) if context.user_id else None
+        inserted = [chunk for chunk in chunks if chunk.embedding is not None]
+        rows = [
+            {
+                "document_id": context.document_id,
+                "owner_id": owner_id,
+                "chunk_index": chunk.chunk_index,
+                "content": chunk.text,
+                # filename/section/keywords ulaze u weighted search_vector
+                "metadata": {
+                    "char_count": len(chunk.text),
+                    "filename": context.filename,
+                    "keywords": context.extracted_metadata.get("keywords", []),
+                    **chunk.metadata
+                },
+                "embedding": chunk.embedding,
+            }
+            for chunk in inserted
+        ]
         
-        # Commit all chunks
         try:
+            chunk_ids = insert_chunks(self.db, rows)
+            linked = insert_chunk_links(
+                self.db,
+                context.document_id,
+                owner_id,
+                self._links(context, {chunk.chunk_index: chunk_id for chunk_id, chunk in zip(chunk_ids, inserted)})
+            )
+            # Cross-document dedup: signature novih chunk-ova za buduće ingest-e
+            signed = [(chunk_id, chunk) for chunk_id, chunk in zip(chunk_ids, inserted) if chunk.signature is not None]
+            if signed:
+                store_chunk_signatures(
+                    self.db,
+                    owner_id,
+                    [chunk_id for chunk_id, _ in signed],
+                    np.vstack([chunk.signature for _, chunk in signed]),
+                    np.vstack([chunk.band_hashes for _, chunk in signed]),
+                    *signed[0][1].lsh_scheme
+                )
             self.db.commit()
             context.add_log(
                 "IndexAgent",
                 "success",
-                f"{inserted_count} chunk-ova upisano u bazu"
+                f"{len(rows)} chunk-ova upisano u bazu"
             )
         except Exception as e:
             self.db.rollback()
             raise Exception(f"Database commit greška: {str(e)}")
+        return linked
+    
+    def _links(self, context: IngestContext, inserted_ids: Dict[int, str]) -> List[Tuple[int, str]]:
+        """(chunk_index, canonical_chunk_id) za duplikate: postojeći chunk korpusa ili upisani original iz istog dokumenta"""
+        links = []
+        for chunk in context.chunks:
+            if not chunk.is_duplicate:
+                continue
+            canonical = chunk.metadata.get("duplicate_of") or inserted_ids.get(chunk.duplicate_of_index)
+            if canonical:
+                links.append((chunk.chunk_index, canonical))
+        return links
+    
+    async def _update_document_metadata(self, context: IngestContext):
+        """Upiši MetaAgent rezultate u documents.metadata (GIN/BTREE filteri pretrage)"""
+        meta = {
+            "doc_type": context.doc_type,
+            "document_date": context.extracted_metadata.get("document_date"),
+            "tags": context.extracted_metadata.get("keywords") or None,
+        }
+        meta = {key: value for key, value in meta.items() if value}
+        if not meta:
+            return
+        
+        try:
+            self.db.execute(
+                text("""
+                    UPDATE documents
+                    SET metadata = COALESCE(metadata, '{}'::jsonb) || CAST(:meta AS jsonb)
+                    WHERE id = CAST(:document_id AS uuid)
+                """),
+                {"meta": json.dumps(meta, ensure_ascii=False), "document_id": str(context.document_id)}
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            context.add_error(f"Document metadata greška: {str(e)}")
     
     async def _analyze_indexes(self):
         """Pokreni ANALYZE za optimizaciju indeksa"""
@@ -0,0 +1,46 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional
+from app.core.config import settings
+
+
+def parse_json_content(content: Optional[str]) -> Dict[str, Any]:
+    """JSON iz LLM odgovora (skida ```json ... ``` omotač ako postoji)"""
+    if not content:
+        raise ValueError("Empty LLM response")
+    
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    
+    return json.loads(content.strip())
+
+
+async def chat_json(
+    llm,
+    prompt: str,
+    temperature: float = 0.2,
+    max_tokens: int = 1000,
+    json_mode: bool = False,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Async LLM poziv (AsyncOpenAI) sa timeout-om i parsiranjem JSON odgovora.
+    json_mode traži structured output (response_format=json_object).
+    """
+    kwargs: Dict[str, Any] = {}
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    
+    response = await asyncio.wait_for(
+        llm.chat.completions.create(
+            model=settings.CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        ),
+        timeout=timeout or settings.LLM_TIMEOUT
+    )
+    return parse_json_content(response.choices[0].message.content)
@@ -0,0 +1,189 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+# Stabilne konstante za hash banda (ne zavise od PYTHONHASHSEED, pa se band hash-evi mogu perzistirati)
+_BAND_MULT = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _probability(s: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """Vjerovatnoća da par sa Jaccard sličnošću s postane kandidat."""
+    return 1.0 - (1.0 - s ** rows) ** bands
+
+
+@lru_cache(maxsize=32)
+def optimal_params(
+    threshold: float,
+    num_perm: int,
+    false_positive_weight: float = 0.5,
+    false_negative_weight: float = 0.5
+) -> Tuple[int, int]:
+    """
+    (bands, rows) za dati prag: minimizuje težinsku sumu površina
+    false positive (s < threshold) i false negative (s >= threshold) ispod S-krive.
+    """
+    grid = np.linspace(0.0, 1.0, 1001)
+    below = grid < threshold
+    step = grid[1] - grid[0]
+    best, best_error = (1, num_perm), float("inf")
+
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        p = _probability(grid, bands, rows)
+        false_positive = float(p[below].sum()) * step
+        false_negative = float((1.0 - p[~below]).sum()) * step
+        error = false_positive_weight * false_positive + false_negative_weight * false_negative
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def band_hashes(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """
+    Stabilan uint64 hash po bandu: (n, bands) matrica.
+    Redovi banda se kombinuju polinomom nad uint64, indeks banda ulazi u hash
+    pa se isti sadržaj u različitim bandovima ne sudara.
+    """
+    n = len(signatures)
+    sig = signatures[:, :bands * rows].astype(np.uint64).reshape(n, bands, rows)
+    with np.errstate(over='ignore'):
+        hashes = np.broadcast_to(np.arange(1, bands + 1, dtype=np.uint64), (n, bands)).copy()
+        for r in range(rows):
+            hashes *= _BAND_MULT
+            hashes += sig[:, :, r]
+        hashes ^= hashes >> np.uint64(30)
+        hashes *= _MIX1
+        hashes ^= hashes >> np.uint64(27)
+        hashes *= _MIX2
+        hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def candidate_pairs(hashes: np.ndarray) -> np.ndarray:
+    """
+    Kandidat parovi (m, 2), i < j, iz zajedničkih bucket-a.
+
+    Umjesto svih parova u bucket-u, svaki član se uparuje sa prvim članom bucket-a
+    i sa prethodnikom (zvijezda + lanac). To je O(n) parova po bandu i za
+    bucket-e sa hiljadama istih chunk-ova (boilerplate), a union-find nad
+    verifikovanim parovima i dalje spaja cijeli klaster.
+    """
+    n, bands = hashes.shape
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    pairs = []
+    for band in range(bands):
+        column = hashes[:, band]
+        order = np.argsort(column, kind='stable')
+        ordered = column[order]
+        same = ordered[1:] == ordered[:-1]
+        if not same.any():
+            continue
+
+        # Početak bucket-a za svaku poziciju u sortiranom redoslijedu
+        starts = np.flatnonzero(np.concatenate(([True], ~same)))
+        head = order[np.repeat(starts, np.diff(np.append(starts, n)))]
+
+        members = np.flatnonzero(same) + 1
+        pairs.append(np.stack([order[members - 1], order[members]], axis=1))
+        not_second = head[members] != order[members - 1]
+        pairs.append(np.stack([head[members][not_second], order[members][not_second]], axis=1))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+
+    pairs = np.concatenate(pairs).astype(np.int64)
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def verify_pairs(signatures: np.ndarray, pairs: np.ndarray, threshold: float, block: int = 65536) -> np.ndarray:
+    """Zadrži parove čija procijenjena Jaccard sličnost >= threshold (vektorizovano, u blokovima)."""
+    if not len(pairs):
+        return pairs
+    keep = np.empty(len(pairs), dtype=bool)
+    for start in range(0, len(pairs), block):
+        chunk = pairs[start:start + block]
+        similarity = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+        keep[start:start + block] = similarity >= threshold
+    return pairs[keep]
+
+
+class UnionFind:
+    """Disjoint-set sa path compression i union by rank; korijen je najmanji indeks u klasteru."""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+        self.smallest = list(range(size))
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+        self.smallest[ra] = min(self.smallest[ra], self.smallest[rb])
+
+    def representative(self, x: int) -> int:
+        return self.smallest[self.find(x)]
+
+
+def find_duplicate_clusters(
+    signatures: np.ndarray,
+    threshold: float,
+    bands: int = 0,
+    rows: int = 0,
+    hashes: Optional[np.ndarray] = None
+) -> Dict[int, int]:
+    """
+    LSH + vektorizovana verifikacija + union-find.
+
+    Args:
+        signatures: MinHash matrica (n, num_perm)
+        threshold: Prag Jaccard sličnosti
+        bands, rows: Opcionalno; default se izvodi iz threshold-a
+        hashes: Već izračunati band_hashes(signatures, bands, rows)
+
+    Returns:
+        {duplicate_idx: canonical_idx} - kanonski predstavnik je prvi chunk u klasteru
+    """
+    n = len(signatures)
+    if n < 2:
+        return {}
+    if not bands or not rows:
+        bands, rows = optimal_params(threshold, signatures.shape[1])
+
+    if hashes is None:
+        hashes = band_hashes(signatures, bands, rows)
+
+    pairs = verify_pairs(signatures, candidate_pairs(hashes), threshold)
+    if not len(pairs):
+        return {}
+
+    clusters = UnionFind(n)
+    for a, b in pairs.tolist():
+        clusters.union(a, b)
+
+    members: List[int] = np.unique(pairs).tolist()
+    duplicates = {}
+    for idx in members:
+        canonical = clusters.representative(idx)
+        if canonical != idx:
+            duplicates[idx] = canonical
+    return duplicates
@@ -1,14 +1,135 @@
+import asyncio
 import re
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Optional
 from .base import IngestAgent
+from .llm import chat_json
 from .types import IngestContext, ExtractedEntity
 from app.core.config import settings
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import get_async_llm_client
 except ImportError:
-    get_llm_client = None
+    get_async_llm_client = None
+
+
+# Redoslijed je bitan - prvi tip čija se ključna riječ pojavi pobjeđuje
+DOC_TYPE_KEYWORDS = [
+    ("invoice", ['faktura', 'invoice', 'račun', 'iznos', 'pdv']),
+    ("contract", ['ugovor', 'contract', 'sporazum', 'stranka']),
+    ("report", ['izvještaj', 'report', 'analiza', 'rezultati']),
+    ("email", ['from:', 'to:', 'subject:', 'email']),
+    ("memo", ['memo', 'memorandum', 'obavijest']),
+]
+
+DATE_PATTERNS = [
+    r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}',
+    r'\d{4}[./-]\d{1,2}[./-]\d{1,2}'
+]
+
+_DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d/%m/%y", "%Y-%m-%d", "%Y.%m.%d", "%Y/%m/%d")
+
+_DATE_RE = re.compile("|".join(f"(?:{pattern})" for pattern in DATE_PATTERNS))
+
+# Svi tipovi entiteta u jednoj alternaciji; na istoj poziciji pobjeđuje raniji tip
+_ENTITY_PATTERNS = (
+    ("URL", r'https?://[^\s<>"{}|\\^`\[\]]+'),
+    ("EMAIL", r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    ("DATE", _DATE_RE.pattern),
+    ("MONEY", r'(?i:\d+[.,]?\d*\s*(?:EUR|USD|BAM|KM|RSD|€|\$))'),
+    ("JMBG", r'\b\d{13}\b'),
+    ("DOC_ID", r'\b[A-Z]{2,4}[-/]?\d{3,8}\b'),
+    # Međunarodni (+...) ili lokalni (033 123 456, 061 234 567) broj
+    ("PHONE", r'\+\d{1,4}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}|\b0\d{1,2}[\s/-]?\d{3}[\s-]?\d{3,4}\b'),
+)
+_ENTITY_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _ENTITY_PATTERNS))
+
+# Maksimalan broj različitih vrijednosti po tipu; skeniranje staje kad su svi tipovi popunjeni
+ENTITY_CAPS = {
+    "DATE": 100,
+    "MONEY": 100,
+    "EMAIL": 100,
+    "PHONE": 100,
+    "JMBG": 5,
+    "DOC_ID": 10,
+    "URL": 10,
+}
+
+_ENTITY_CONFIDENCE = {"DATE": 0.9, "MONEY": 0.85, "EMAIL": 0.95, "PHONE": 0.7}
+
+
+def detect_doc_type(text: str) -> str:
+    """Heuristički tip dokumenta (invoice, contract, report, email, memo, other)."""
+    text_lower = text.lower()
+    for doc_type, keywords in DOC_TYPE_KEYWORDS:
+        if any(keyword in text_lower for keyword in keywords):
+            return doc_type
+    return "other"
+
+
+def normalize_date(value: str) -> Optional[str]:
+    """Datum iz teksta (15.03.2024, 2024-03-15, ...) u ISO oblik; None ako nije validan."""
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip().rstrip("."), fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def find_document_date(text: str) -> Optional[str]:
+    """Prvi validan datum u tekstu - koristi se kao documents.metadata.document_date."""
+    for match in _DATE_RE.finditer(text):
+        iso = normalize_date(match.group(0))
+        if iso:
+            return iso
+    return None
+
+
+@dataclass
+class EntityScan:
+    """Rezultat jednog prolaza scan_entities: jedinstveni entiteti po tipu i datum dokumenta."""
+    entities: Dict[str, List[ExtractedEntity]] = field(default_factory=dict)
+    document_date: Optional[str] = None
+
+    def texts(self, entity_type: str) -> List[str]:
+        return [entity.text for entity in self.entities.get(entity_type, [])]
+
+
+def scan_entities(text: str, caps: Dict[str, int] = ENTITY_CAPS) -> EntityScan:
+    """
+    Jedan linearni prolaz kroz tekst za sve tipove entiteta (datumi, iznosi, email,
+    telefoni, JMBG, šifre dokumenata, URL-ovi). Limit po tipu se primjenjuje tokom
+    skeniranja, a skeniranje se prekida čim su svi tipovi popunjeni i datum dokumenta nađen.
+    """
+    scan = EntityScan(entities={entity_type: [] for entity_type in caps})
+    seen: Dict[str, set] = {entity_type: set() for entity_type in caps}
+    open_types = {entity_type for entity_type, cap in caps.items() if cap > 0}
+
+    for match in _ENTITY_RE.finditer(text):
+        entity_type = match.lastgroup
+        value = match.group()
+
+        if entity_type == "DATE" and scan.document_date is None:
+            scan.document_date = normalize_date(value)
+
+        if entity_type in open_types and value not in seen[entity_type]:
+            seen[entity_type].add(value)
+            scan.entities[entity_type].append(ExtractedEntity(
+                text=value,
+                entity_type=entity_type,
+                start=match.start(),
+                end=match.end(),
+                confidence=_ENTITY_CONFIDENCE.get(entity_type, 0.9)
+            ))
+            if len(scan.entities[entity_type]) >= caps[entity_type]:
+                open_types.discard(entity_type)
+
+        if not open_types and scan.document_date is not None:
+            break
+
+    return scan
 
 
 class MetaAgent(IngestAgent):
@@ -16,10 +137,15 @@ class MetaAgent(IngestAgent):
     MetaAgent - Ekstraktuje metapodatke iz dokumenta.
     LLM mode: Koristi LLM za tip dokumenta, NER, ekstrakciju entiteta
     Fallback mode: Regex-based heuristike za datume, brojeve, email-ove
+    (jedan prolaz kroz tekst za sve tipove, vidi scan_entities)
     """
     
     def __init__(self):
-        super().__init__("MetaAgent", dependencies=["ExtractAgent", "StructureAgent"])
+        super().__init__(
+            "MetaAgent",
+            dependencies=["ExtractAgent", "StructureAgent"],
+            optional_dependencies=["AnalysisAgent"]
+        )
         self.llm_available = bool(settings.OPENAI_API_KEY)
     
     async def process(self, context: IngestContext):
@@ -29,28 +155,58 @@ class MetaAgent(IngestAgent):
             context.add_error("Nema teksta za ekstrakciju metapodataka")
             return
         
+        # Jedan prolaz za sve regex entitete (heuristički NER + pattern metapodaci)
+        scan = scan_entities(context.raw_text)
+        
         # Step 1: Detect document type
-        if self.llm_available:
-            await self._llm_detect_doc_type(context)
-            await self._llm_extract_entities(context)
+        if context.analysis is not None:
+            # Tip, jezik, ključne riječi i entiteti već su u zajedničkoj analizi
+            self._apply_analysis(context)
+        elif self.llm_available:
+            await self._llm_metadata(context, scan)
         else:
             await self._heuristic_detect_doc_type(context)
-            await self._heuristic_extract_entities(context)
+            await self._heuristic_extract_entities(context, scan)
         
         # Step 2: Extract specific patterns (always run)
-        await self._extract_patterns(context)
+        await self._extract_patterns(context, scan)
         
         # Metrics
         context.set_metric("entities_extracted", len(context.entities))
         context.set_metric("metadata_fields", len(context.extracted_metadata))
     
+    async def _llm_metadata(self, context: IngestContext, scan: EntityScan):
+        """
+        Oba LLM poziva istovremeno (latencija jednog round-trip-a) pod jednim zajedničkim
+        timeout-om; strana koja ne završi na vrijeme prelazi na heuristiku.
+        """
+        doc_type = asyncio.ensure_future(self._llm_detect_doc_type(context))
+        entities = asyncio.ensure_future(self._llm_extract_entities(context, scan))
+        try:
+            await asyncio.wait_for(asyncio.gather(doc_type, entities), timeout=settings.LLM_TIMEOUT)
+        except asyncio.TimeoutError:
+            context.add_error(f"LLM metadata timeout ({settings.LLM_TIMEOUT}s), heuristika za nedovršene pozive")
+            if doc_type.cancelled():
+                await self._heuristic_detect_doc_type(context)
+            if entities.cancelled():
+                await self._heuristic_extract_entities(context, scan)
+    
+    def _apply_analysis(self, context: IngestContext):
+        """Rezultat AnalysisAgent-a umjesto vlastitih LLM poziva"""
+        analysis = context.analysis
+        context.doc_type = analysis.doc_type or "other"
+        context.extracted_metadata["doc_type_confidence"] = analysis.doc_type_confidence
+        context.extracted_metadata["language"] = analysis.language
+        context.extracted_metadata["keywords"] = analysis.keywords
+        context.entities.extend(analysis.entities)
+    
     async def _llm_detect_doc_type(self, context: IngestContext):
         """LLM-bazirana detekcija tipa dokumenta"""
-        if get_llm_client is None:
+        if get_async_llm_client is None:
             await self._heuristic_detect_doc_type(context)
             return
         
-        llm = get_llm_client()
+        llm = get_async_llm_client()
         if llm is None:
             await self._heuristic_detect_doc_type(context)
             return
@@ -71,26 +227,7 @@ Odgovori sa JSON:
 }}"""
         
         try:
-            response = llm.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=300
-            )
-            
-            import json
-            content = response.choices[0].message.content
-            
-            if not content:
-                raise ValueError("Empty LLM response")
-            
-            # Clean response
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            data = json.loads(content.strip())
+            data = await chat_json(llm, prompt, temperature=0.2, max_tokens=300)
             
             context.doc_type = data.get("doc_type", "other")
             context.extracted_metadata["doc_type_confidence"] = data.get("confidence", 0.0)
@@ -98,38 +235,24 @@ Odgovori sa JSON:
             context.extracted_metadata["keywords"] = data.get("keywords", [])
             
         except Exception as e:
-            context.add_error(f"LLM doc type greška: {str(e)}")
+            context.add_error(f"LLM doc type greška: {str(e) or type(e).__name__}")
             await self._heuristic_detect_doc_type(context)
     
     async def _heuristic_detect_doc_type(self, context: IngestContext):
         """Heuristička detekcija tipa dokumenta"""
-        text_lower = context.raw_text.lower()
-        
-        # Pattern matching
-        if any(keyword in text_lower for keyword in ['faktura', 'invoice', 'račun', 'iznos', 'pdv']):
-            context.doc_type = "invoice"
-        elif any(keyword in text_lower for keyword in ['ugovor', 'contract', 'sporazum', 'stranka']):
-            context.doc_type = "contract"
-        elif any(keyword in text_lower for keyword in ['izvještaj', 'report', 'analiza', 'rezultati']):
-            context.doc_type = "report"
-        elif any(keyword in text_lower for keyword in ['from:', 'to:', 'subject:', 'email']):
-            context.doc_type = "email"
-        elif any(keyword in text_lower for keyword in ['memo', 'memorandum', 'obavijest']):
-            context.doc_type = "memo"
-        else:
-            context.doc_type = "other"
+        context.doc_type = detect_doc_type(context.raw_text)
         
         context.extracted_metadata["detection_method"] = "heuristic"
     
-    async def _llm_extract_entities(self, context: IngestContext):
+    async def _llm_extract_entities(self, context: IngestContext, scan: Optional[EntityScan] = None):
         """LLM-bazirana NER"""
-        if get_llm_client is None:
-            await self._heuristic_extract_entities(context)
+        if get_async_llm_client is None:
+            await self._heuristic_extract_entities(context, scan)
             return
         
-        llm = get_llm_client()
+        llm = get_async_llm_client()
         if llm is None:
-            await self._heuristic_extract_entities(context)
+            await self._heuristic_extract_entities(context, scan)
             return
         
         # Sample for NER
@@ -149,25 +272,7 @@ Odgovori sa JSON:
 Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/brojeve dokumenata."""
         
         try:
-            response = llm.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=1000
-            )
-            
-            import json
-            content = response.choices[0].message.content
-            
-            if not content:
-                raise ValueError("Empty LLM response")
-            
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            data = json.loads(content.strip())
+            data = await chat_json(llm, prompt, temperature=0.1, max_tokens=1000)
             
             for ent_data in data.get("entities", []):
                 entity = ExtractedEntity(
@@ -180,94 +285,47 @@ Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/bro
                 context.entities.append(entity)
                 
         except Exception as e:
-            context.add_error(f"LLM NER greška: {str(e)}")
+            context.add_error(f"LLM NER greška: {str(e) or type(e).__name__}")
+            await self._heuristic_extract_entities(context, scan)
     
-    async def _heuristic_extract_entities(self, context: IngestContext):
-        """Heuristička NER sa regex-ima"""
-        text = context.raw_text
-        
-        # Dates
-        date_patterns = [
-            r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}',
-            r'\d{4}[./-]\d{1,2}[./-]\d{1,2}'
-        ]
+    async def _heuristic_extract_entities(self, context: IngestContext, scan: Optional[EntityScan] = None):
+        """Heuristička NER sa regex-ima (datumi, iznosi, email-ovi, telefoni)"""
+        if scan is None:
+            scan = scan_entities(context.raw_text)
         
-        for pattern in date_patterns:
-            for match in re.finditer(pattern, text):
-                entity = ExtractedEntity(
-                    text=match.group(0),
-                    entity_type="DATE",
-                    start=match.start(),
-                    end=match.end(),
-                    confidence=0.9
-                )
-                context.entities.append(entity)
-        
-        # Money amounts
-        money_pattern = r'\d+[.,]?\d*\s*(EUR|USD|BAM|KM|RSD|€|\$)'
-        for match in re.finditer(money_pattern, text, re.IGNORECASE):
-            entity = ExtractedEntity(
-                text=match.group(0),
-                entity_type="MONEY",
-                start=match.start(),
-                end=match.end(),
-                confidence=0.85
-            )
-            context.entities.append(entity)
-        
-        # Email addresses
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        for match in re.finditer(email_pattern, text):
-            entity = ExtractedEntity(
-                text=match.group(0),
-                entity_type="EMAIL",
-                start=match.start(),
-                end=match.end(),
-                confidence=0.95
-            )
-            context.entities.append(entity)
-        
-        # Phone numbers
-        phone_pattern = r'\+?\d{1,4}?[-.\s]?\(?\d{1,3}?\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}'
-        for match in re.finditer(phone_pattern, text):
-            if len(match.group(0).replace(' ', '').replace('-', '').replace('.', '')) >= 8:
-                entity = ExtractedEntity(
-                    text=match.group(0),
-                    entity_type="PHONE",
-                    start=match.start(),
-                    end=match.end(),
-                    confidence=0.7
-                )
-                context.entities.append(entity)
+        for entity_type in ("DATE", "MONEY", "EMAIL", "PHONE"):
+            context.entities.extend(scan.entities.get(entity_type, []))
     
-    async def _extract_patterns(self, context: IngestContext):
+    async def _extract_patterns(self, context: IngestContext, scan: Optional[EntityScan] = None):
         """Ekstraktuj specifične pattern-e"""
-        text = context.raw_text
+        if scan is None:
+            scan = scan_entities(context.raw_text)
         
         # JMBG (Bosnia ID number - 13 digits)
-        jmbg_pattern = r'\b\d{13}\b'
-        jmbg_matches = re.findall(jmbg_pattern, text)
-        if jmbg_matches:
-            context.extracted_metadata["jmbg_numbers"] = list(set(jmbg_matches[:5]))
+        jmbg_numbers = scan.texts("JMBG")
+        if jmbg_numbers:
+            context.extracted_metadata["jmbg_numbers"] = jmbg_numbers
         
         # Document IDs (patterns like: DOC-12345, INV-2024-001, etc.)
-        doc_id_pattern = r'\b[A-Z]{2,4}[-/]?\d{3,8}\b'
-        doc_ids = re.findall(doc_id_pattern, text)
+        doc_ids = scan.texts("DOC_ID")
         if doc_ids:
-            context.extracted_metadata["document_ids"] = list(set(doc_ids[:10]))
+            context.extracted_metadata["document_ids"] = doc_ids
         
         # URLs
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        urls = re.findall(url_pattern, text)
+        urls = scan.texts("URL")
         if urls:
-            context.extracted_metadata["urls"] = list(set(urls[:10]))
+            context.extracted_metadata["urls"] = urls
         
         # Extract all unique dates for summary
         dates = [ent.text for ent in context.entities if ent.entity_type == "DATE"]
         if dates:
-            context.extracted_metadata["dates"] = list(set(dates[:10]))
+            context.extracted_metadata["dates"] = list(dict.fromkeys(dates))[:10]
+        
+        # Datum dokumenta (ISO) za date_from/date_to filtere pretrage
+        if scan.document_date:
+            context.extracted_metadata["document_date"] = scan.document_date
         
         # Extract all money amounts
         amounts = [ent.text for ent in context.entities if ent.entity_type == "MONEY"]
         if amounts:
-            context.extracted_metadata["money_amounts"] = list(set(amounts[:10]))
+            context.extracted_metadata["money_amounts"] = list(dict.fromkeys(amounts))[:10]
@@ -0,0 +1,150 @@
+import hashlib
+import re
+from typing import Sequence
+import numpy as np
+
+# xxhash je u requirements-ima; bez njega content_key radi preko blake2b (kriptografski, sporiji)
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+# Broj shingle-ova po bloku (num_perm x blok uint64 = 32 MB za 128 permutacija)
+_BLOCK_SHINGLES = 32768
+
+# Konstante za kombinovanje hash-eva riječi u hash shingle-a (splitmix64)
+_SHINGLE_MULT = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, jedan razmak, bez interpunkcije."""
+    text = _WHITESPACE_RE.sub(' ', text.lower())
+    return _PUNCT_RE.sub('', text).strip()
+
+
+def content_key(text: str) -> bytes:
+    """
+    128-bitni ključ teksta normalizovanog na lowercase i jedan razmak (exact-duplicate provjera).
+    xxh3_128 ako je xxhash instaliran, inače blake2b sa digest_size=16.
+    """
+    data = ' '.join(text.lower().split()).encode('utf-8')
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(data)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def hash64(value: str) -> int:
+    """Stabilan 64-bitni hash stringa (nezavisan od PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer - razbija linearnu strukturu kombinovanih hash-eva."""
+    values = values ^ (values >> np.uint64(30))
+    values *= _MIX1
+    values ^= values >> np.uint64(27)
+    values *= _MIX2
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class _WordHashes(dict):
+    """Keš token -> hash riječi bez interpunkcije; regex se izvršava jednom po različitom tokenu."""
+
+    def __missing__(self, token: str) -> int:
+        word = _PUNCT_RE.sub('', token)
+        value = self[token] = hash64(word) if word else 0
+        return value
+
+
+class MinHasher:
+    """
+    Vektorizovani MinHash.
+
+    Svaki shingle (n-gram riječi) se hash-ira jednom u uint64: riječi se hash-iraju
+    blake2b-om (keširano po tokenu), a n-gram se kombinuje polinomom nad uint64 nizom.
+    Permutacije su multiply-add-shift univerzalne hash funkcije
+    h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32 (a_i neparan), računate jednim
+    broadcast-om za blok shingle-ova, a minimum po chunk-u ide kroz np.minimum.reduceat.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Kolona (num_perm, 1) - blok se računa kao (num_perm, n_shingles), što je cache-friendly za reduceat
+        self.a = (rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)[:, None]
+        self._word_cache = _WordHashes()
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """uint64 hash po shingle-u; tekst kraći od shingle_size je jedan shingle."""
+        tokens = text.lower().split()
+        hashes = np.fromiter(map(self._word_cache.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+        # 0 = token koji je bio samo interpunkcija (isto kao normalize_text().split())
+        hashes = hashes[hashes != 0]
+        if not len(hashes):
+            return np.array([hash64('')], dtype=np.uint64)
+
+        size = min(self.shingle_size, len(hashes))
+        count = len(hashes) - size + 1
+        combined = hashes[:count].copy()
+        with np.errstate(over='ignore'):
+            for offset in range(1, size):
+                combined *= _SHINGLE_MULT
+                combined += hashes[offset:offset + count]
+            return _mix(combined)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """MinHash signature matrica (len(texts), num_perm) uint32."""
+        try:
+            return self.signatures_from_hashes([self.shingle_hashes(text) for text in texts])
+        finally:
+            # Keš riječi važi samo za jedan dokument
+            self._word_cache.clear()
+
+    def signatures_from_hashes(self, hashed: Sequence[np.ndarray]) -> np.ndarray:
+        n = len(hashed)
+        result = np.empty((n, self.num_perm), dtype=np.uint32)
+        if n == 0:
+            return result
+
+        counts = np.fromiter((len(h) for h in hashed), dtype=np.int64, count=n)
+        buffer = np.empty((self.num_perm, max(_BLOCK_SHINGLES, int(counts.max()))), dtype=np.uint64)
+        shift = np.uint64(32)
+
+        start = 0
+        while start < n:
+            # Blok chunk-ova čiji shingle-ovi zajedno staju u buffer (min. jedan chunk)
+            end = start + 1
+            total = int(counts[start])
+            while end < n and total + counts[end] <= buffer.shape[1]:
+                total += int(counts[end])
+                end += 1
+
+            values = np.concatenate(hashed[start:end])
+            block = buffer[:, :total]
+            with np.errstate(over='ignore'):
+                np.multiply(self.a, values, out=block)
+                block += self.b
+            block >>= shift
+
+            offsets = np.zeros(end - start, dtype=np.int64)
+            np.cumsum(counts[start:end - 1], out=offsets[1:])
+            result[start:end] = np.minimum.reduceat(block, offsets, axis=1).T
+            start = end
+
+        return result
+
+
+def estimate_jaccard(sig1: np.ndarray, sig2: np.ndarray) -> float:
+    """Procjena Jaccard sličnosti iz dvije MinHash signature."""
+    if sig1.shape != sig2.shape:
+        return 0.0
+    return float(np.count_nonzero(sig1 == sig2)) / sig1.shape[-1]
@@ -0,0 +1,193 @@
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+# Bosanski mobilni: 06X XXX XXX
+_MOBILE = r'06[0-9]\s?\d{3}\s?\d{3,4}\b'
+# Generički broj ne smije progutati mobilni broj koji slijedi (ranije ga je maskirao prethodni prolaz)
+_NOT_MOBILE = rf'(?!\b{_MOBILE})'
+
+# Tipovi sidreni na \b; redoslijed = prioritet na istoj poziciji (kao ranije odvojeni prolazi)
+_WORD_PATTERNS = (
+    ("email", r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    ("phone_mobile", _MOBILE),
+    ("jmbg", r'\d{13}\b'),
+    ("card", r'\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'),
+    ("iban", r'(?i:[A-Z]{2})\d{2}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'),
+)
+# Tipovi koji počinju sa '+' (prefiks je izvučen ispred alternacije)
+_PLUS_PATTERNS = (
+    # +387 XX XXX XXX
+    ("phone_ba", r'387\s?\d{2}\s?\d{3}\s?\d{3,4}'),
+    # Generički međunarodni broj; mobilni odmah iza '+' ostaje grani phone_mobile (zadržava '+')
+    ("phone", (
+        rf'{_NOT_MOBILE}\d{{1,4}}[-.\s]?\(?{_NOT_MOBILE}\d{{1,3}}\)?[-.\s]?{_NOT_MOBILE}\d{{1,4}}'
+        rf'[-.\s]?{_NOT_MOBILE}\d{{1,4}}[-.\s]?{_NOT_MOBILE}\d{{1,9}}'
+    )),
+)
+
+# Grupa iz pattern-a -> tip (PolicyAgent flag) i ključ u pii_stats
+_GROUP_TYPES = {
+    "email": "emails",
+    "iban": "cards",
+    "card": "cards",
+    "jmbg": "ids",
+    "phone_ba": "phones",
+    "phone_mobile": "phones",
+    "phone": "phones",
+}
+_GROUP_STATS = {
+    "email": "emails",
+    "iban": "iban",
+    "card": "credit_cards",
+    "jmbg": "jmbg",
+    "phone_ba": "phones",
+    "phone_mobile": "phones",
+    "phone": "phones",
+}
+
+PII_TYPES: FrozenSet[str] = frozenset(_GROUP_TYPES.values())
+PII_STATS_KEYS = ("emails", "phones", "jmbg", "credit_cards", "iban")
+
+_SEPARATORS_RE = re.compile(r'[\s\-]')
+
+
+@lru_cache(maxsize=16)
+def _compile(types: FrozenSet[str]) -> "re.Pattern":
+    """
+    Jedna alternacija sa named grupama za uključene tipove.
+    Zajednički \b i '+' su izvučeni ispred grana, pa se unutar riječi
+    na svakoj poziciji provjeravaju samo dva sidra umjesto svih pattern-a.
+    """
+    def branch(prefix: str, patterns) -> str:
+        parts = [f"(?P<{name}>{pattern})" for name, pattern in patterns if _GROUP_TYPES[name] in types]
+        return f"{prefix}(?:{'|'.join(parts)})" if parts else ""
+
+    branches = [b for b in (branch(r'\b', _WORD_PATTERNS), branch(r'\+', _PLUS_PATTERNS)) if b]
+    return re.compile("|".join(branches) or r'(?!)')
+
+
+# Default (svi tipovi) se kompajlira pri importu
+_compile(PII_TYPES)
+
+
+def luhn_check(digits: str) -> bool:
+    """Luhn algorithm za validaciju broja kartice"""
+    checksum = 0
+    parity = len(digits) % 2
+    for i, char in enumerate(digits):
+        value = ord(char) - 48
+        if i % 2 == parity:
+            value *= 2
+            if value > 9:
+                value -= 9
+        checksum += value
+    return checksum % 10 == 0
+
+
+def _mask_email(value: str) -> str:
+    # Keep first char and domain
+    local, _, domain = value.partition('@')
+    return f"{local[0]}***@{domain}"
+
+
+def _mask_iban(value: str) -> str:
+    # Keep country code, mask rest except last 4
+    digits = _SEPARATORS_RE.sub('', value)[2:]
+    return f"{value[0:2]}** **** **** **** {digits[-4:]}"
+
+
+def _mask_iban_card(value: str) -> Optional[str]:
+    # Ranije je prolaz kartica išao prije IBAN-a: IBAN sa separatorom iza kontrolnih cifara
+    # čijih zadnjih 16 cifara prolazi Luhn maskira se kao kartica
+    if len(value) > 4 and not value[4].isdigit():
+        card = _mask_card(value[5:])
+        if card is not None:
+            return value[:5] + card
+    return None
+
+
+def _mask_card(value: str) -> Optional[str]:
+    digits = _SEPARATORS_RE.sub('', value)
+    if len(digits) == 16 and luhn_check(digits):
+        # Show only last 4 digits
+        return "****-****-****-" + digits[-4:]
+    return None
+
+
+def _mask_jmbg(value: str) -> Optional[str]:
+    # Osnovna validacija: prve 4 cifre su dan i mjesec rođenja
+    day = int(value[0:2])
+    month = int(value[2:4])
+    if 1 <= day <= 31 and 1 <= month <= 12:
+        return f"{value[0:2]}***********"
+    return None
+
+
+def _mask_phone(value: str) -> Optional[str]:
+    # Keep only last 3 digits
+    if len(value.replace(' ', '').replace('-', '').replace('.', '')) >= 8:
+        return "[PHONE_XXX" + value[-3:] + "]"
+    return None
+
+
+# Masker vraća None kada validacija odbije match (tekst ostaje netaknut)
+_MASKERS = {
+    "email": _mask_email,
+    "iban": _mask_iban,
+    "card": _mask_card,
+    "jmbg": _mask_jmbg,
+    "phone_ba": _mask_phone,
+    "phone_mobile": _mask_phone,
+    "phone": _mask_phone,
+}
+
+
+class PIIScanner:
+    """
+    Single-pass PII maskiranje: jedan prekompajliran regex za sve tipove,
+    validacija (Luhn, JMBG datum) i maskiranje u jednom callback-u.
+
+    Rezultat je isti kao kod ranijih odvojenih prolaza (email, telefon, JMBG, kartica, IBAN),
+    osim za PII zalijepljen bez separatora uz drugi PII: stari prolazi su ponovo skenirali
+    već maskiran tekst (npr. '[PHONE_XXX012]3456' daje novu granicu riječi), ovdje se
+    skenira samo original.
+    """
+
+    def __init__(self, types: Iterable[str] = PII_TYPES):
+        self.types = frozenset(types)
+        self.pattern = _compile(self.types)
+
+    def mask(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """Vraća (maskiran tekst, broj maskiranih po pii_stats ključu)."""
+        counts = dict.fromkeys(PII_STATS_KEYS, 0)
+
+        def replace(match: "re.Match") -> str:
+            group = match.lastgroup
+            value = match.group()
+            if group == "iban":
+                card = _mask_iban_card(value)
+                if card is not None:
+                    counts["credit_cards"] += 1
+                    return card
+            masked = _MASKERS[group](value)
+            if masked is None:
+                return value
+            counts[_GROUP_STATS[group]] += 1
+            return masked
+
+        return self.pattern.sub(replace, text), counts
+
+
+def mask_texts(types: FrozenSet[str], texts: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """Maskira listu tekstova; top-level funkcija da bi se mogla slati u process pool."""
+    scanner = PIIScanner(types)
+    totals = dict.fromkeys(PII_STATS_KEYS, 0)
+    masked = []
+    for text in texts:
+        result, counts = scanner.mask(text)
+        masked.append(result)
+        for key, count in counts.items():
+            totals[key] += count
+    return masked, totals
@@ -1,13 +1,38 @@
-import re
-from typing import List, Dict, Tuple
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from .base import IngestAgent
+from .pii import PIIScanner, PII_STATS_KEYS, mask_texts
 from .types import IngestContext
+from app.core.config import settings
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pii_pool(workers: int) -> ProcessPoolExecutor:
+    """Dijeljeni process pool za PII maskiranje (kreira se pri prvom velikom dokumentu)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: fork procesa sa aktivnim thread-ovima (uvicorn, DB pool) nije siguran
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
 
 
 class PolicyAgent(IngestAgent):
     """
     PolicyAgent - Primjenjuje sigurnosne politike i maskira PII.
     Detektuje i maskira: email, telefon, JMBG, kartice, pasosi, etc.
+    Veliki dokumenti (>= parallel_threshold chunk-ova) se maskiraju u process pool-u.
     """
     
     def __init__(
@@ -15,13 +40,24 @@ class PolicyAgent(IngestAgent):
         mask_emails: bool = True,
         mask_phones: bool = True,
         mask_ids: bool = True,
-        mask_cards: bool = True
+        mask_cards: bool = True,
+        parallel_threshold: int = settings.PII_PARALLEL_THRESHOLD,
+        workers: int = settings.PII_WORKERS
     ):
         super().__init__("PolicyAgent", dependencies=["DedupAgent"])
         self.mask_emails = mask_emails
         self.mask_phones = mask_phones
         self.mask_ids = mask_ids
         self.mask_cards = mask_cards
+        self.parallel_threshold = parallel_threshold
+        self.workers = workers or os.cpu_count() or 1
+        types = {
+            "emails": mask_emails,
+            "phones": mask_phones,
+            "ids": mask_ids,
+            "cards": mask_cards,
+        }
+        self.scanner = PIIScanner([name for name, enabled in types.items() if enabled])
     
     async def process(self, context: IngestContext):
         """Primijeni sigurnosne politike na chunk-ove"""
@@ -29,49 +65,21 @@ class PolicyAgent(IngestAgent):
         if not context.chunks:
             return
         
-        masked_count = 0
-        pii_stats = {
-            "emails": 0,
-            "phones": 0,
-            "jmbg": 0,
-            "credit_cards": 0,
-            "iban": 0
-        }
+        # Skip duplicates
+        chunks = [chunk for chunk in context.chunks if not chunk.is_duplicate]
+        texts = [chunk.text for chunk in chunks]
         
-        # Apply masking to each chunk
-        for chunk in context.chunks:
-            if chunk.is_duplicate:
-                # Skip duplicates
-                continue
-            
-            original_text = chunk.text
-            masked_text = original_text
-            
-            # Mask emails
-            if self.mask_emails:
-                masked_text, count = self._mask_emails(masked_text)
-                pii_stats["emails"] += count
-            
-            # Mask phones
-            if self.mask_phones:
-                masked_text, count = self._mask_phones(masked_text)
-                pii_stats["phones"] += count
-            
-            # Mask JMBG (Bosnian ID)
-            if self.mask_ids:
-                masked_text, count = self._mask_jmbg(masked_text)
-                pii_stats["jmbg"] += count
-            
-            # Mask credit cards
-            if self.mask_cards:
-                masked_text, count = self._mask_credit_cards(masked_text)
-                pii_stats["credit_cards"] += count
-                
-                masked_text, count = self._mask_iban(masked_text)
-                pii_stats["iban"] += count
-            
+        if self.workers > 1 and 0 < self.parallel_threshold <= len(texts):
+            masked_texts, pii_stats = await self._mask_parallel(texts)
+            context.set_metric("pii_workers", self.workers)
+        else:
+            # Apply masking to each chunk (jedan regex prolaz po chunk-u)
+            masked_texts, pii_stats = mask_texts(self.scanner.types, texts)
+        
+        masked_count = 0
+        for chunk, masked_text in zip(chunks, masked_texts):
             # Update chunk if anything was masked
-            if masked_text != original_text:
+            if masked_text != chunk.text:
                 chunk.text = masked_text
                 chunk.metadata["pii_masked"] = True
                 masked_count += 1
@@ -83,124 +91,23 @@ class PolicyAgent(IngestAgent):
         context.set_metric("chunks_with_pii", masked_count)
         context.set_metric("total_pii_masked", sum(pii_stats.values()))
     
-    def _mask_emails(self, text: str) -> Tuple[str, int]:
-        """Maskira email adrese"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        
-        count = 0
-        def replacer(match):
-            nonlocal count
-            count += 1
-            email = match.group(0)
-            # Keep first char and domain
-            parts = email.split('@')
-            if len(parts) == 2:
-                return f"{parts[0][0]}***@{parts[1]}"
-            return "[EMAIL_MASKED]"
-        
-        masked_text = re.sub(email_pattern, replacer, text)
-        return masked_text, count
-    
-    def _mask_phones(self, text: str) -> Tuple[str, int]:
-        """Maskira telefonske brojeve"""
-        # Bosnian phones: +387 XX XXX XXX, 06X XXX XXX
-        phone_patterns = [
-            r'\+387\s?\d{2}\s?\d{3}\s?\d{3,4}',
-            r'\b06[0-9]\s?\d{3}\s?\d{3,4}\b',
-            r'\+\d{1,4}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}'
-        ]
-        
-        count = 0
-        masked_text = text
-        
-        for pattern in phone_patterns:
-            def replacer(match):
-                nonlocal count
-                phone = match.group(0)
-                # Keep only last 3 digits
-                if len(phone.replace(' ', '').replace('-', '').replace('.', '')) >= 8:
-                    count += 1
-                    return "[PHONE_XXX" + phone[-3:] + "]"
-                return phone
-            
-            masked_text = re.sub(pattern, replacer, masked_text)
-        
-        return masked_text, count
-    
-    def _mask_jmbg(self, text: str) -> Tuple[str, int]:
-        """Maskira JMBG (13-cifreni ID broj)"""
-        jmbg_pattern = r'\b\d{13}\b'
-        
-        count = 0
-        def replacer(match):
-            nonlocal count
-            jmbg = match.group(0)
-            # Validate JMBG (basic check: first 7 digits should be valid date)
-            try:
-                day = int(jmbg[0:2])
-                month = int(jmbg[2:4])
-                if 1 <= day <= 31 and 1 <= month <= 12:
-                    count += 1
-                    # Keep first 2 digits (day), mask rest
-                    return f"{jmbg[0:2]}***********"
-            except:
-                pass
-            return jmbg
-        
-        masked_text = re.sub(jmbg_pattern, replacer, text)
-        return masked_text, count
-    
-    def _mask_credit_cards(self, text: str) -> Tuple[str, int]:
-        """Maskira brojeve kreditnih kartica"""
-        # 16-digit cards (Visa, MasterCard, etc.) with optional spaces/dashes
-        card_pattern = r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'
-        
-        count = 0
-        def replacer(match):
-            nonlocal count
-            card = match.group(0)
-            # Basic Luhn check
-            digits = re.sub(r'[\s\-]', '', card)
-            if len(digits) == 16 and self._luhn_check(digits):
-                count += 1
-                # Show only last 4 digits
-                return "****-****-****-" + digits[-4:]
-            return card
-        
-        masked_text = re.sub(card_pattern, replacer, text)
-        return masked_text, count
-    
-    def _mask_iban(self, text: str) -> Tuple[str, int]:
-        """Maskira IBAN brojeve"""
-        # IBAN: BA39 1234 5678 9012 3456
-        iban_pattern = r'\b[A-Z]{2}\d{2}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'
-        
-        count = 0
-        def replacer(match):
-            nonlocal count
-            iban = match.group(0)
-            count += 1
-            # Keep country code, mask rest except last 4
-            country = iban[0:2]
-            digits = re.sub(r'[\s\-]', '', iban)[2:]
-            return f"{country}** **** **** **** {digits[-4:]}"
-        
-        masked_text = re.sub(iban_pattern, replacer, text, flags=re.IGNORECASE)
-        return masked_text, count
-    
-    def _luhn_check(self, card_number: str) -> bool:
-        """Luhn algorithm za validaciju broja kartice"""
-        try:
-            digits = [int(d) for d in card_number]
-            checksum = 0
-            
-            # Double every second digit from right
-            for i in range(len(digits) - 2, -1, -2):
-                digits[i] *= 2
-                if digits[i] > 9:
-                    digits[i] -= 9
-            
-            checksum = sum(digits)
-            return checksum % 10 == 0
-        except:
-            return False
+    async def _mask_parallel(self, texts: List[str]) -> Tuple[List[str], Dict[str, int]]:
+        """Podijeli tekstove u uzastopne shard-ove po radniku i spoji rezultate istim redoslijedom."""
+        pool = get_pii_pool(self.workers)
+        loop = asyncio.get_running_loop()
+        
+        # Više shard-ova od radnika izravnava neravnomjerne chunk-ove
+        shard_size = -(-len(texts) // (self.workers * 4))
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, mask_texts, self.scanner.types, shard)
+            for shard in shards
+        ])
+        
+        masked_texts: List[str] = []
+        pii_stats = dict.fromkeys(PII_STATS_KEYS, 0)
+        for shard_texts, counts in results:
+            masked_texts.extend(shard_texts)
+            for key, count in counts.items():
+                pii_stats[key] += count
+        return masked_texts, pii_stats
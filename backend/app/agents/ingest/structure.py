@@ -1,26 +1,53 @@
-from typing import List
+from bisect import bisect_right
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import asyncio
 import re
+from .analysis import block_preview, build_segments, parse_structure
 from .base import IngestAgent
-from .types import IngestContext, DocumentSegment, ProcessedChunk
+from .llm import chat_json
+from .types import IngestContext, DocumentSegment, ProcessedChunk, TextBlock
 from app.core.config import settings
+from app.services.context import count_tokens
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import get_async_llm_client
 except ImportError:
-    get_llm_client = None
+    get_async_llm_client = None
+
+
+# Broj prethodnih blokova koje prozor vidi kao kontekst (granica sekcije/liste)
+WINDOW_CONTEXT_BLOCKS = 2
+# Koliko blokova unazad se traže heuristički naslovi za hijerarhiju prozora
+HEADING_LOOKBACK_BLOCKS = 200
+# Numeracija "[i] " i novi red po bloku
+_LINE_TOKENS = 3
+
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+_OVERLAP_BREAK_RE = re.compile(r'[.!?]\s+')
+_LEADING_SPACE_RE = re.compile(r'\s*')
+# Maksimalna dužina naslova u metadata["section"]
+MAX_SECTION_CHARS = 200
 
 
 class StructureAgent(IngestAgent):
     """
     StructureAgent - Strukturira dokument u segmente i pravi pametne chunk-ove.
-    LLM mode: Koristi LLM za detekciju strukture, naslova, sekcija
+    LLM mode: Koristi LLM za detekciju strukture, naslova, sekcija (prozori nad cijelim dokumentom)
     Fallback mode: Heuristička segmentacija na osnovu formatiranja
     """
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        super().__init__("StructureAgent", dependencies=["ExtractAgent"])
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        window_tokens: int = settings.INGEST_SEGMENT_WINDOW_TOKENS,
+        concurrency: int = settings.INGEST_SEGMENT_CONCURRENCY
+    ):
+        super().__init__("StructureAgent", dependencies=["ExtractAgent"], optional_dependencies=["AnalysisAgent"])
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.window_tokens = window_tokens
+        self.concurrency = max(1, concurrency)
         self.llm_available = bool(settings.OPENAI_API_KEY)
     
     async def process(self, context: IngestContext):
@@ -31,7 +58,16 @@ class StructureAgent(IngestAgent):
             return
         
         # Step 1: Segmentacija
-        if self.llm_available:
+        if context.analysis is not None:
+            # Struktura iz zajedničke analize; blokovi van njenog budžeta idu kroz prozore
+            covered = context.analysis.blocks_covered
+            context.segments.extend(context.analysis.segments)
+            if covered < len(context.blocks):
+                if self.llm_available:
+                    await self._llm_segmentation(context, covered)
+                else:
+                    await self._heuristic_segmentation(context, context.blocks[covered:])
+        elif self.llm_available:
             await self._llm_segmentation(context)
         else:
             await self._heuristic_segmentation(context)
@@ -43,77 +79,135 @@ class StructureAgent(IngestAgent):
         context.set_metric("segments", len(context.segments))
         context.set_metric("chunks_created", len(context.chunks))
     
-    async def _llm_segmentation(self, context: IngestContext):
-        """LLM-bazirana segmentacija sa strukturom"""
-        if get_llm_client is None:
-            await self._heuristic_segmentation(context)
-            return
-        
-        llm = get_llm_client()
+    async def _llm_segmentation(self, context: IngestContext, start: int = 0):
+        """
+        Map-reduce LLM segmentacija blokova od start do kraja dokumenta.
+        Map: blokovi se dijele u prozore ograničene tokenima i segmentiraju konkurentno
+        (najviše self.concurrency poziva odjednom); svaki prozor vidi i par prethodnih
+        blokova kao kontekst. Reduce: anotacije se spajaju po indeksu bloka (svaki blok
+        pripada tačno jednom prozoru), a nivoi naslova se usklađuju preko granica prozora.
+        """
+        llm = get_async_llm_client() if get_async_llm_client is not None else None
         if llm is None:
-            await self._heuristic_segmentation(context)
+            await self._heuristic_segmentation(context, context.blocks[start:])
             return
         
-        # Combine first few blocks for structure detection
-        sample_text = "\n\n".join([block.text for block in context.blocks[:10]])[:3000]
+        previews = [block_preview(block) for block in context.blocks]
+        windows = self._segment_windows(previews, start)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        results = await asyncio.gather(
+            *(self._segment_window(llm, semaphore, context, previews, lo, hi) for lo, hi in windows),
+            return_exceptions=True
+        )
+        
+        first_new = len(context.segments)
+        failed = 0
+        for (lo, hi), result in zip(windows, results):
+            if isinstance(result, BaseException):
+                # Neuspio prozor ne ruši ostale - samo njegovi blokovi idu heuristički
+                failed += 1
+                context.add_error(
+                    f"LLM segmentacija greška (blokovi {lo}-{hi - 1}): "
+                    f"{str(result) or type(result).__name__}, prebacujem na heuristike"
+                )
+                await self._heuristic_segmentation(context, context.blocks[lo:hi])
+            else:
+                context.segments.extend(build_segments(result, context.blocks, lo, hi, "llm"))
+        
+        self._reconcile_heading_levels(context.segments, first_new)
+        context.set_metric("segment_windows", len(windows))
+        context.set_metric("segment_windows_failed", failed)
+    
+    def _segment_windows(self, previews: List[str], start: int) -> List[Tuple[int, int]]:
+        """Uzastopni (lo, hi) rasponi blokova sa najviše window_tokens tokena (min. jedan blok)"""
+        windows = []
+        lo = start
+        used = 0
+        for idx in range(start, len(previews)):
+            tokens = count_tokens(previews[idx], settings.CHAT_MODEL) + _LINE_TOKENS
+            if idx > lo and used + tokens > self.window_tokens:
+                windows.append((lo, idx))
+                lo, used = idx, 0
+            used += tokens
+        if lo < len(previews):
+            windows.append((lo, len(previews)))
+        return windows
+    
+    async def _segment_window(
+        self,
+        llm,
+        semaphore: asyncio.Semaphore,
+        context: IngestContext,
+        previews: List[str],
+        lo: int,
+        hi: int
+    ) -> Dict[int, Dict[str, Any]]:
+        """Anotacije (tip, nivo) za blokove [lo, hi)"""
+        headings = self._preceding_headings(context.blocks, lo)
+        outline = ""
+        if headings:
+            outline = "Prethodni naslovi u dokumentu:\n" + "\n".join(
+                f"{'  ' * (level - 1)}{text}" for text, level in headings
+            ) + "\n\n"
+        
+        overlap = ""
+        if lo > 0:
+            overlap = "Kontekst (prethodni blokovi, ne klasifikuj ih):\n" + "\n".join(
+                f"[{idx}] {previews[idx]}" for idx in range(max(0, lo - WINDOW_CONTEXT_BLOCKS), lo)
+            ) + "\n\n"
         
-        prompt = f"""Analiziraj sljedeći tekst dokumenta i identifikuj strukturu:
+        blocks_text = "\n".join(f"[{idx}] {previews[idx]}" for idx in range(lo, hi))
+        
+        prompt = f"""Identifikuj strukturu dijela dokumenta "{context.filename}" (blokovi {lo}-{hi - 1} od ukupno {len(previews)}). Blokovi su numerisani ([broj]), dugi blokovi su skraćeni.
 
-{sample_text}
+{outline}{overlap}Blokovi:
+{blocks_text}
 
 Odgovori sa JSON:
 {{
-  "segments": [
-    {{"type": "heading|section|paragraph", "level": 0-3, "text": "...", "summary": "..."}}
+  "structure": [
+    {{"block": {lo}, "type": "heading|section|list|table", "level": 0-3}}
   ]
 }}
 
 Pravila:
-- Detektuj naslove (heading) i njihov nivo hijerarhije (1=glavni, 2=podnaslov, 3=sekcija)
-- Grupiši paragrafe u sekcije
-- Sažmi svaki segment u 1-2 rečenice"""
-        
-        try:
-            response = llm.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=1500
-            )
-            
-            # Parse LLM response (basic JSON extraction)
-            import json
-            content = response.choices[0].message.content
-            
-            if not content:
-                raise ValueError("Empty LLM response")
-            
-            # Extract JSON from markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            data = json.loads(content.strip())
-            
-            # Create segments from LLM response
-            for seg_data in data.get("segments", []):
-                segment = DocumentSegment(
-                    text=seg_data.get("text", ""),
-                    segment_type=seg_data.get("type", "paragraph"),
-                    level=seg_data.get("level", 0),
-                    metadata={"summary": seg_data.get("summary", ""), "source": "llm"}
-                )
-                context.segments.append(segment)
-                
-        except Exception as e:
-            context.add_error(f"LLM segmentacija greška: {str(e)}, prebacujem na heuristike")
-            await self._heuristic_segmentation(context)
+- Navedi samo blokove iz dijela "Blokovi" koji nisu obični paragrafi
+- Nivo naslova: 1=glavni, 2=podnaslov, 3=sekcija, usklađen sa prethodnim naslovima"""
+        
+        async with semaphore:
+            data = await chat_json(llm, prompt, temperature=0.2, max_tokens=1000, json_mode=True)
+        
+        annotations = parse_structure(data.get("structure") or [])
+        return {idx: item for idx, item in annotations.items() if lo <= idx < hi}
+    
+    def _preceding_headings(self, blocks: List[TextBlock], lo: int, limit: int = 3) -> List[Tuple[str, int]]:
+        """Heuristički naslovi prije prozora - sidro hijerarhije bez sekvencijalnih LLM poziva"""
+        headings = []
+        for idx in range(lo - 1, max(-1, lo - 1 - HEADING_LOOKBACK_BLOCKS), -1):
+            text = blocks[idx].text.strip()
+            if blocks[idx].block_type == "heading" or self._is_heading(text):
+                headings.append((block_preview(blocks[idx]), self._detect_heading_level(text)))
+                if len(headings) >= limit:
+                    break
+        return headings[::-1]
     
-    async def _heuristic_segmentation(self, context: IngestContext):
+    def _reconcile_heading_levels(self, segments: List[DocumentSegment], first_new: int):
+        """Naslov ne smije preskočiti nivo u odnosu na prethodni (npr. 1 -> 3 na granici prozora)"""
+        previous = 0
+        for segment in segments[:first_new]:
+            if segment.segment_type == "heading":
+                previous = segment.level
+        
+        for segment in segments[first_new:]:
+            if segment.segment_type == "heading":
+                segment.level = min(segment.level, previous + 1)
+                previous = segment.level
+    
+    async def _heuristic_segmentation(self, context: IngestContext, blocks: Optional[List[TextBlock]] = None):
         """Heuristička segmentacija bez LLM-a"""
         
-        for block in context.blocks:
+        for block in context.blocks if blocks is None else blocks:
             # Detect heading based on block type or text patterns
             level = 0
             segment_type = "paragraph"
@@ -173,63 +267,129 @@ Pravila:
     async def _create_chunks(self, context: IngestContext):
         """Kreiraj chunk-ove sa pametnim granama"""
         
-        # Combine segments into full text
-        full_text = "\n\n".join([seg.text for seg in context.segments])
+        # Combine segments into full text (jedina kopija teksta; chunk-ovi se grade iz raspona u njemu)
+        full_text, headings = self._join_segments(context.segments)
         
         if not full_text.strip():
             context.add_error("Nema teksta za chunking")
             return
         
-        # Smart chunking - poštuje granice rečenica
-        sentences = self._split_into_sentences(full_text)
-        
-        current_chunk = ""
+        context.chunks.extend(self._iter_chunks(full_text, headings))
+    
+    def _join_segments(self, segments: List[DocumentSegment]) -> Tuple[str, List[Tuple[int, str]]]:
+        """Tekst segmenata spojen praznim redom i (offset, tekst) naslova u tom tekstu"""
+        headings = []
+        offset = 0
+        for segment in segments:
+            if segment.segment_type == "heading" and segment.text.strip():
+                headings.append((offset, " ".join(segment.text.split())[:MAX_SECTION_CHARS]))
+            offset += len(segment.text) + 2
+        return "\n\n".join(segment.text for segment in segments), headings
+    
+    def _iter_chunks(self, text: str, headings: List[Tuple[int, str]]) -> Iterator[ProcessedChunk]:
+        """
+        Sentence-aware chunking nad offsetima u tekstu: chunk je lista (start, end) dijelova
+        teksta (rečenice, prvi dio može biti overlap od sredine rečenice) koji se spajaju
+        jednim razmakom, kao ranije chunk += " " + rečenica. Dužina se vodi brojem, bez
+        građenja stringa, a str se pravi samo kad se chunk emituje, pa su vrijeme i memorija
+        linearni u dužini teksta. _create_chunks sve chunk-ove odmah puni u context.chunks.
+        metadata["section"] je naslov pod kojim počinje novi (ne-overlap) dio chunk-a,
+        za weighted search_vector.
+        """
+        heading_offsets = [offset for offset, _ in headings]
         chunk_index = 0
+        pieces: List[Tuple[int, int]] = []
+        # len(" ".join(dijelova)), uključujući eventualni vodeći razmak overlap-a
+        length = 0
+        anchor = -1
         
-        for sentence in sentences:
+        for sentence_start, sentence_end in self._sentence_spans(text):
+            sentence_length = sentence_end - sentence_start
             # Check if adding this sentence exceeds chunk_size
-            if len(current_chunk) + len(sentence) > self.chunk_size and current_chunk:
-                # Save current chunk
-                chunk = ProcessedChunk(
-                    text=current_chunk.strip(),
-                    chunk_index=chunk_index,
-                    metadata={"char_count": len(current_chunk), "source": "structure"}
-                )
-                context.chunks.append(chunk)
-                
-                # Start new chunk with overlap
-                overlap_text = self._get_overlap(current_chunk)
-                current_chunk = overlap_text + " " + sentence
+            if pieces and length + sentence_length > self.chunk_size:
+                yield self._emit_chunk(text, pieces, length, anchor, chunk_index, headings, heading_offsets)
                 chunk_index += 1
+                # Start new chunk with overlap
+                pieces, length = self._overlap_pieces(text, pieces, length)
+                anchor = sentence_start
+                length += 1
+            elif not pieces:
+                anchor = sentence_start
             else:
-                current_chunk += " " + sentence if current_chunk else sentence
+                length += 1
+            pieces.append((sentence_start, sentence_end))
+            length += sentence_length
         
         # Add last chunk
-        if current_chunk.strip():
-            chunk = ProcessedChunk(
-                text=current_chunk.strip(),
-                chunk_index=chunk_index,
-                metadata={"char_count": len(current_chunk), "source": "structure"}
-            )
-            context.chunks.append(chunk)
+        if pieces:
+            yield self._emit_chunk(text, pieces, length, anchor, chunk_index, headings, heading_offsets)
     
-    def _split_into_sentences(self, text: str) -> List[str]:
-        """Split tekst u rečenice"""
-        # Simple sentence splitting (can be improved with NLTK)
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        return [s.strip() for s in sentences if s.strip()]
+    def _emit_chunk(
+        self,
+        text: str,
+        pieces: List[Tuple[int, int]],
+        length: int,
+        anchor: int,
+        chunk_index: int,
+        headings: List[Tuple[int, str]],
+        heading_offsets: List[int]
+    ) -> ProcessedChunk:
+        metadata = {"char_count": length, "source": "structure"}
+        # Sekcija prve nove rečenice (anchor), ne overlap-a iz prethodnog chunk-a
+        position = bisect_right(heading_offsets, anchor) - 1
+        if position >= 0:
+            metadata["section"] = headings[position][1]
+        chunk_text = " ".join(text[start:end] for start, end in pieces).strip()
+        return ProcessedChunk(text=chunk_text, chunk_index=chunk_index, metadata=metadata)
     
-    def _get_overlap(self, text: str) -> str:
-        """Uzmi overlap sa kraja chunk-a"""
-        if len(text) <= self.chunk_overlap:
-            return text
-        
-        # Take last chunk_overlap chars, but try to start at sentence boundary
-        overlap_text = text[-self.chunk_overlap:]
+    def _sentence_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(start, end) rečenica bez okolnog razmaka - granica je razmak nakon . ! ? (bez kopiranja teksta)"""
+        # Razmak na rubu može imati samo prva i zadnja rečenica teksta
+        position = _LEADING_SPACE_RE.match(text).end()
+        for match in _SENTENCE_BREAK_RE.finditer(text, position):
+            # Raspon između dva prekida uvijek sadrži interpunkciju, pa nije prazan
+            if match.start() > position:
+                yield position, match.start()
+            position = match.end()
+        end = len(text)
+        while end > position and text[end - 1].isspace():
+            end -= 1
+        if position < end:
+            yield position, end
+    
+    def _overlap_pieces(self, text: str, pieces: List[Tuple[int, int]], length: int) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Overlap novog chunk-a: od prve granice rečenice u zadnjih chunk_overlap znakova
+        spojenog chunk-a (ili cijeli tail ako granice nema). Gradi se samo tail, ne cijeli chunk.
+        Vraća (dijelovi, dužina).
+        """
+        if length <= self.chunk_overlap:
+            return pieces, length
         
-        # Find first sentence boundary
-        match = re.search(r'[.!?]\s+', overlap_text)
-        if match:
-            return overlap_text[match.end():]
+        # Tail spojenog chunk-a od pozadi: (pozicija u tail-u, start, end) po dijelu
+        tail: List[Tuple[int, int, int]] = []
+        remaining = self.chunk_overlap
+        for start, end in reversed(pieces):
+            if tail:
+                # Razmak kojim se dio spaja sa sljedećim
+                remaining -= 1
+                if remaining <= 0:
+                    break
+            start = max(start, end - remaining)
+            remaining -= end - start
+            tail.append((remaining, start, end))
+            if remaining <= 0:
+                break
+        tail.reverse()
+        # Ispred prvog dijela može biti samo razmak (spajanje ili vodeći razmak overlap-a)
+        tail_text = " " * tail[0][0] + " ".join(text[start:end] for _, start, end in tail)
         
-        return overlap_text
+        match = _OVERLAP_BREAK_RE.search(tail_text)
+        offset = match.end() if match else 0
+        overlap = []
+        for position, start, end in tail:
+            if position + (end - start) <= offset:
+                continue
+            overlap.append((start + max(offset - position, 0), end))
+        # Bez granice tail može početi razmakom spajanja (broji se u dužinu, kao ranije)
+        return overlap, self.chunk_overlap - offset
@@ -3,13 +3,14 @@ import csv
 import io
 from typing import List, Dict, Any
 from .base import IngestAgent
+from .llm import chat_json
 from .types import IngestContext, TableData
 from app.core.config import settings
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import get_async_llm_client
 except ImportError:
-    get_llm_client = None
+    get_async_llm_client = None
 
 
 class TableAgent(IngestAgent):
@@ -20,7 +21,7 @@ class TableAgent(IngestAgent):
     """
     
     def __init__(self, use_llm: bool = True):
-        super().__init__("TableAgent", dependencies=["ExtractAgent"])
+        super().__init__("TableAgent", dependencies=["ExtractAgent"], optional_dependencies=["AnalysisAgent"])
         self.use_llm = use_llm and bool(settings.OPENAI_API_KEY)
     
     async def process(self, context: IngestContext):
@@ -37,8 +38,14 @@ class TableAgent(IngestAgent):
                 # Validate and clean table
                 cleaned_table = await self._clean_table(table)
                 
+                # Ispravke iz zajedničke analize dokumenta (bez poziva po tabeli)
+                if context.analysis is not None:
+                    enhancement = context.analysis.tables.get(idx)
+                    if enhancement:
+                        self._apply_enhancement(cleaned_table, enhancement)
+                
                 # Enhance with LLM if available
-                if self.use_llm and len(table.rows) > 2:
+                elif self.use_llm and len(table.rows) > 2:
                     enhanced_table = await self._llm_enhance_table(cleaned_table, context)
                     if enhanced_table:
                         cleaned_table = enhanced_table
@@ -117,7 +124,12 @@ class TableAgent(IngestAgent):
     
     async def _llm_enhance_table(self, table: TableData, context: IngestContext) -> TableData:
         """LLM enhancement - provjerava header-e, tipove, značenje kolona"""
-        llm = get_llm_client()
+        if get_async_llm_client is None:
+            return table
+        
+        llm = get_async_llm_client()
+        if llm is None:
+            return table
         
         # Create table preview
         preview_rows = table.rows[:5]
@@ -140,37 +152,25 @@ Pravila:
 - Zadrži isti broj kolona"""
         
         try:
-            response = await llm.chat_completion(
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=500
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Clean JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            data = json.loads(content.strip())
-            
-            # Update headers if valid
-            new_headers = data.get("headers", [])
-            if len(new_headers) == len(table.headers):
-                table.headers = new_headers
-            
-            # Store metadata
-            table.metadata["column_types"] = data.get("column_types", [])
-            table.metadata["description"] = data.get("description", "")
-            table.metadata["enhanced"] = True
+            data = await chat_json(llm, prompt, temperature=0.2, max_tokens=500)
+            self._apply_enhancement(table, data)
             
         except Exception as e:
-            context.add_error(f"LLM table enhancement greška: {str(e)}")
+            context.add_error(f"LLM table enhancement greška: {str(e) or type(e).__name__}")
         
         return table
     
+    def _apply_enhancement(self, table: TableData, data: Dict[str, Any]):
+        """Primijeni header-e (samo uz isti broj kolona), tipove kolona i opis"""
+        new_headers = data.get("headers") or []
+        if len(new_headers) == len(table.headers):
+            table.headers = new_headers
+        
+        # Store metadata
+        table.metadata["column_types"] = data.get("column_types", [])
+        table.metadata["description"] = data.get("description", "")
+        table.metadata["enhanced"] = True
+    
     def _table_to_text(self, headers: List[str], rows: List[List[str]]) -> str:
         """Convert table to readable text"""
         lines = []
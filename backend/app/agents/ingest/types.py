@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
@@ -47,10 +47,27 @@ class ProcessedChunk:
     """Procesovani chunk sa embeddingom"""
     text: str
     chunk_index: int
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Any] = None  # float32 np.ndarray
     metadata: Dict[str, Any] = field(default_factory=dict)
     is_duplicate: bool = False
-    deduplicated_with: Optional[str] = None  # hashOriginating chunk-a
+    deduplicated_with: Optional[str] = None  # hash originating chunk-a ili ID već indeksiranog chunk-a
+    duplicate_of_index: Optional[int] = None  # chunk_index originala u istom dokumentu
+    signature: Optional[Any] = None  # MinHash uint32 np.ndarray (DedupAgent)
+    band_hashes: Optional[Any] = None  # LSH band hash-evi uint64 np.ndarray (DedupAgent)
+    lsh_scheme: Optional[Tuple[int, int]] = None  # (bands, rows) pod kojima su band_hashes izračunati
+
+
+@dataclass
+class DocumentAnalysis:
+    """Rezultat jednog structured-output poziva AnalysisAgent-a"""
+    segments: List[DocumentSegment] = field(default_factory=list)
+    blocks_covered: int = 0  # segments pokrivaju context.blocks[:blocks_covered]
+    doc_type: Optional[str] = None
+    doc_type_confidence: float = 0.0
+    language: str = "unknown"
+    keywords: List[str] = field(default_factory=list)
+    entities: List[ExtractedEntity] = field(default_factory=list)
+    tables: Dict[int, Dict[str, Any]] = field(default_factory=dict)  # indeks u context.tables -> headers, column_types, description
 
 
 @dataclass
@@ -59,7 +76,7 @@ class IngestContext:
     document_id: str
     file_path: str
     filename: str
-    user_id: int
+    user_id: Optional[str]  # documents.created_by (UUID)
     
     # Extracted data
     raw_text: str = ""
@@ -76,6 +93,9 @@ class IngestContext:
     # Tables
     tables: List[TableData] = field(default_factory=list)
     
+    # Zajednička analiza dokumenta (AnalysisAgent, opcionalno)
+    analysis: Optional[DocumentAnalysis] = None
+    
     # Chunks (after dedup and policy)
     chunks: List[ProcessedChunk] = field(default_factory=list)
     
@@ -47,6 +47,7 @@ class ProcessingContext:
     document_id: str
     file_path: str
     filename: str
+    owner_id: Optional[str] = None  # documents.created_by, denormalizuje se na chunk-ove
     mime_type: Optional[str] = None
     document_type: DocumentType = DocumentType.UNKNOWN
     
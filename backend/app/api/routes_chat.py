@@ -17,10 +17,13 @@ async def chat(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        rag = RAGPipeline(db)
+        rag = RAGPipeline(db, owner_id=current_user.id)
         result = await rag.generate_answer(
             query=request.query,
-            top_k=request.top_k
+            top_k=request.top_k,
+            precision=request.precision,
+            filters=request.filters,
+            debug=request.debug
         )
         
         citations = [Citation(**c) for c in result["citations"]]
@@ -34,7 +37,9 @@ async def chat(
             citations=citations,
             query=result["query"],
             verdict=verdict,
-            summary=result.get("summary")
+            summary=result.get("summary"),
+            timings=result.get("timings"),
+            context_usage=result.get("context_usage")
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -47,10 +52,12 @@ async def search(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        search_service = SearchService(db)
+        search_service = SearchService(db, owner_id=current_user.id)
         results = await search_service.hybrid_search(
             query=request.query,
-            top_k=request.top_k
+            top_k=request.top_k,
+            precision=request.precision,
+            filters=request.effective_filters()
         )
         
         citations = []
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List
@@ -6,12 +6,15 @@ from pathlib import Path
 import aiofiles
 import uuid
 from app.core.db import get_db
+from app.core.indexes import tenant_index_job
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
 from app.models.external_source import IngestJob
 from app.schemas.document import DocumentResponse, DocumentListResponse, AgentLog
 from app.services.pipeline import DocumentPipeline
+from app.services.chunk_store import promote_linked_chunks, remove_document_chunks
+from app.agents.ingest.meta import detect_doc_type, find_document_date
 from app.core.config import settings
 import os
 
@@ -20,6 +23,7 @@ router = APIRouter(prefix="/documents", tags=["documents"])
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -77,7 +81,10 @@ async def upload_document(
             "chunk_overlap": context.metadata.get("chunk_overlap", 200),
             "indexed_chunks": context.metadata.get("indexed_chunks", 0),
             "mime_type": context.metadata.get("mime_type", ""),
-            "file_size": context.metadata.get("file_size", 0)
+            "file_size": context.metadata.get("file_size", 0),
+            # Filteri pretrage (SearchFilters.doc_type / date_from / date_to)
+            "doc_type": detect_doc_type(context.text_content),
+            "document_date": find_document_date(context.text_content)
         }
         
         job.status = "completed"
@@ -89,6 +96,9 @@ async def upload_document(
         db.refresh(document)
         db.refresh(job)
         
+        # Parcijalni ANN indeks tenanta se gradi nakon odgovora (CONCURRENTLY), ne u request-u
+        background_tasks.add_task(tenant_index_job, current_user.id)
+        
     except Exception as e:
         document.status = "error"
         job.status = "failed"
@@ -205,6 +215,11 @@ async def delete_document(
         except Exception as e:
             print(f"Failed to delete file {document.file_path}: {e}")
     
+    # Chunk-ovi koje drugi dokumenti linkuju (dedup) se sele na link umjesto CASCADE brisanja
+    promote_linked_chunks(db, [document.id])
+    # In-process vektorski indeks (VECTOR_BACKEND=hnsw) ne vidi CASCADE
+    remove_document_chunks(db, [document.id])
+
     # CASCADE brisanje će automatski obrisati:
     # - document_chunks (svi chunk-ovi)
     # - document_relations (sve relacije)
@@ -238,6 +253,9 @@ async def delete_all_documents(
     deleted_count = 0
     deleted_files = []
     
+    promote_linked_chunks(db, [document.id for document in documents])
+    remove_document_chunks(db, [document.id for document in documents])
+    
     for document in documents:
         # Brisanje fizičkog fajla
         if document.file_path and Path(document.file_path).exists():
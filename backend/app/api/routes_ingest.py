@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.core.db import get_db
+from app.core.indexes import tenant_index_job
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
@@ -18,6 +19,7 @@ router = APIRouter(prefix="/ingest", tags=["ingestion"])
 
 @router.post("/sql", response_model=SQLIngestResponse)
 async def ingest_from_sql(
+    background_tasks: BackgroundTasks,
     request: SQLIngestRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -52,7 +54,8 @@ async def ingest_from_sql(
         context = ProcessingContext(
             document_id=str(document.id),
             file_path="",
-            filename=f"SQL:{request.source_name}"
+            filename=f"SQL:{request.source_name}",
+            owner_id=str(current_user.id)
         )
         
         sql_agent = SQLIngestAgent(
@@ -87,6 +90,9 @@ async def ingest_from_sql(
         db.refresh(document)
         db.refresh(job)
         
+        # Parcijalni ANN indeks tenanta se gradi nakon odgovora (CONCURRENTLY), ne u request-u
+        background_tasks.add_task(tenant_index_job, current_user.id)
+        
         return SQLIngestResponse(
             document_id=document.id,
             job_id=job.id,
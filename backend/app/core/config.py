@@ -5,7 +5,7 @@ from pydantic import Field, SecretStr
 
 class Settings(BaseSettings):
     # Core
-    DATABASE_URL: str = "postgresql+psycopg2://raguser:ragpass@db:5432/multirag"
+    DATABASE_URL: str = "postgresql+psycopg://raguser:ragpass@db:5432/multirag"
     SECRET_KEY: str = os.getenv("SESSION_SECRET", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -18,16 +18,78 @@ class Settings(BaseSettings):
     EMBEDDINGS_PROVIDER: str = os.getenv("EMBEDDINGS_PROVIDER", "openai")
     EMBEDDINGS_DIM: int = int(os.getenv("EMBEDDINGS_DIM", "1536"))
     EMBEDDINGS_MODEL: str = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
+    # text-embedding-3 podržava skraćene (Matryoshka) embeddinge
+    EMBEDDINGS_SHORTLIST_DIM: int = int(os.getenv("EMBEDDINGS_SHORTLIST_DIM", "256"))
 
     CHAT_MODEL: str = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+    # Timeout (sekunde) za LLM pozive u ingest agentima
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "30"))
     RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "5"))
     AGENT_REWRITES: int = int(os.getenv("AGENT_REWRITES", "2"))
     JUDGE_STRICTNESS: str = os.getenv("JUDGE_STRICTNESS", "medium")
+    # Post-retrieval: kandidati = top_k * RAG_CANDIDATE_MULTIPLIER, pa MMR bira top_k
+    RAG_CANDIDATE_MULTIPLIER: int = int(os.getenv("RAG_CANDIDATE_MULTIPLIER", "4"))
+    # 1.0 = bez diverzifikacije, manje = manje gotovo identičnih (overlap) chunk-ova
+    RAG_MMR_LAMBDA: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    # RRF težina rewrite upita u odnosu na originalni upit (1.0)
+    RAG_REWRITE_WEIGHT: float = float(os.getenv("RAG_REWRITE_WEIGHT", "0.7"))
+    # Broj susjednih chunk-ova (po chunk_index) sa svake strane hita; 0 = isključeno
+    RAG_NEIGHBOR_WINDOW: int = int(os.getenv("RAG_NEIGHBOR_WINDOW", "0"))
+    # Token budžet za KONTEKST u promptu za generisanje (tiktoken za CHAT_MODEL)
+    RAG_CONTEXT_TOKENS: int = int(os.getenv("RAG_CONTEXT_TOKENS", "6000"))
+
+    # Vector index (pgvector)
+    # hnsw | ivfflat - IVFFlat centroidi se treniraju na postojećim podacima, HNSW ne treba trening
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    IVFFLAT_LISTS: int = int(os.getenv("IVFFLAT_LISTS", "100"))
+    VECTOR_INDEX_BUILD_MEM: str = os.getenv("VECTOR_INDEX_BUILD_MEM", "512MB")
+    # true = startup u pozadini usklađuje indeks (CONCURRENTLY); inače `python -m app.manage vector-index`
+    VECTOR_INDEX_AUTOCREATE: bool = os.getenv("VECTOR_INDEX_AUTOCREATE", "false").lower() == "true"
+    # pgvector >= 0.8: nastavi skeniranje indeksa dok filter (tenant, status) ne popuni top_k
+    # strict_order | relaxed_order | off
+    VECTOR_ITERATIVE_SCAN: str = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    # Tenant sa ovoliko chunk-ova dobija vlastiti parcijalni HNSW indeks
+    TENANT_INDEX_MIN_CHUNKS: int = int(os.getenv("TENANT_INDEX_MIN_CHUNKS", "20000"))
+    # Kompaktni ANN indeks + rerank top kandidata na full-precision vektorima
+    # none | halfvec | binary | matryoshka
+    VECTOR_SHORTLIST: str = os.getenv("VECTOR_SHORTLIST", "none")
+    VECTOR_RERANK_CANDIDATES: int = int(os.getenv("VECTOR_RERANK_CANDIDATES", "200"))
+    # fast | balanced | high - default recall/latency trade-off po upitu
+    VECTOR_SEARCH_PRECISION: str = os.getenv("VECTOR_SEARCH_PRECISION", "balanced")
+    # pgvector | hnsw - hnsw = in-process graf (app.services.vector_index) sa mmap fajlovima
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "pgvector")
+    VECTOR_INDEX_DIR: str = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+
+    # Keyword leg hibridne pretrage
+    # postgres (to_tsvector/ts_rank) | bm25 (in-process indeks, app.services.lexical_index)
+    LEXICAL_BACKEND: str = os.getenv("LEXICAL_BACKEND", "postgres")
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    # RRF fuzija vektorskog i keyword leg-a u RAG/hybrid pretrazi; false = samo vektorski leg
+    HYBRID_SEARCH: bool = os.getenv("HYBRID_SEARCH", "false").lower() == "true"
+
+    # Observability
+    # Ako je true, /chat uvijek vraća timings blok; inače samo uz request.debug
+    RAG_DEBUG_TIMINGS: bool = os.getenv("RAG_DEBUG_TIMINGS", "false").lower() == "true"
 
 
     # Ingest/pipeline
     OCR_ENABLED: bool = os.getenv("OCR_ENABLED", "true").lower() == "true"
     PIPELINE_MODE: str = os.getenv("PIPELINE_MODE", "full")
+    # DedupAgent: near-duplicate prag i provjera protiv već indeksiranih chunk-ova (chunk_lsh_bands)
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+    DEDUP_CROSS_DOCUMENT: bool = os.getenv("DEDUP_CROSS_DOCUMENT", "true").lower() == "true"
+    # PolicyAgent: PII maskiranje u process pool-u kada broj chunk-ova pređe prag (0 radnika = cpu_count)
+    PII_PARALLEL_THRESHOLD: int = int(os.getenv("PII_PARALLEL_THRESHOLD", "2000"))
+    PII_WORKERS: int = int(os.getenv("PII_WORKERS", "0"))
+    # AnalysisAgent: budžet znakova (pregledi blokova + tabela) za jedan zajednički LLM poziv
+    INGEST_ANALYSIS_CHARS: int = int(os.getenv("INGEST_ANALYSIS_CHARS", "12000"))
+    # StructureAgent: LLM segmentacija u prozorima od N tokena, najviše M konkurentnih poziva
+    INGEST_SEGMENT_WINDOW_TOKENS: int = int(os.getenv("INGEST_SEGMENT_WINDOW_TOKENS", "2500"))
+    INGEST_SEGMENT_CONCURRENCY: int = int(os.getenv("INGEST_SEGMENT_CONCURRENCY", "8"))
 
     # Eksterni izvori (opciono)
     EXTERNAL_DB_URL: Optional[str] = os.getenv("EXTERNAL_DB_URL")
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -14,6 +15,43 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+
+@event.listens_for(engine, "connect")
+def _register_vector_adapter(dbapi_connection, connection_record):
+    """
+    Registruj pgvector adapter na svakoj novoj konekciji.
+    psycopg (3): NumPy float32 nizovi se šalju/čitaju u binarnom vector formatu.
+    psycopg2: fallback na tekstualni adapter (isti API, bez binarnog protokola).
+    """
+    if engine.dialect.driver == "psycopg":
+        from pgvector.psycopg import register_vector
+    else:
+        from pgvector.psycopg2 import register_vector
+
+    try:
+        register_vector(dbapi_connection)
+    except engine.dialect.loaded_dbapi.ProgrammingError as e:
+        # Samo "vector type not found" (ekstenzija još ne postoji); ostale greške se propagiraju
+        if "vector type not found" not in str(e):
+            raise
+        dbapi_connection.rollback()
+        connection_record.info["vector_registered"] = False
+        logger.warning("pgvector adapter nije registrovan: %s", e)
+        return
+
+    # Lookup tipa otvara transakciju na sirovoj konekciji
+    dbapi_connection.commit()
+    connection_record.info["vector_registered"] = True
+
+
+@event.listens_for(engine, "checkout")
+def _reject_unregistered_connection(dbapi_connection, connection_record, connection_proxy):
+    # Konekcija bez adaptera ne može bindovati np.ndarray; pool je invalidira i otvara novu
+    if not connection_record.info.get("vector_registered", True):
+        raise exc.DisconnectionError("pgvector adapter nije registrovan na konekciji")
+
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,309 @@
+import re
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+EMBEDDING_INDEX_NAME = "idx_chunks_embedding"
+# pg_advisory_lock ključ za build ANN indeksa
+INDEX_BUILD_LOCK_KEY = 7246_0027
+
+
+def ann_expression(alias: str = "") -> Tuple[str, str, str]:
+    """
+    (indeksirani izraz, opclass, distance operator) za VECTOR_SHORTLIST mod.
+
+    none:    full-precision vector (4 B/dim)
+    halfvec: expression indeks nad embedding::halfvec (2 B/dim, ~2x manji indeks)
+    binary:  expression indeks nad binary_quantize(embedding) (1 bit/dim, ~32x manji)
+    matryoshka: indeks nad embedding_short kolonom (EMBEDDINGS_SHORTLIST_DIM, ~6x manji)
+
+    Heap zadržava full-precision embedding za rerank kandidata.
+    """
+    col = f"{alias}.embedding" if alias else "embedding"
+    dim = int(settings.EMBEDDINGS_DIM)
+    if settings.VECTOR_SHORTLIST == "halfvec":
+        return f"({col}::halfvec({dim}))", "halfvec_cosine_ops", "<=>"
+    if settings.VECTOR_SHORTLIST == "binary":
+        return f"(binary_quantize({col})::bit({dim}))", "bit_hamming_ops", "<~>"
+    if settings.VECTOR_SHORTLIST == "matryoshka":
+        return f"{col}_short", "vector_cosine_ops", "<=>"
+    return col, "vector_cosine_ops", "<=>"
+
+
+def ann_query_expression(param: str) -> str:
+    """Izraz za query vektor koji odgovara ann_expression() (isti tip i kvantizacija)."""
+    dim = int(settings.EMBEDDINGS_DIM)
+    query = f"CAST({param} AS vector)"
+    if settings.VECTOR_SHORTLIST == "halfvec":
+        return f"{query}::halfvec({dim})"
+    if settings.VECTOR_SHORTLIST == "binary":
+        return f"binary_quantize({query})::bit({dim})"
+    if settings.VECTOR_SHORTLIST == "matryoshka":
+        # Cosine je invarijantan na skalu, pa je prefiks dovoljan bez normalizacije
+        return f"subvector({query}, 1, {int(settings.EMBEDDINGS_SHORTLIST_DIM)})"
+    return query
+
+
+def _index_method_sql() -> str:
+    expr, opclass, _ = ann_expression()
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        return f"USING ivfflat ({expr} {opclass}) WITH (lists = {int(settings.IVFFLAT_LISTS)})"
+    return (
+        f"USING hnsw ({expr} {opclass}) "
+        f"WITH (m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)})"
+    )
+
+
+def vector_index_ddl() -> str:
+    """DDL za ANN indeks nad document_chunks.embedding prema settings-ima."""
+    return f"CREATE INDEX IF NOT EXISTS {EMBEDDING_INDEX_NAME} ON document_chunks {_index_method_sql()}"
+
+
+def shortlist_column_type() -> str:
+    """Tip embedding_short kolone prema EMBEDDINGS_SHORTLIST_DIM (db/init/03 je kreira kao vector(256))."""
+    dim = int(settings.EMBEDDINGS_SHORTLIST_DIM)
+    if not 0 < dim <= int(settings.EMBEDDINGS_DIM):
+        raise ValueError(f"EMBEDDINGS_SHORTLIST_DIM={dim} mora biti između 1 i EMBEDDINGS_DIM={settings.EMBEDDINGS_DIM}")
+    return f"vector({dim})"
+
+
+def shortlist_column_ddl() -> str:
+    """DDL koji embedding_short prebacuje na shortlist_column_type() i ponovo računa iz embedding-a."""
+    column_type = shortlist_column_type()
+    dim = int(settings.EMBEDDINGS_SHORTLIST_DIM)
+    return (
+        f"ALTER TABLE document_chunks ALTER COLUMN embedding_short TYPE {column_type} "
+        f"USING l2_normalize(subvector(embedding, 1, {dim}))::{column_type}"
+    )
+
+
+def current_shortlist_column_type(conn) -> Optional[str]:
+    """Stvarni tip embedding_short kolone u bazi (npr. 'vector(256)'); None ako kolona ne postoji."""
+    return conn.execute(text(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding_short' AND NOT attisdropped"
+    )).scalar()
+
+
+def _index_matches(indexdef: str) -> bool:
+    """Provjeri da li postojeći indeks odgovara konfigurisanom tipu i parametrima."""
+    method = re.search(r"USING (\w+)", indexdef)
+    if not method or method.group(1) != settings.VECTOR_INDEX_TYPE:
+        return False
+    expr, opclass, _ = ann_expression()
+    if opclass not in indexdef:
+        return False
+    if opclass == "vector_cosine_ops" and f"({expr} {opclass})" not in indexdef:
+        # embedding vs embedding_short
+        return False
+
+    options = dict(re.findall(r"(\w+)='?(\d+)'?", indexdef.split("WITH", 1)[1])) if "WITH" in indexdef else {}
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        return options.get("lists") == str(settings.IVFFLAT_LISTS)
+    # HNSW default-i (m=16, ef_construction=64) se ne ispisuju ako nisu zadani
+    return (
+        options.get("m", "16") == str(settings.HNSW_M)
+        and options.get("ef_construction", "64") == str(settings.HNSW_EF_CONSTRUCTION)
+    )
+
+
+def _index_state(conn, name: str) -> Tuple[Optional[str], bool]:
+    """(indexdef, indisvalid) postojećeg indeksa; (None, False) ako ne postoji."""
+    row = conn.execute(
+        text(
+            "SELECT pg_get_indexdef(x.indexrelid), x.indisvalid "
+            "FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+            "WHERE c.relname = :name"
+        ),
+        {"name": name}
+    ).first()
+    return (row[0], bool(row[1])) if row else (None, False)
+
+
+@contextmanager
+def _autocommit_connection(engine: Engine) -> Iterator[Connection]:
+    """
+    Autocommit konekcija (CREATE/DROP INDEX CONCURRENTLY ne može u transakciji)
+    sa session advisory lock-om: samo jedan proces (worker, instanca, CLI) gradi indekse.
+    Yield-a None ako drugi proces već drži lock.
+    """
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEX_BUILD_LOCK_KEY}).scalar():
+            yield None
+            return
+        try:
+            yield conn
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_BUILD_LOCK_KEY})
+
+
+def _build_concurrently(conn: Connection, name: str, where: str = "") -> str:
+    """
+    Gradi indeks pod privremenim imenom sa CREATE INDEX CONCURRENTLY (pisanje u
+    document_chunks nije blokirano), pa ga zamjenjuje: DROP INDEX CONCURRENTLY
+    starog + RENAME novog. Upiti do zamjene koriste stari indeks.
+    """
+    staging = f"{name}_new"
+    # Ostatak prekinutog CONCURRENTLY build-a ostaje kao INVALID indeks
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {staging}"))
+
+    ddl = f"CREATE INDEX CONCURRENTLY {staging} ON document_chunks {_index_method_sql()}{where}"
+    if settings.VECTOR_INDEX_TYPE == "hnsw":
+        # Build HNSW grafa je memorijski zahtjevan; session postavka se vraća u finally
+        conn.execute(text("SELECT set_config('maintenance_work_mem', :mem, false)"),
+                     {"mem": settings.VECTOR_INDEX_BUILD_MEM})
+    try:
+        conn.execute(text(ddl))
+    finally:
+        conn.execute(text("RESET maintenance_work_mem"))
+
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"ALTER INDEX {staging} RENAME TO {name}"))
+    return ddl
+
+
+def ensure_vector_index(engine: Engine) -> Optional[str]:
+    """
+    Osiguraj da embedding indeks odgovara VECTOR_INDEX_TYPE / HNSW_* / IVFFLAT_* / VECTOR_SHORTLIST.
+    Neodgovarajući ili INVALID indeks se gradi ponovo van transakcije (CONCURRENTLY + zamjena).
+    Pokreće se out-of-band: `python -m app.manage vector-index` ili pozadinski na startup-u.
+    Vraća DDL koji je izvršen ili None ako je indeks već bio ispravan (ili ga gradi drugi proces).
+    """
+    with _autocommit_connection(engine) as conn:
+        if conn is None:
+            return None
+        indexdef, valid = _index_state(conn, EMBEDDING_INDEX_NAME)
+        if indexdef and valid and _index_matches(indexdef):
+            return None
+        return _build_concurrently(conn, EMBEDDING_INDEX_NAME)
+
+
+def ensure_shortlist_column(engine: Engine) -> Optional[str]:
+    """
+    Uskladi dimenziju embedding_short sa EMBEDDINGS_SHORTLIST_DIM (insert_chunks inače pada na
+    provjeri dimenzije). Promjena tipa prepisuje tabelu i indekse nad kolonom, pa se pokreće
+    out-of-band kao i ensure_vector_index. Vraća izvršeni DDL ili None.
+    """
+    expected = shortlist_column_type()
+    with _autocommit_connection(engine) as conn:
+        if conn is None:
+            return None
+        current = current_shortlist_column_type(conn)
+        if current == expected:
+            return None
+        if current is None:
+            conn.execute(text(f"ALTER TABLE document_chunks ADD COLUMN embedding_short {expected}"))
+        ddl = shortlist_column_ddl()
+        conn.execute(text(ddl))
+        return ddl
+
+
+TENANT_INDEX_PREFIX = f"{EMBEDDING_INDEX_NAME}_t_"
+
+
+def tenant_index_name(owner_id) -> str:
+    return f"{TENANT_INDEX_PREFIX}{uuid.UUID(str(owner_id)).hex}"
+
+
+def _sync_tenant_index(conn: Connection, owner: uuid.UUID) -> Optional[str]:
+    """Izgradi/ponovo izgradi parcijalni indeks tenanta ako nedostaje ili ne odgovara settings-ima."""
+    name = tenant_index_name(owner)
+    indexdef, valid = _index_state(conn, name)
+    if indexdef and valid and _index_matches(indexdef):
+        return None
+
+    if not indexdef:
+        count = conn.execute(
+            text("SELECT COUNT(*) FROM document_chunks WHERE owner_id = CAST(:owner AS uuid)"),
+            {"owner": str(owner)}
+        ).scalar() or 0
+        if count < settings.TENANT_INDEX_MIN_CHUNKS:
+            return None
+
+    # DDL ne prihvata bind parametre; owner je validiran kao UUID
+    return _build_concurrently(conn, name, f" WHERE owner_id = '{owner}'")
+
+
+def ensure_tenant_vector_index(engine: Engine, owner_id) -> Optional[str]:
+    """
+    Parcijalni HNSW indeks (WHERE owner_id = ...) za tenante sa velikim korpusom.
+    Latencija ANN upita tada zavisi od veličine tenant-ovog korpusa, ne globalnog.
+    Manji tenanti koriste idx_chunks_owner_id + exact scan.
+    Gradi se CONCURRENTLY iz pozadinskog job-a (tenant_index_job), nikad iz ingest request-a.
+    """
+    if owner_id is None or settings.VECTOR_INDEX_TYPE != "hnsw":
+        return None
+
+    with _autocommit_connection(engine) as conn:
+        if conn is None:
+            return None
+        return _sync_tenant_index(conn, uuid.UUID(str(owner_id)))
+
+
+def sync_tenant_vector_indexes(engine: Engine) -> List[str]:
+    """
+    Uskladi sve parcijalne indekse: novi za tenante iznad TENANT_INDEX_MIN_CHUNKS,
+    rebuild postojećih koji ne odgovaraju VECTOR_SHORTLIST / HNSW_* settings-ima,
+    a bez HNSW-a (VECTOR_INDEX_TYPE=ivfflat) se tenant indeksi brišu.
+    """
+    executed: List[str] = []
+    with _autocommit_connection(engine) as conn:
+        if conn is None:
+            return executed
+
+        existing = [
+            name for name in conn.execute(
+                text(
+                    "SELECT indexname FROM pg_indexes "
+                    "WHERE tablename = 'document_chunks' AND starts_with(indexname, :prefix)"
+                ),
+                {"prefix": TENANT_INDEX_PREFIX}
+            ).scalars()
+            if len(name) == len(TENANT_INDEX_PREFIX) + 32
+        ]
+
+        if settings.VECTOR_INDEX_TYPE != "hnsw":
+            for name in existing:
+                ddl = f"DROP INDEX CONCURRENTLY IF EXISTS {name}"
+                conn.execute(text(ddl))
+                executed.append(ddl)
+            return executed
+
+        owners = {uuid.UUID(name[len(TENANT_INDEX_PREFIX):]) for name in existing}
+        owners.update(conn.execute(
+            text(
+                "SELECT owner_id FROM document_chunks WHERE owner_id IS NOT NULL "
+                "GROUP BY owner_id HAVING COUNT(*) >= :min_chunks"
+            ),
+            {"min_chunks": settings.TENANT_INDEX_MIN_CHUNKS}
+        ).scalars())
+
+        for owner in sorted(owners, key=str):
+            ddl = _sync_tenant_index(conn, owner)
+            if ddl:
+                executed.append(ddl)
+    return executed
+
+
+def tenant_index_job(owner_id):
+    """BackgroundTasks job nakon ingest-a: tenant koji pređe prag dobija parcijalni indeks (nije kritično)."""
+    from app.core.db import engine
+    try:
+        ddl = ensure_tenant_vector_index(engine, owner_id)
+        if ddl:
+            print(f"Tenant vector index built: {ddl}")
+    except Exception as e:
+        print(f"Tenant vector index skipped: {e}")
+
+
+def vector_index_size(db: Session) -> Optional[int]:
+    """Veličina glavnog ANN indeksa u bajtovima (za poređenje VECTOR_SHORTLIST modova)."""
+    return db.execute(
+        text("SELECT pg_relation_size(to_regclass(:name))"),
+        {"name": EMBEDDING_INDEX_NAME}
+    ).scalar()
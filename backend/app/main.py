@@ -1,8 +1,22 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api import routes_auth, routes_documents, routes_chat, routes_ingest
 from app.core.config import settings
+from app.core.db import engine, SessionLocal
+from app.core.indexes import (
+    current_shortlist_column_type,
+    ensure_shortlist_column,
+    ensure_vector_index,
+    shortlist_column_type,
+    sync_tenant_vector_indexes,
+)
+from app.services.tracing import render_prometheus
+from app.services.chunk_store import build_local_indexes
+from app.services.lexical_index import get_lexical_index
+from app.services.vector_index import get_vector_index
 
 app = FastAPI(
     title="Multi-RAG API",
@@ -33,10 +47,63 @@ app.include_router(routes_documents.router, prefix=API_PREFIX)
 app.include_router(routes_chat.router,      prefix=API_PREFIX)
 app.include_router(routes_ingest.router,    prefix=API_PREFIX)
 
+def _sync_vector_index():
+    try:
+        # Dimenzija embedding_short prije indeksa nad njom
+        for ddl in [ensure_shortlist_column(engine), ensure_vector_index(engine), *sync_tenant_vector_indexes(engine)]:
+            if ddl:
+                print(f"Vector index rebuilt: {ddl}")
+    except Exception as e:
+        print(f"Vector index sync skipped: {e}")
+
+def _check_shortlist_column():
+    # Bez VECTOR_INDEX_AUTOCREATE kolona se ne mijenja na startup-u, ali neslaganje mora biti vidljivo
+    try:
+        expected = shortlist_column_type()
+        with engine.connect() as conn:
+            current = current_shortlist_column_type(conn)
+        if current != expected:
+            print(f"embedding_short je {current}, EMBEDDINGS_SHORTLIST_DIM traži {expected}: "
+                  f"pokreni `python -m app.manage vector-index`")
+    except Exception as e:
+        print(f"Shortlist column check skipped: {e}")
+
+@app.on_event("startup")
+async def sync_vector_index():
+    # Opcionalno: uskladi ANN indeks sa settings-ima u pozadinskom thread-u (CONCURRENTLY + zamjena,
+    # advisory lock između worker-a); startup i event loop ne čekaju build
+    if not settings.VECTOR_INDEX_AUTOCREATE:
+        asyncio.get_running_loop().run_in_executor(None, _check_shortlist_column)
+        return
+    asyncio.get_running_loop().run_in_executor(None, _sync_vector_index)
+
+def _load_local_indexes():
+    db = SessionLocal()
+    try:
+        for name, added in build_local_indexes(db).items():
+            print(f"Local {name} index built with {added} chunks")
+    except Exception as e:
+        print(f"Local index build skipped: {e}")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def load_local_indexes():
+    # VECTOR_BACKEND=hnsw / LEXICAL_BACKEND=bm25: prvo pokretanje puni in-process indekse iz document_chunks
+    # u pozadinskom thread-u; gradi samo jedan worker (flock), ostali čitaju isti direktorij
+    if get_vector_index() is None and get_lexical_index() is None:
+        return
+    asyncio.get_running_loop().run_in_executor(None, _load_local_indexes)
+
 @app.get(f"{API_PREFIX}/health")
 async def health_check():
     return {"status": "ok", "service": "Multi-RAG API"}
 
+@app.get(f"{API_PREFIX}/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus histogrami trajanja RAG stage-ova
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get(API_PREFIX)
 async def api_root():
     return {
@@ -48,5 +115,6 @@ async def api_root():
             "chat": f"{API_PREFIX}/chat",
             "search": f"{API_PREFIX}/search",
             "ingest": f"{API_PREFIX}/ingest",
+            "metrics": f"{API_PREFIX}/metrics",
         },
     }
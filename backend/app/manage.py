@@ -0,0 +1,59 @@
+"""
+Jednokratne administrativne komande (van request-a i startup-a):
+
+    python -m app.manage vector-index    # uskladi embedding_short, idx_chunks_embedding i tenant indekse sa settings-ima
+    python -m app.manage tenant-indexes  # samo parcijalni (per-tenant) HNSW indeksi
+    python -m app.manage local-indexes   # prvo punjenje in-process HNSW/BM25 indeksa iz baze
+"""
+import argparse
+import sys
+
+from app.core.db import engine, SessionLocal
+from app.core.indexes import ensure_shortlist_column, ensure_vector_index, sync_tenant_vector_indexes
+from app.services.chunk_store import build_local_indexes
+
+
+def vector_index(args) -> int:
+    ddl = ensure_shortlist_column(engine)
+    if ddl:
+        print(ddl)
+    ddl = ensure_vector_index(engine)
+    print(ddl or "Vector index je već usklađen (ili ga gradi drugi proces)")
+    return tenant_indexes(args)
+
+
+def tenant_indexes(args) -> int:
+    for ddl in sync_tenant_vector_indexes(engine):
+        print(ddl)
+    return 0
+
+
+def local_indexes(args) -> int:
+    db = SessionLocal()
+    try:
+        built = build_local_indexes(db)
+    finally:
+        db.close()
+    for name, added in built.items():
+        print(f"Local {name} index: {added} chunks")
+    if not built:
+        print("Lokalni indeksi nisu uključeni ili već imaju podatke")
+    return 0
+
+
+COMMANDS = {
+    "vector-index": vector_index,
+    "tenant-indexes": tenant_indexes,
+    "local-indexes": local_indexes,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
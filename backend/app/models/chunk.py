@@ -1,22 +1,43 @@
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 from pgvector.sqlalchemy import Vector
 
 from app.core.db import Base
+from app.core.config import settings
 
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Neighbour expansion (±N chunk-ova istog dokumenta)
+        Index("idx_chunks_document_chunk", "document_id", "chunk_index"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    # Denormalizovan documents.created_by - tenant filter ide direktno u ANN upit
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
     chunk_metadata = Column("metadata", JSON, default=dict)
-    embedding = Column(Vector(1536), nullable=True)
+    # Deferred: hidratacija hitova ne vuče vektore (~6 KB po chunk-u); MMR ih učitava posebno
+    embedding = deferred(Column(Vector(settings.EMBEDDINGS_DIM), nullable=True))
+    # Matryoshka shortlist (prvih EMBEDDINGS_SHORTLIST_DIM dimenzija, L2 normalizovano)
+    embedding_short = deferred(Column(Vector(settings.EMBEDDINGS_SHORTLIST_DIM), nullable=True))
+    # Weighted FTS vektor (filename/section > keywords > content), računa ga Postgres
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', COALESCE(metadata->>'filename', '')), 'A') || "
+            "setweight(to_tsvector('simple', COALESCE(metadata->>'section', '')), 'A') || "
+            "setweight(to_tsvector('simple', COALESCE(metadata->>'keywords', '')), 'B') || "
+            "setweight(to_tsvector('simple', content), 'D')",
+            persisted=True
+        )
+    ))
     created_at = Column(DateTime, default=datetime.utcnow)
 
     document = relationship("Document", back_populates="chunks")
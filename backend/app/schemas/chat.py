@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
+from datetime import date
 import uuid
 
 
@@ -12,10 +13,35 @@ class Citation(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+# Recall/latency trade-off za ANN pretragu (mapira se na hnsw.ef_search / ivfflat.probes)
+SearchPrecision = Literal["fast", "balanced", "high"]
+
+
+class SearchFilters(BaseModel):
+    """Strukturisani filteri koji se guraju u SQL (GIN/BTREE indeksi nad metadata JSONB)."""
+    document_ids: Optional[List[uuid.UUID]] = None
+    doc_type: Optional[str] = None  # invoice, contract, report, ... (MetaAgent)
+    date_from: Optional[date] = None  # documents.metadata.document_date
+    date_to: Optional[date] = None
+    tags: Optional[List[str]] = None  # bilo koji od tagova dokumenta / keywords chunk-a
+    # Minimalna kosinusna sličnost (vektorska pretraga) odnosno rank (samo tekstualna)
+    min_score: Optional[float] = None
+
+
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
-    threshold: Optional[float] = None
+    threshold: Optional[float] = None  # alias za filters.min_score
+    precision: Optional[SearchPrecision] = None
+    filters: Optional[SearchFilters] = None
+
+    def effective_filters(self) -> Optional[SearchFilters]:
+        if self.threshold is None:
+            return self.filters
+        filters = self.filters.model_copy() if self.filters else SearchFilters()
+        if filters.min_score is None:
+            filters.min_score = self.threshold
+        return filters
 
 
 class SearchResponse(BaseModel):
@@ -26,6 +52,9 @@ class SearchResponse(BaseModel):
 class ChatRequest(BaseModel):
     query: str
     top_k: int = 5
+    precision: Optional[SearchPrecision] = None
+    filters: Optional[SearchFilters] = None
+    debug: bool = False
 
 
 class Verdict(BaseModel):
@@ -41,3 +70,6 @@ class ChatResponse(BaseModel):
     query: str
     verdict: Optional[Verdict] = None
     summary: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+    # Token budžet konteksta: tokens, budget, used_chunks, dropped_chunks (+ dropped_reasons), truncated
+    context_usage: Optional[Dict[str, Any]] = None
@@ -0,0 +1,217 @@
+import json
+import uuid
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services.lexical_index import get_lexical_index
+from app.services.vector_index import get_vector_index
+from app.services.vectors import shortlist_vector
+
+# Session.info ključ za izmjene in-process indeksa koje čekaju commit
+_PENDING_KEY = "local_index_pending"
+
+_INSERT_CHUNK_SQL = text("""
+    INSERT INTO document_chunks (id, document_id, owner_id, chunk_index, content, metadata, embedding, embedding_short)
+    VALUES (
+        CAST(:id AS uuid),
+        CAST(:document_id AS uuid),
+        CAST(:owner_id AS uuid),
+        :chunk_index,
+        :content,
+        CAST(:metadata AS jsonb),
+        :embedding,
+        :embedding_short
+    )
+""")
+
+
+_INSERT_LINKS_SQL = text("""
+    INSERT INTO chunk_links (document_id, chunk_index, canonical_chunk_id, owner_id)
+    SELECT CAST(:document_id AS uuid), l.chunk_index, l.canonical_chunk_id, CAST(:owner_id AS uuid)
+    FROM unnest(CAST(:chunk_indexes AS int[]), CAST(:canonical_ids AS uuid[])) AS l(chunk_index, canonical_chunk_id)
+    JOIN document_chunks dc ON dc.id = l.canonical_chunk_id
+    ON CONFLICT (document_id, chunk_index) DO UPDATE SET canonical_chunk_id = EXCLUDED.canonical_chunk_id
+""")
+
+# Kanonski chunk dokumenta koji se briše, a linkuje ga drugi dokument, seli se na prvi takav link:
+# isti id, embedding i signature, pa ANN/BM25/LSH indeksi ostaju važeći bez re-embedding-a
+_PROMOTE_LINKS_SQL = text("""
+    WITH heirs AS (
+        SELECT DISTINCT ON (l.canonical_chunk_id) l.canonical_chunk_id, l.document_id, l.chunk_index
+        FROM chunk_links l
+        JOIN document_chunks dc ON dc.id = l.canonical_chunk_id
+        WHERE dc.document_id = ANY(CAST(:document_ids AS uuid[]))
+          AND l.document_id <> ALL(CAST(:document_ids AS uuid[]))
+        ORDER BY l.canonical_chunk_id, l.document_id, l.chunk_index
+    ), moved AS (
+        UPDATE document_chunks dc
+        SET document_id = h.document_id,
+            chunk_index = h.chunk_index,
+            metadata = COALESCE(dc.metadata, '{}'::jsonb) || jsonb_build_object('filename', d.filename)
+        FROM heirs h
+        JOIN documents d ON d.id = h.document_id
+        WHERE dc.id = h.canonical_chunk_id
+        RETURNING h.document_id, h.chunk_index
+    )
+    DELETE FROM chunk_links l
+    USING moved m
+    WHERE l.document_id = m.document_id AND l.chunk_index = m.chunk_index
+""")
+
+
+def insert_chunks(db: Session, rows: List[Dict[str, Any]]) -> List[str]:
+    """
+    Bulk insert chunk-ova (executemany).
+
+    Embedding se prosljeđuje kao float32 NumPy red i ide kroz pgvector binarni
+    adapter (registrovan u app.core.db), bez Vector(...) bind_processor-a koji
+    bi ga formatirao u tekst. Matryoshka shortlist (embedding_short) se računa
+    iz istog buffer-a.
+
+    Args:
+        rows: dict-ovi sa document_id, owner_id, chunk_index, content, metadata, embedding
+
+    Returns:
+        Lista ID-jeva upisanih chunk-ova (istim redoslijedom)
+    """
+    if not rows:
+        return []
+
+    params = []
+    ids = []
+    for row in rows:
+        chunk_id = str(row.get("id") or uuid.uuid4())
+        embedding = row.get("embedding")
+        ids.append(chunk_id)
+        params.append({
+            "id": chunk_id,
+            "document_id": str(row["document_id"]),
+            "owner_id": str(row["owner_id"]) if row.get("owner_id") else None,
+            "chunk_index": row["chunk_index"],
+            "content": row["content"],
+            "metadata": json.dumps(row.get("metadata") or {}, ensure_ascii=False, default=str),
+            "embedding": embedding,
+            "embedding_short": (
+                shortlist_vector(embedding, settings.EMBEDDINGS_SHORTLIST_DIM)
+                if embedding is not None else None
+            ),
+        })
+
+    db.execute(_INSERT_CHUNK_SQL, params)
+    if get_vector_index() is not None or get_lexical_index() is not None:
+        _after_commit(db, lambda: _index_chunks(rows, ids))
+    return ids
+
+
+def _after_commit(db: Session, operation: Callable[[], Any]):
+    """
+    Izmjena in-process indeksa koja se primjenjuje tek kad se transakcija commit-uje;
+    rollback je odbacuje, pa indeksi nikad ne sadrže ID-jeve kojih nema u bazi.
+    """
+    db.info.setdefault(_PENDING_KEY, []).append(operation)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_local_index_operations(session: Session):
+    for operation in session.info.pop(_PENDING_KEY, None) or []:
+        try:
+            operation()
+        except Exception as e:
+            # Baza je izvor istine; indeks se može ponovo izgraditi (python -m app.manage local-indexes)
+            print(f"Local index update skipped: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_local_index_operations(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _index_chunks(rows: List[Dict[str, Any]], ids: List[str]):
+    """Inkrementalni upis u in-process indekse (VECTOR_BACKEND=hnsw, LEXICAL_BACKEND=bm25)."""
+    vector_index = get_vector_index()
+    lexical_index = get_lexical_index()
+
+    by_owner: Dict[Any, List[int]] = {}
+    for i, row in enumerate(rows):
+        by_owner.setdefault(row.get("owner_id"), []).append(i)
+
+    for owner_id, positions in by_owner.items():
+        owner = str(owner_id) if owner_id else None
+        if lexical_index is not None:
+            lexical_index.add([ids[i] for i in positions], [rows[i]["content"] for i in positions], owner_id=owner)
+
+        embedded = [i for i in positions if rows[i].get("embedding") is not None]
+        if vector_index is not None and embedded:
+            vector_index.add(
+                [ids[i] for i in embedded],
+                np.vstack([rows[i]["embedding"] for i in embedded]),
+                owner_id=owner
+            )
+
+
+def insert_chunk_links(
+    db: Session,
+    document_id: Any,
+    owner_id: Any,
+    links: Sequence[Tuple[int, str]]
+) -> int:
+    """
+    Upiši (chunk_index, canonical_chunk_id) linkove dokumenta na već indeksirane chunk-ove.
+    Dedup chunk-ovi se ne upisuju u document_chunks, pa linkovi popunjavaju njihove pozicije
+    za filtere (document_ids) i neighbour expansion. Ista transakcija kao insert_chunks.
+    """
+    if not links:
+        return 0
+    db.execute(_INSERT_LINKS_SQL, {
+        "document_id": str(document_id),
+        "owner_id": str(owner_id) if owner_id else None,
+        "chunk_indexes": [chunk_index for chunk_index, _ in links],
+        "canonical_ids": [str(canonical_id) for _, canonical_id in links],
+    })
+    return len(links)
+
+
+def promote_linked_chunks(db: Session, document_ids: Sequence[Any]) -> int:
+    """
+    Prije brisanja dokumenata: kanonske chunk-ove koje linkuju drugi dokumenti preseli
+    na link (umjesto da ih CASCADE obriše zajedno sa sadržajem tih dokumenata).
+    Vraća broj preseljenih chunk-ova.
+    """
+    if not document_ids:
+        return 0
+    return db.execute(_PROMOTE_LINKS_SQL, {"document_ids": [str(d) for d in document_ids]}).rowcount
+
+
+def remove_document_chunks(db: Session, document_ids: Sequence[Any]) -> int:
+    """
+    Tombstone chunk-ova dokumenata u in-process indeksima nakon commit-a brisanja.
+    Poziva se prije brisanja dokumenata (CASCADE briše redove iz document_chunks),
+    a nakon promote_linked_chunks, da preseljeni chunk-ovi ostanu u indeksima.
+    Vraća broj chunk-ova zakazanih za tombstone.
+    """
+    indexes = [index for index in (get_vector_index(), get_lexical_index()) if index is not None]
+    if not indexes or not document_ids:
+        return 0
+
+    chunk_ids = db.execute(
+        text("SELECT id FROM document_chunks WHERE document_id = ANY(CAST(:ids AS uuid[]))"),
+        {"ids": [str(d) for d in document_ids]}
+    ).scalars().all()
+    chunk_ids = [str(c) for c in chunk_ids]
+    for index in indexes:
+        _after_commit(db, lambda index=index: index.delete(chunk_ids))
+    return len(chunk_ids)
+
+
+def build_local_indexes(db: Session) -> Dict[str, int]:
+    """
+    Prvo punjenje praznih in-process indeksa iz document_chunks.
+    Između worker-a ga radi samo jedan proces (flock u build_from_db); vraća {ime: broj dodanih}.
+    """
+    built = {}
+    for name, index in (("vector", get_vector_index()), ("lexical", get_lexical_index())):
+        if index is not None and not len(index):
+            built[name] = index.build_from_db(db)
+    return built
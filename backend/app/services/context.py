@@ -0,0 +1,260 @@
+import hashlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Gruba procjena (znakova po tokenu) kada tokenizer nije dostupan
+_CHARS_PER_TOKEN = 4
+
+
+def overlap_length(a: str, b: str, max_overlap: int = 600, min_overlap: int = 20) -> int:
+    """
+    Dužina najdužeg sufiksa od a koji je ujedno prefiks od b (chunk overlap).
+    Traži samo pozicije gdje se pojavljuje prvih min_overlap znakova od b,
+    pa je cijena ~O(max_overlap) umjesto O(max_overlap^2).
+    """
+    max_len = min(len(a), len(b), max_overlap)
+    if max_len < min_overlap:
+        return 0
+
+    tail = a[-max_len:]
+    probe = b[:min_overlap]
+    start = tail.find(probe)
+    while start != -1:
+        # Najraniji start = najduži overlap
+        if b.startswith(tail[start:]):
+            return max_len - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def join_overlapping(a: str, b: str) -> str:
+    """Spoji dva susjedna chunk-a bez ponavljanja zajedničkog overlap teksta."""
+    if not a:
+        return b
+    if not b:
+        return a
+    n = overlap_length(a, b)
+    if n:
+        return a + b[n:]
+    return a + "\n" + b
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+
+
+def expand_hits(
+    hits: List[Dict[str, Any]],
+    neighbors: Dict[str, Dict[int, str]],
+    window: int
+) -> List[Dict[str, Any]]:
+    """
+    Proširi hitove susjednim chunk-ovima (±window po chunk_index) i spoji preklapajuće
+    prozore istog dokumenta u jedan hit. Redoslijed prati najrelevantniji hit u prozoru;
+    hitovi sa istim tekstom (npr. isti sadržaj u dva dokumenta) se izbacuju.
+
+    Args:
+        hits: Rangirani hitovi (dict sa document_id, chunk_index, content, score, metadata)
+        neighbors: document_id -> {chunk_index: content}
+        window: Broj susjeda sa svake strane
+
+    Returns:
+        Nova lista hitova sa proširenim content-om
+    """
+    groups: List[Tuple[int, Dict[str, Any]]] = []
+    by_doc: Dict[str, List[Tuple[int, int, int, Dict[str, Any]]]] = {}
+
+    for position, hit in enumerate(hits):
+        index = hit.get("chunk_index")
+        doc_chunks = neighbors.get(str(hit.get("document_id")))
+        if index is None or not doc_chunks:
+            groups.append((position, hit))
+            continue
+        by_doc.setdefault(str(hit["document_id"]), []).append(
+            (index - window, index + window, position, hit)
+        )
+
+    for document_id, windows in by_doc.items():
+        doc_chunks = neighbors[document_id]
+        windows.sort(key=lambda w: w[0])
+
+        merged: List[List[Any]] = []
+        for lo, hi, position, hit in windows:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+                merged[-1][2].append((position, hit))
+            else:
+                merged.append([lo, hi, [(position, hit)]])
+
+        for lo, hi, members in merged:
+            position, best = min(members, key=lambda m: m[0])
+            indices = [i for i in range(lo, hi + 1) if i in doc_chunks]
+            content = ""
+            for i in indices:
+                content = join_overlapping(content, doc_chunks[i])
+
+            groups.append((position, {
+                **best,
+                "content": content or best.get("content", ""),
+                "score": max(float(m[1].get("score") or 0.0) for m in members),
+                "metadata": {
+                    **(best.get("metadata") or {}),
+                    "chunk_range": [indices[0], indices[-1]] if indices else None,
+                    "merged_chunk_ids": [m[1].get("chunk_id") for m in sorted(members, key=lambda m: m[0])],
+                },
+            }))
+
+    expanded = []
+    seen = set()
+    for _, hit in sorted(groups, key=lambda g: g[0]):
+        key = _text_key(hit.get("content") or "")
+        if key in seen:
+            continue
+        seen.add(key)
+        expanded.append(hit)
+    return expanded
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        # Nepoznat model - najbliži standardni encoding
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+    except Exception:
+        # Npr. BPE fajl se ne može preuzeti (offline) - koristi procjenu
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Broj tokena za model (tiktoken); procjena len/4 ako tokenizer nije dostupan."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+@dataclass
+class PackedContext:
+    """Rezultat pakovanja konteksta u token budžet."""
+    texts: List[str] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    used_chunks: int = 0
+    dropped_chunks: int = 0
+    # Razlog -> broj odbačenih: empty (prazan sadržaj), overlap (sav tekst već spakovan), budget
+    dropped_reasons: Dict[str, int] = field(default_factory=dict)
+    truncated: bool = False
+    overlap_chars_removed: int = 0
+
+    def drop(self, reason: str, count: int = 1):
+        if count > 0:
+            self.dropped_chunks += count
+            self.dropped_reasons[reason] = self.dropped_reasons.get(reason, 0) + count
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "used_chunks": self.used_chunks,
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_reasons": dict(self.dropped_reasons),
+            "truncated": self.truncated,
+            "overlap_chars_removed": self.overlap_chars_removed,
+        }
+
+
+def _strip_overlaps(content: str, packed_same_doc: List[str]) -> Tuple[str, int]:
+    """Ukloni dio teksta koji se već nalazi na spoju sa spakovanim chunk-ovima istog dokumenta."""
+    original = len(content)
+    for other in packed_same_doc:
+        # other ... | overlap | ... content
+        head = overlap_length(other, content)
+        if head:
+            content = content[head:]
+        # content ... | overlap | ... other
+        tail = overlap_length(content, other)
+        if tail:
+            content = content[:-tail]
+    return content, original - len(content)
+
+
+def pack_context(
+    chunks: List[Dict[str, Any]],
+    budget_tokens: int,
+    model: Optional[str] = None,
+    separator: str = "\n\n---\n",
+    min_tail_tokens: int = 64
+) -> PackedContext:
+    """
+    Popuni token budžet chunk-ovima po redoslijedu relevantnosti.
+
+    Overlap između chunk-ova istog dokumenta se skida prije brojanja, prvi chunk
+    koji ne staje se skraćuje na preostali budžet (ako je ostalo >= min_tail_tokens),
+    a ostali se odbacuju. used_chunks + dropped_chunks je uvijek len(chunks).
+    """
+    packed = PackedContext(budget=budget_tokens)
+    by_doc: Dict[str, List[str]] = {}
+    separator_tokens = count_tokens(separator, model)
+
+    for position, chunk in enumerate(chunks):
+        content = (chunk.get("content") or "").strip()
+        if not content:
+            packed.drop("empty")
+            continue
+        doc_key = str(chunk.get("document_id") or "")
+        if doc_key and by_doc.get(doc_key):
+            content, removed = _strip_overlaps(content, by_doc[doc_key])
+            packed.overlap_chars_removed += removed
+            content = content.strip()
+            if not content:
+                packed.drop("overlap")
+                continue
+
+        cost = count_tokens(content, model) + (separator_tokens if packed.texts else 0)
+        remaining = budget_tokens - packed.tokens
+        if cost > remaining:
+            room = remaining - (separator_tokens if packed.texts else 0)
+            if room >= min_tail_tokens:
+                content = truncate_to_tokens(content, room, model)
+                packed.texts.append(content)
+                packed.tokens += count_tokens(content, model) + (separator_tokens if len(packed.texts) > 1 else 0)
+                packed.used_chunks += 1
+                packed.truncated = True
+                position += 1
+            packed.drop("budget", len(chunks) - position)
+            break
+
+        packed.texts.append(content)
+        packed.tokens += cost
+        packed.used_chunks += 1
+        if doc_key:
+            by_doc.setdefault(doc_key, []).append(content)
+
+    return packed
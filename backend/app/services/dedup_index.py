@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+_CANDIDATES_SQL = text("""
+    SELECT b.band_hash, m.chunk_id, m.signature
+    FROM chunk_lsh_bands b
+    JOIN chunk_minhash m ON m.chunk_id = b.chunk_id
+    WHERE b.band_hash = ANY(CAST(:hashes AS bigint[]))
+      AND m.owner_id IS NOT DISTINCT FROM CAST(:owner_id AS uuid)
+""")
+
+_SCHEMES_SQL = text("SELECT lsh_bands, lsh_rows FROM chunk_lsh_schemes")
+
+_INSERT_SCHEME_SQL = text("""
+    INSERT INTO chunk_lsh_schemes (lsh_bands, lsh_rows) VALUES (:bands, :rows)
+    ON CONFLICT DO NOTHING
+""")
+
+_INSERT_SIGNATURES_SQL = text("""
+    INSERT INTO chunk_minhash (chunk_id, owner_id, signature)
+    SELECT chunk_id, CAST(:owner_id AS uuid), signature
+    FROM unnest(CAST(:chunk_ids AS uuid[]), CAST(:signatures AS bytea[])) AS s(chunk_id, signature)
+    ON CONFLICT (chunk_id) DO NOTHING
+""")
+
+_INSERT_BANDS_SQL = text("""
+    INSERT INTO chunk_lsh_bands (band_hash, chunk_id)
+    SELECT * FROM unnest(CAST(:hashes AS bigint[]), CAST(:chunk_ids AS uuid[]))
+    ON CONFLICT DO NOTHING
+""")
+
+
+def lsh_schemes(db: Session) -> List[Tuple[int, int]]:
+    """
+    (bands, rows) šeme pod kojima su upisani chunk_lsh_bands. Promjena DEDUP_THRESHOLD
+    mijenja šemu; upit mora hash-irati signature i po starim šemama da ih pogodi.
+    """
+    return [(int(bands), int(rows)) for bands, rows in db.execute(_SCHEMES_SQL).all()]
+
+
+def find_corpus_duplicates(
+    db: Session,
+    owner_id: Optional[Any],
+    signatures: np.ndarray,
+    hashes: np.ndarray,
+    threshold: float
+) -> Dict[int, str]:
+    """
+    Provjeri chunk-ove protiv već indeksiranih chunk-ova istog vlasnika.
+
+    Kandidati dolaze iz chunk_lsh_bands (jedan upit za sve band hash-eve),
+    a verifikacija je vektorizovana nad MinHash signaturama.
+
+    Args:
+        signatures: MinHash matrica (n, num_perm) uint32
+        hashes: Band hash-evi (n, bands) uint64; uz više LSH šema (vidi lsh_schemes)
+            kolone svih šema jedna do druge
+        threshold: Prag Jaccard sličnosti
+
+    Returns:
+        {idx: chunk_id najsličnijeg postojećeg chunk-a}
+    """
+    if not len(signatures):
+        return {}
+
+    signed = hashes.view(np.int64)
+    candidates_rows = db.execute(
+        _CANDIDATES_SQL,
+        {"hashes": np.unique(signed).tolist(), "owner_id": str(owner_id) if owner_id else None}
+    ).all()
+    if not candidates_rows:
+        return {}
+
+    # band_hash -> indeksi novih chunk-ova sa tim bandom
+    queries: Dict[int, List[int]] = {}
+    for idx, row in enumerate(signed.tolist()):
+        for value in row:
+            queries.setdefault(value, []).append(idx)
+
+    positions: Dict[str, int] = {}
+    stored: List[np.ndarray] = []
+    pairs = set()
+    for band_hash, chunk_id, signature in candidates_rows:
+        chunk_id = str(chunk_id)
+        if chunk_id not in positions:
+            positions[chunk_id] = len(stored)
+            stored.append(np.frombuffer(bytes(signature), dtype='<u4'))
+        for idx in queries.get(band_hash, ()):
+            pairs.add((idx, positions[chunk_id]))
+
+    width = signatures.shape[1]
+    candidates = np.vstack([s if len(s) == width else np.zeros(width, dtype='<u4') for s in stored])
+    pair_array = np.array(sorted(pairs), dtype=np.int64)
+    similarity = (signatures[pair_array[:, 0]] == candidates[pair_array[:, 1]]).mean(axis=1)
+
+    chunk_ids = list(positions)
+    best: Dict[int, str] = {}
+    best_score: Dict[int, float] = {}
+    for (idx, position), score in zip(pair_array.tolist(), similarity.tolist()):
+        if score >= threshold and score > best_score.get(idx, -1.0):
+            best[idx] = chunk_ids[position]
+            best_score[idx] = score
+    return best
+
+
+def store_chunk_signatures(
+    db: Session,
+    owner_id: Optional[Any],
+    chunk_ids: Sequence[str],
+    signatures: np.ndarray,
+    hashes: np.ndarray,
+    bands: int,
+    rows: int
+):
+    """Upiši signature i band hash-eve (šema bands x rows) indeksiranih chunk-ova, ista transakcija."""
+    if not len(chunk_ids):
+        return
+
+    db.execute(_INSERT_SCHEME_SQL, {"bands": bands, "rows": rows})
+    chunk_ids = [str(c) for c in chunk_ids]
+    db.execute(_INSERT_SIGNATURES_SQL, {
+        "owner_id": str(owner_id) if owner_id else None,
+        "chunk_ids": chunk_ids,
+        "signatures": [np.ascontiguousarray(s, dtype='<u4').tobytes() for s in signatures],
+    })
+    db.execute(_INSERT_BANDS_SQL, {
+        "hashes": hashes.view(np.int64).ravel().tolist(),
+        "chunk_ids": np.repeat(np.array(chunk_ids, dtype=object), hashes.shape[1]).tolist(),
+    })
@@ -0,0 +1,65 @@
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def file_lock(filename: str, shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+    """
+    flock na lock fajlu (između procesa/worker-a). Yield-a False ako je blocking=False
+    i lock već drži drugi proces. flock je vezan za otvoreni fajl, pa isti proces
+    ne smije uzeti shared lock dok drži exclusive na drugom deskriptoru.
+    """
+    mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    if not blocking:
+        mode |= fcntl.LOCK_NB
+    with open(filename, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, mode)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ReadWriteLock:
+    """Više istovremenih čitalaca ili jedan pisac (pisac koji čeka ima prednost); nije reentrantan."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
@@ -0,0 +1,633 @@
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.file_lock import ReadWriteLock, file_lock
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Dijakritici se svode na ASCII da "cijena"/"čijena" i upiti bez kvačica pogađaju isto
+_FOLD = str.maketrans({"č": "c", "ć": "c", "š": "s", "ž": "z", "đ": "dj"})
+
+STOPWORDS = frozenset("""
+    a ali bi bio bila bili biti by ce da do ga i ih iz ja je jer joj ju ka kad kako kao
+    koja koje koji kojih kojim li me mi na nad ne nego ni nije nisu o od on ona oni ono
+    pa po pod pri s sa se si sta sto su ta te ti to tu u uz vi za zbog ce cu the and of
+""".split())
+
+# Fleksione nastavke (padeži, množina) - najduži prvi; stem ostaje >= 3 znaka
+_SUFFIXES = tuple(sorted(
+    {"ovima", "evima", "ama", "ima", "ega", "emu", "omu", "om", "em", "ih", "og", "oj", "im",
+     "a", "e", "i", "o", "u"},
+    key=len, reverse=True
+))
+
+
+def _stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Bosanski-svjestan tokenizer: lowercase, folding dijakritika, stopwords, light stemming."""
+    return [
+        _stem(tok)
+        for tok in _TOKEN_RE.findall(text.lower().translate(_FOLD))
+        if len(tok) > 1 and tok not in STOPWORDS
+    ]
+
+
+class _Segment(NamedTuple):
+    """Nepromjenljiv segment postinga: CSR samo nad termovima koje sadrži, apsolutni doc ID-jevi."""
+    name: str
+    term_ids: np.ndarray
+    offsets: np.ndarray
+    docs: np.ndarray
+    tfs: np.ndarray
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.term_ids, term_id))
+        if i == len(self.term_ids) or self.term_ids[i] != term_id:
+            return _NO_DOCS, _NO_TFS
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end].astype(np.int64), self.tfs[start:end]
+
+
+_NO_DOCS = np.empty(0, dtype=np.int64)
+_NO_TFS = np.empty(0, dtype=np.uint16)
+
+
+def _group_by_term(term_ids: np.ndarray, docs: np.ndarray, tfs: np.ndarray, n_terms: int):
+    """
+    (term, doc, tf) trojke -> CSR po termu. Ulaz je sortiran po doc-u, pa stabilan
+    sort po termu čuva sortiranost doc ID-jeva unutar svakog terma.
+    """
+    order = np.argsort(term_ids, kind="stable")
+    term_ids, docs, tfs = term_ids[order], docs[order], tfs[order]
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=n_terms))
+    return offsets, docs, np.minimum(tfs, 65535).astype(np.uint16)
+
+
+def _decode_csr(offsets: np.ndarray, gaps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(term, apsolutni doc ID) za sve postinge delta-enkodiranog CSR-a."""
+    counts = np.diff(offsets)
+    term_ids = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    if not len(gaps):
+        return term_ids, np.empty(0, dtype=np.int64)
+    cumulative = np.cumsum(gaps, dtype=np.int64)
+    starts = offsets[:-1]
+    base = np.where(starts > 0, cumulative[np.maximum(starts - 1, 0)], 0)
+    return term_ids, cumulative - np.repeat(base, counts)
+
+
+def _delta_encode(offsets: np.ndarray, docs: np.ndarray) -> np.ndarray:
+    gaps = docs.astype(np.int64, copy=True)
+    gaps[1:] -= docs[:-1]
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    gaps[starts] = docs[starts]
+    return gaps.astype(np.uint32)
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index nad chunk-ovima.
+
+    Bazni segment su CSR nizovi: offsets[t]:offsets[t+1] je segment terma t u
+    gaps (uint32, delta-enkodirani doc ID-jevi; prvi u segmentu je apsolutan)
+    i tfs (uint16). Svaki add upisuje novi mali segment (samo svoje postinge),
+    pa je cijena upisa proporcionalna batch-u, ne korpusu; kad segmenata ima više
+    od MAX_SEGMENTS, pozadinski thread ih spaja u novi bazni CSR (nova generacija).
+    Upit dekodira samo svoje termove i akumulira BM25 doprinose vektorizovano
+    (np.unique + np.bincount), bez gustog niza veličine korpusa.
+
+    Stanje u LEXICAL_INDEX_DIR: manifest.json (generacija, bazni fajl, segmenti),
+    base_<gen>.npz, seg_<id>.npz i deleted.log (append-only tombstone doc ID-jevi).
+    Upisi su serijalizovani flock-om; čitaoci (drugi workeri) učitaju samo nove
+    segmente kad se manifest promijeni. Pretrage unutar procesa idu paralelno.
+    """
+
+    MAX_SEGMENTS = 8
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._rw = ReadWriteLock()
+        self._merge_lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        os.makedirs(path, exist_ok=True)
+        self._reset()
+        with file_lock(self._file("lock"), shared=True):
+            self._refresh()
+
+    # ------------------------------------------------------------------ storage
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _reset(self):
+        self.generation = 0
+        self.base_name: Optional[str] = None
+        self.vocab: List[str] = []
+        self.terms: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.gaps = np.empty(0, dtype=np.uint32)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.segments: List[_Segment] = []
+        self.doc_len = np.empty(0, dtype=np.int32)
+        self.doc_ids = np.empty((0, 16), dtype=np.uint8)
+        self.doc_owner = np.empty(0, dtype=np.int32)
+        self.deleted = np.empty(0, dtype=np.bool_)
+        self.deleted_records = 0
+        self.owners: List[str] = []
+        self._owner_codes: Dict[str, int] = {}
+        self._id_map: Dict[str, int] = {}
+        self._update_stats()
+
+    def _update_stats(self):
+        """Broj živih dokumenata i BM25 normalizacija dužine (keširano po verziji indeksa)."""
+        live = ~self.deleted
+        self.live_docs = int(np.count_nonzero(live))
+        avgdl = float(self.doc_len[live].mean()) if self.live_docs else 1.0
+        self._len_norm = (
+            self.k1 * (1.0 - self.b + self.b * self.doc_len / max(avgdl, 1e-9))
+        ).astype(np.float32)
+
+    def _add_terms(self, terms: Sequence[str]):
+        for term in terms:
+            self.terms[term] = len(self.vocab)
+            self.vocab.append(term)
+
+    def _add_owners(self, owners: Sequence[str]):
+        for owner in owners:
+            self._owner_codes[owner] = len(self.owners)
+            self.owners.append(owner)
+
+    def _append_docs(self, doc_len: np.ndarray, doc_ids: np.ndarray, doc_owner: np.ndarray):
+        start = len(self.doc_len)
+        self.doc_len = np.concatenate([self.doc_len, doc_len])
+        self.doc_ids = np.vstack([self.doc_ids, doc_ids])
+        self.doc_owner = np.concatenate([self.doc_owner, doc_owner])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(doc_len), dtype=np.bool_)])
+        for i, row in enumerate(doc_ids, start=start):
+            self._id_map[str(uuid.UUID(bytes=row.tobytes()))] = i
+
+    def _read_manifest(self) -> Optional[Dict]:
+        filename = self._file("manifest.json")
+        if os.path.exists(filename):
+            with open(filename) as f:
+                return json.load(f)
+        if os.path.exists(self._file("bm25.npz")):
+            # Stari format: jedan bm25.npz bez segmenata
+            return {"generation": 0, "base": "bm25.npz", "segments": [], "deleted": 0}
+        return None
+
+    def _state_mtime(self) -> Optional[int]:
+        for name in ("manifest.json", "bm25.npz"):
+            filename = self._file(name)
+            if os.path.exists(filename):
+                return os.stat(filename).st_mtime_ns
+        return None
+
+    def _load_base(self, name: str):
+        with np.load(self._file(name)) as data:
+            self._add_terms(data["vocab"].tolist())
+            self._add_owners(data["owners"].tolist())
+            self.offsets = data["offsets"]
+            self.gaps = data["gaps"]
+            self.tfs = data["tfs"]
+            self._append_docs(data["doc_len"], data["doc_ids"], data["doc_owner"])
+            if "deleted" in data.files:
+                self.deleted[:len(data["deleted"])] |= data["deleted"]
+        self.base_name = name
+
+    def _load_segment(self, name: str):
+        with np.load(self._file(name)) as data:
+            self._add_terms(data["terms"].tolist())
+            self._add_owners(data["owners"].tolist())
+            self._append_docs(data["doc_len"], data["doc_ids"], data["doc_owner"])
+            self.segments.append(_Segment(name, data["term_ids"], data["offsets"], data["docs"], data["tfs"]))
+
+    def _read_deleted(self, end: int):
+        if end > self.deleted_records:
+            with open(self._file("deleted.log"), "rb") as f:
+                f.seek(self.deleted_records * 4)
+                docs = np.frombuffer(f.read((end - self.deleted_records) * 4), dtype="<u4")
+            self.deleted[docs] = True
+            self.deleted_records = end
+
+    def _load(self, manifest: Dict):
+        """Nova generacija (merge/rebuild) se učitava cijela; inače samo novi segmenti i tombstone-i."""
+        known = [segment.name for segment in self.segments]
+        if (
+            manifest["generation"] != self.generation
+            or manifest["base"] != self.base_name
+            or manifest["segments"][:len(known)] != known
+        ):
+            self._reset()
+            if manifest["base"]:
+                self._load_base(manifest["base"])
+            self.generation = manifest["generation"]
+            known = []
+        for name in manifest["segments"][len(known):]:
+            self._load_segment(name)
+        self._read_deleted(manifest["deleted"])
+        self._update_stats()
+
+    def _save_manifest(self):
+        manifest = {
+            "generation": self.generation,
+            "base": self.base_name,
+            "segments": [segment.name for segment in self.segments],
+            "deleted": self.deleted_records,
+        }
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._file("manifest.json"))
+        self._mtime = self._state_mtime()
+
+    def _stale(self) -> bool:
+        return self._state_mtime() != self._mtime
+
+    def _refresh(self):
+        if not self._stale():
+            return
+        self._mtime = self._state_mtime()
+        manifest = self._read_manifest()
+        if manifest is not None:
+            self._load(manifest)
+
+    @contextmanager
+    def _read(self):
+        if self._stale():
+            with self._rw.write():
+                with file_lock(self._file("lock"), shared=True):
+                    self._refresh()
+        with self._rw.read():
+            yield
+
+    @contextmanager
+    def _write(self):
+        with self._rw.write():
+            with file_lock(self._file("lock")):
+                self._refresh()
+                yield
+                self._save_manifest()
+
+    def _write_npz(self, name: str, **arrays):
+        tmp = self._file(f"{name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self._file(name))
+
+    def _remove_files(self, names: Sequence[str]):
+        for name in names:
+            try:
+                os.remove(self._file(name))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------------ postings
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        doc_parts, tf_parts = [], []
+        if term_id < len(self.offsets) - 1:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_parts.append(np.cumsum(self.gaps[start:end], dtype=np.int64))
+            tf_parts.append(self.tfs[start:end])
+        for segment in self.segments:
+            docs, tfs = segment.postings(term_id)
+            doc_parts.append(docs)
+            tf_parts.append(tfs)
+        if len(doc_parts) == 1:
+            return doc_parts[0], tf_parts[0]
+        return np.concatenate(doc_parts), np.concatenate(tf_parts)
+
+    def _tokenize_docs(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        owner_codes: Sequence[int],
+        first_doc: int,
+        seen: Dict[str, int]
+    ):
+        """
+        Postinzi novih dokumenata kao (term, doc, tf) nizovi + nizovi po dokumentu;
+        novi termovi se dodaju u vokabular, ID-jevi iz seen se preskaču.
+        """
+        new_terms: List[int] = []
+        new_docs: List[int] = []
+        new_tfs: List[int] = []
+        lengths: List[int] = []
+        doc_ids: List[bytes] = []
+        doc_owner: List[int] = []
+        doc = first_doc
+        for chunk_id, content, owner_code in zip(ids, texts, owner_codes):
+            chunk_id = str(chunk_id)
+            if chunk_id in seen:
+                continue
+            tokens = tokenize(content or "")
+            for term, tf in Counter(tokens).items():
+                term_id = self.terms.get(term)
+                if term_id is None:
+                    term_id = self.terms[term] = len(self.vocab)
+                    self.vocab.append(term)
+                new_terms.append(term_id)
+                new_docs.append(doc)
+                new_tfs.append(tf)
+            lengths.append(len(tokens))
+            doc_ids.append(uuid.UUID(chunk_id).bytes)
+            doc_owner.append(owner_code)
+            seen[chunk_id] = doc
+            doc += 1
+        return (
+            np.asarray(new_terms, dtype=np.int64),
+            np.asarray(new_docs, dtype=np.int64),
+            np.asarray(new_tfs, dtype=np.int64),
+            np.asarray(lengths, dtype=np.int32),
+            np.frombuffer(b"".join(doc_ids), dtype=np.uint8).reshape(-1, 16),
+            np.asarray(doc_owner, dtype=np.int32),
+        )
+
+    def _owner_code(self, owner_id: Optional[str]) -> int:
+        owner = str(owner_id) if owner_id else ""
+        if owner not in self._owner_codes:
+            self._add_owners([owner])
+        return self._owner_codes[owner]
+
+    # ------------------------------------------------------------------ API
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], owner_id: Optional[str] = None) -> int:
+        if not len(ids):
+            return 0
+
+        with self._write():
+            fresh = [(str(chunk_id), content) for chunk_id, content in zip(ids, texts) if str(chunk_id) not in self._id_map]
+            if not fresh:
+                return 0
+            vocab_start, owners_start = len(self.vocab), len(self.owners)
+            owner_code = self._owner_code(owner_id)
+            term_ids, docs, tfs, lengths, doc_ids, doc_owner = self._tokenize_docs(
+                [chunk_id for chunk_id, _ in fresh],
+                [content for _, content in fresh],
+                [owner_code] * len(fresh),
+                len(self.doc_len),
+                {}
+            )
+
+            # Segment čuva samo svoje termove (sortirane), ne cijeli vokabular
+            present, local = np.unique(term_ids, return_inverse=True)
+            offsets, docs, tfs = _group_by_term(local, docs, tfs, len(present))
+            name = f"seg_{uuid.uuid4().hex}.npz"
+            self._write_npz(
+                name,
+                terms=np.array(self.vocab[vocab_start:], dtype=np.str_),
+                owners=np.array(self.owners[owners_start:], dtype=np.str_),
+                term_ids=present,
+                offsets=offsets,
+                docs=docs.astype(np.uint32),
+                tfs=tfs,
+                doc_len=lengths,
+                doc_ids=doc_ids,
+                doc_owner=doc_owner,
+            )
+            self.segments.append(_Segment(name, present, offsets, docs.astype(np.uint32), tfs))
+            self._append_docs(lengths, doc_ids, doc_owner)
+            self._update_stats()
+            merge = len(self.segments) > self.MAX_SEGMENTS
+
+        if merge:
+            self._schedule_merge()
+        return len(lengths)
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._write():
+            docs = []
+            for chunk_id in ids:
+                doc = self._id_map.get(str(chunk_id))
+                if doc is not None and not self.deleted[doc]:
+                    self.deleted[doc] = True
+                    docs.append(doc)
+            if docs:
+                with open(self._file("deleted.log"), "ab") as f:
+                    # Zapis koji je prethodni pisac prekinuo prije manifest-a se prepisuje
+                    f.truncate(self.deleted_records * 4)
+                    f.write(np.asarray(docs, dtype="<u4").tobytes())
+                self.deleted_records += len(docs)
+                self._update_stats()
+        return len(docs)
+
+    def _schedule_merge(self):
+        if self._merge_lock.acquire(blocking=False):
+            threading.Thread(target=self._merge_segments, name="bm25-merge", daemon=True).start()
+
+    def _merge_segments(self):
+        """
+        Spoji bazni CSR i segmente u novi bazni CSR. Računa se nad snapshot-om
+        (segmenti su nepromjenljivi) bez lock-a; pod flock-om se samo upisuje nova
+        generacija, a segmenti dodani u međuvremenu ostaju kao segmenti.
+        """
+        try:
+            with self._read():
+                generation, base_name = self.generation, self.base_name
+                segments = list(self.segments)
+                base = _decode_csr(self.offsets, self.gaps), self.tfs
+                n_terms, n_owners, n_docs = len(self.vocab), len(self.owners), len(self.doc_len)
+                vocab, owners = self.vocab[:n_terms], self.owners[:n_owners]
+                doc_len, doc_ids, doc_owner = self.doc_len[:n_docs], self.doc_ids[:n_docs], self.doc_owner[:n_docs]
+                deleted = self.deleted[:n_docs].copy()
+
+            (base_terms, base_docs), base_tfs = base
+            term_parts, doc_parts, tf_parts = [base_terms], [base_docs], [base_tfs]
+            for segment in segments:
+                counts = np.diff(segment.offsets)
+                term_parts.append(np.repeat(segment.term_ids.astype(np.int64), counts))
+                doc_parts.append(segment.docs.astype(np.int64))
+                tf_parts.append(segment.tfs)
+            merged_offsets, merged_docs, merged_tfs = _group_by_term(
+                np.concatenate(term_parts), np.concatenate(doc_parts), np.concatenate(tf_parts), n_terms
+            )
+            merged_gaps = _delta_encode(merged_offsets, merged_docs)
+            name = f"base_{generation + 1}.npz"
+            self._write_npz(
+                name,
+                vocab=np.array(vocab, dtype=np.str_),
+                owners=np.array(owners, dtype=np.str_),
+                offsets=merged_offsets,
+                gaps=merged_gaps,
+                tfs=merged_tfs,
+                doc_len=doc_len,
+                doc_ids=doc_ids,
+                doc_owner=doc_owner,
+                deleted=deleted,
+            )
+
+            with self._write():
+                if self.generation != generation or self.base_name != base_name:
+                    # Drugi proces je u međuvremenu spojio/izgradio indeks
+                    self._remove_files([name])
+                    return
+                remaining = self.segments[len(segments):]
+                self.generation += 1
+                self.base_name = name
+                self.offsets, self.gaps, self.tfs = merged_offsets, merged_gaps, merged_tfs
+                self.segments = remaining
+                self._remove_files([segment.name for segment in segments] + ([base_name] if base_name else []))
+        except Exception as e:
+            print(f"BM25 segment merge skipped: {e}")
+        finally:
+            self._merge_lock.release()
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        owner_id: Optional[str] = None,
+        allowed_ids: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """BM25 top_k; allowed_ids (chunk-ovi koji prolaze metadata filtere) se primjenjuje prije top-k."""
+        with self._read():
+            term_ids = {self.terms[t] for t in tokenize(query) if t in self.terms}
+            if not term_ids or not self.live_docs:
+                return []
+
+            owner_code = None
+            if owner_id:
+                owner_code = self._owner_codes.get(str(owner_id))
+                if owner_code is None:
+                    return []
+
+            doc_parts, score_parts = [], []
+            deleted = self.deleted
+            for term_id in term_ids:
+                docs, tfs = self._postings(term_id)
+                # Tombstone-i (do merge-a još u postinzima) ne ulaze ni u df ni u skor
+                live = ~deleted[docs]
+                docs, tfs = docs[live], tfs[live]
+                df = len(docs)
+                if not df:
+                    continue
+                idf = math.log(1.0 + (self.live_docs - df + 0.5) / (df + 0.5))
+                tf = tfs.astype(np.float32)
+                doc_parts.append(docs)
+                score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + self._len_norm[docs]))
+            if not doc_parts:
+                return []
+
+            docs = np.concatenate(doc_parts)
+            unique_docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+            keep = np.ones(len(unique_docs), dtype=np.bool_)
+            if owner_code is not None:
+                keep &= self.doc_owner[unique_docs] == owner_code
+            if allowed_ids is not None:
+                allowed = np.zeros(len(self.doc_len), dtype=np.bool_)
+                allowed[[doc for doc in map(self._id_map.get, map(str, allowed_ids)) if doc is not None]] = True
+                keep &= allowed[unique_docs]
+            unique_docs, scores = unique_docs[keep], scores[keep]
+
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                unique_docs, scores = unique_docs[top], scores[top]
+            order = np.argsort(-scores)
+
+            return [
+                (str(uuid.UUID(bytes=self.doc_ids[doc].tobytes())), float(score))
+                for doc, score in zip(unique_docs[order], scores[order])
+            ]
+
+    def __len__(self) -> int:
+        with self._read():
+            return self.live_docs
+
+    def build_from_db(self, db, batch_size: int = 2000) -> int:
+        """
+        Inicijalno punjenje iz document_chunks u jednom prolazu: postinzi se skupe
+        za sve redove i jednom grupišu u bazni CSR (bez segmenata i merge-a po batch-u).
+        Gradi samo jedan proces (neblokirajući flock na build.lock); ostali vraćaju 0.
+        Upisi drugih workera čekaju na flock dok build traje, pa se ništa ne gubi.
+        """
+        from sqlalchemy import text
+
+        with file_lock(self._file("build.lock"), blocking=False) as acquired:
+            if not acquired or len(self):
+                return 0
+
+            with self._write():
+                generation = self.generation + 1
+                old_files = [segment.name for segment in self.segments] + ([self.base_name] if self.base_name else [])
+                self._reset()
+                term_parts, doc_parts, tf_parts = [], [], []
+                len_parts, id_parts, owner_parts = [], [], []
+                seen: Dict[str, int] = {}
+
+                result = db.execute(text(
+                    "SELECT id, owner_id, content FROM document_chunks ORDER BY created_at"
+                )).yield_per(batch_size)
+                for rows in result.partitions():
+                    parts = self._tokenize_docs(
+                        [str(row.id) for row in rows],
+                        [row.content for row in rows],
+                        [self._owner_code(row.owner_id) for row in rows],
+                        len(seen),
+                        seen
+                    )
+                    for bucket, part in zip((term_parts, doc_parts, tf_parts, len_parts, id_parts, owner_parts), parts):
+                        bucket.append(part)
+
+                added = len(seen)
+                if added:
+                    offsets, docs, tfs = _group_by_term(
+                        np.concatenate(term_parts), np.concatenate(doc_parts), np.concatenate(tf_parts), len(self.vocab)
+                    )
+                    self.offsets, self.gaps, self.tfs = offsets, _delta_encode(offsets, docs), tfs
+                    self._append_docs(np.concatenate(len_parts), np.vstack(id_parts), np.concatenate(owner_parts))
+
+                self.generation = generation
+                self.base_name = f"base_{self.generation}.npz"
+                self._write_npz(
+                    self.base_name,
+                    vocab=np.array(self.vocab, dtype=np.str_),
+                    owners=np.array(self.owners, dtype=np.str_),
+                    offsets=self.offsets,
+                    gaps=self.gaps,
+                    tfs=self.tfs,
+                    doc_len=self.doc_len,
+                    doc_ids=self.doc_ids,
+                    doc_owner=self.doc_owner,
+                )
+                with open(self._file("deleted.log"), "wb"):
+                    pass
+                self._remove_files(old_files)
+                self._update_stats()
+            return added
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Procesni singleton; None kada je LEXICAL_BACKEND=postgres."""
+    global _index
+    if settings.LEXICAL_BACKEND != "bm25":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index(settings.LEXICAL_INDEX_DIR, k1=settings.BM25_K1, b=settings.BM25_B)
+        return _index
@@ -7,12 +7,26 @@ try:
 except Exception:
     _client = None
 
+try:
+    from openai import AsyncOpenAI
+    _async_client = (
+        AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.LLM_TIMEOUT)
+        if settings.OPENAI_API_KEY else None
+    )
+except Exception:
+    _async_client = None
+
 
 def get_llm_client():
     """Vrati OpenAI client ili None ako nije dostupan"""
     return _client
 
 
+def get_async_llm_client():
+    """Vrati AsyncOpenAI client (konkurentni pozivi bez blokiranja event loop-a) ili None"""
+    return _async_client
+
+
 def llm_complete(prompt: str, model: Optional[str] = None, n: int = 1) -> List[str]:
     """
     Vrati listu n završetaka. Ako OpenAI nije dostupan, vrati stub odgovore.
@@ -51,7 +51,8 @@ class DocumentPipeline:
         context = ProcessingContext(
             document_id=document_id,
             file_path=file_path,
-            filename=filename
+            filename=filename,
+            owner_id=str(user_id) if user_id else None
         )
         
         # Execute pipeline (sequential)
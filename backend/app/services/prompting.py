@@ -1,23 +1,50 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from app.core.config import settings
+from app.services.context import PackedContext, pack_context
 
 
-def build_answer_prompt(user_query: str, chunks: List[Dict]) -> str:
+def pack_answer_prompt(
+    user_query: str,
+    chunks: List[Dict],
+    max_context_tokens: Optional[int] = None,
+    model: Optional[str] = None
+) -> Tuple[str, PackedContext]:
     """
-    Konstruiši prompt za generisanje odgovora baziranog na kontekstu.
+    Konstruiši prompt za generisanje odgovora i spakuj kontekst u token budžet.
     
     Args:
         user_query: Pitanje korisnika
-        chunks: Lista chunk dict-ova sa 'content' poljem
+        chunks: Lista chunk dict-ova sa 'content' poljem, po relevantnosti
+        max_context_tokens: Budžet za KONTEKST (default: settings.RAG_CONTEXT_TOKENS)
+        model: Model za tokenizer (default: settings.CHAT_MODEL)
     
     Returns:
-        Formatirani prompt string
+        (prompt, PackedContext sa brojem iskorištenih tokena)
     """
-    ctx_txt = "\n\n---\n".join(
-        (c.get("content", "") or "")[:1200] for c in chunks
+    packed = pack_context(
+        chunks,
+        budget_tokens=max_context_tokens or settings.RAG_CONTEXT_TOKENS,
+        model=model or settings.CHAT_MODEL
     )
-    return (
+    ctx_txt = "\n\n---\n".join(packed.texts)
+    prompt = (
         "Odgovori precizno na pitanje koristeći isključivo informacije iz KONTEKSTA. "
         "Ako nema dovoljno informacija, reci to eksplicitno i nemoj halucinirati.\n\n"
         f"PITANJE:\n{user_query}\n\nKONTEKST:\n{ctx_txt}\n\n"
         "Vrati jasan, sažet odgovor i ne uvodi nove činjenice van konteksta."
     )
+    return prompt, packed
+
+
+def build_answer_prompt(user_query: str, chunks: List[Dict]) -> str:
+    """
+    Konstruiši prompt za generisanje odgovora baziranog na kontekstu.
+    
+    Args:
+        user_query: Pitanje korisnika
+        chunks: Lista chunk dict-ova sa 'content' poljem
+    
+    Returns:
+        Formatirani prompt string
+    """
+    return pack_answer_prompt(user_query, chunks)[0]
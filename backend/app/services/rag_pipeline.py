@@ -1,9 +1,15 @@
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
+import numpy as np
 from openai import OpenAI
 from app.models.document import Document
 from app.core.config import settings
-from app.services.search import SearchService, rrf_merge
+from app.schemas.chat import SearchFilters
+from app.services.context import expand_hits
+from app.services.ranking import mmr_select, rrf_merge
+from app.services.search import SearchService
+from app.services.tracing import Tracer, span
+from app.services.vectors import embed_texts, fallback_embedding
 from app.agents.planner import PlannerAgent
 from app.agents.rewriter import RewriterAgent
 from app.agents.generation import GenerationAgent
@@ -19,9 +25,12 @@ summarizer = SummarizerAgent()
 
 
 class RAGPipeline:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, owner_id=None):
         self.db = db
-        self.search_service = SearchService(db)
+        # Retrieval je ograničen na dokumente korisnika koji postavlja pitanje
+        self.search_service = SearchService(db, owner_id=owner_id)
+        self.precision: str | None = None
+        self.filters: SearchFilters | None = None
         self.client = None
         if settings.OPENAI_API_KEY:
             self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
@@ -29,7 +38,10 @@ class RAGPipeline:
     async def generate_answer(
         self,
         query: str,
-        top_k: int | None = None
+        top_k: int | None = None,
+        precision: str | None = None,
+        filters: SearchFilters | None = None,
+        debug: bool = False
     ) -> Dict[str, Any]:
         """
         Multi-agent RAG pipeline za generisanje odgovora.
@@ -38,6 +50,9 @@ class RAGPipeline:
         Args:
             query: Korisnikov upit
             top_k: Broj rezultata za pretragu (default: settings.RAG_TOP_K)
+            precision: ANN recall/latency nivo (fast | balanced | high)
+            filters: Metadata filteri (dokumenti, doc_type, datumi, tagovi, min_score)
+            debug: Ako je True, vraća i timings blok po stage-ovima
         
         Returns:
             Dict sa answer, citations (sources), verdict, i summary
@@ -46,7 +61,31 @@ class RAGPipeline:
             raise Exception("OpenAI API key not configured")
         
         top_k = top_k or settings.RAG_TOP_K
+        self.precision = precision
+        self.filters = filters
+        tracer = Tracer()
         
+        with tracer.activate(), tracer.span("rag.generate_answer", top_k=top_k):
+            ctx = await self._run_agents(query, top_k)
+
+        # Konvertuj hits u citations format (backward compatibility)
+        citations = self._convert_hits_to_citations(ctx["retrieval"]["hits"])
+
+        result = {
+            "answer": ctx.get("answer", ""),
+            "citations": citations,  # Backward compatible
+            "sources": citations,    # Novi alias
+            "query": query,
+            "verdict": ctx.get("verdict", {"ok": True, "needs_more": False}),
+            "context_usage": ctx.get("context_usage"),
+            # "summary": ctx.get("summary")  # Odkomentiraj ako koristiš summarizer
+        }
+        if debug or settings.RAG_DEBUG_TIMINGS:
+            result["timings"] = tracer.summary()
+        return result
+
+    async def _run_agents(self, query: str, top_k: int) -> Dict[str, Any]:
+        """Agentni tok (plan → rewrite → retrieval → generate → judge), svaki stage u svom span-u."""
         # Inicijalizuj kontekst za agente
         ctx: Dict[str, Any] = {
             "query": query,
@@ -54,71 +93,81 @@ class RAGPipeline:
         }
 
         # 1) PLAN - Planner odlučuje strategiju
-        ctx = planner.run(ctx)
+        with span("rag.plan"):
+            ctx = planner.run(ctx)
 
         # 2) REWRITES - Generiši dodatne query varijante
-        ctx = rewriter.run(ctx)
+        with span("rag.rewrite"):
+            ctx = rewriter.run(ctx)
 
-        # 3) RETRIEVAL - Federated search sa RRF
+        # 3) RETRIEVAL - Federated search sa weighted RRF + MMR diverzifikacijom
         queries = [ctx["query"]] + ctx.get("rewrites", [])
-        result_sets: List[List[Dict[str, Any]]] = []
+        weights = [1.0] + [settings.RAG_REWRITE_WEIGHT] * (len(queries) - 1)
+        fetch_k = top_k * max(settings.RAG_CANDIDATE_MULTIPLIER, 1)
         
-        for q in queries:
-            q_vec = await self._get_embedding(q)
-            hits = await self._search_and_convert(q_vec, top_k)
-            result_sets.append(hits)
+        with span("rag.retrieval", queries=len(queries)):
+            # Svi upiti: jedan embeddings API poziv i jedan batch SQL round-trip
+            with span("rag.embed", queries=len(queries)):
+                query_vecs = await self._get_embeddings(queries)
+            with span("rag.search", queries=len(queries), top_k=fetch_k):
+                result_sets = await self._search_and_convert(queries, query_vecs, fetch_k)
 
-        # RRF merge svih rezultata
-        merged = rrf_merge(result_sets)
-        ctx["retrieval"] = {"hits": merged[:top_k], "top_k": top_k}
+            # RRF merge svih rezultata
+            with span("rag.rrf_merge"):
+                merged = rrf_merge(result_sets, weights=weights, top_n=fetch_k, score_key="fusion_score")
+            ctx["retrieval"] = {"hits": self._diversify(merged, top_k), "top_k": top_k}
 
         # 4) GENERATE - Generiši odgovor
-        ctx = generator.run(ctx)
+        with span("rag.generate"):
+            ctx = generator.run(ctx)
 
         # 5) JUDGE - Evaluacija kvaliteta + eventualna iteracija
-        ctx = judge.run(ctx)
+        with span("rag.judge"):
+            ctx = judge.run(ctx)
 
         # Opciona iteracija ako judge kaže da treba više konteksta
         iteration = 0
         while ctx.get("verdict", {}).get("needs_more") and iteration < 2:
             iteration += 1
             more_k = min(ctx["retrieval"]["top_k"] + 5, 20)
-            extra_sets = []
-            for q in queries:
-                q_vec = await self._get_embedding(q)
-                hits = await self._search_and_convert(q_vec, more_k)
-                extra_sets.append(hits)
-            
-            merged = rrf_merge(result_sets + extra_sets)
-            ctx["retrieval"] = {"hits": merged[:more_k], "top_k": more_k}
-            ctx = generator.run(ctx)
-            ctx = judge.run(ctx)
+            more_fetch_k = more_k * max(settings.RAG_CANDIDATE_MULTIPLIER, 1)
+            with span("rag.judge_iteration", iteration=iteration, top_k=more_k):
+                # Embeddinzi upita se ponovo koriste; samo novi batch search
+                with span("rag.search", queries=len(queries), top_k=more_fetch_k):
+                    extra_sets = await self._search_and_convert(queries, query_vecs, more_fetch_k)
+                
+                merged = rrf_merge(result_sets + extra_sets, weights=weights * 2, top_n=more_fetch_k, score_key="fusion_score")
+                ctx["retrieval"] = {"hits": self._diversify(merged, more_k), "top_k": more_k}
+                with span("rag.generate"):
+                    ctx = generator.run(ctx)
+                with span("rag.judge"):
+                    ctx = judge.run(ctx)
 
         # 6) SUMMARIZE - Opcioni sažetak (možeš aktivirati po potrebi)
         # ctx = summarizer.run(ctx)
 
-        # Konvertuj hits u citations format (backward compatibility)
-        citations = self._convert_hits_to_citations(ctx["retrieval"]["hits"])
-
-        return {
-            "answer": ctx.get("answer", ""),
-            "citations": citations,  # Backward compatible
-            "sources": citations,    # Novi alias
-            "query": query,
-            "verdict": ctx.get("verdict", {"ok": True, "needs_more": False}),
-            # "summary": ctx.get("summary")  # Odkomentiraj ako koristiš summarizer
-        }
+        return ctx
     
-    async def _search_and_convert(self, embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+    async def _search_and_convert(
+        self,
+        queries: List[str],
+        embeddings: np.ndarray,
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
         """
-        Izvuči rezultate pretrage i konvertuj u dict format za RRF.
+        Batch pretraga za sve upite (keyword leg samo uz HYBRID_SEARCH) i konverzija
+        u dict format za RRF - jedna lista hitova po upitu; score je kosinusna sličnost.
         """
-        search_results = await self.search_service.hybrid_search(
-            query="",
-            query_embedding=embedding,
-            top_k=top_k
+        result_lists = await self.search_service.batch_hybrid_search(
+            queries=queries,
+            query_embeddings=embeddings,
+            top_k=top_k,
+            precision=self.precision,
+            filters=self.filters
         )
-        
+        return [self._to_hits(search_results) for search_results in result_lists]
+    
+    def _to_hits(self, search_results) -> List[Dict[str, Any]]:
         hits = []
         for chunk, score in search_results:
             # Konvertuj metadata u dict ako je potrebno
@@ -132,6 +181,7 @@ class RAGPipeline:
                 "id": str(chunk.id),
                 "chunk_id": str(chunk.id),
                 "document_id": str(chunk.document_id),
+                "chunk_index": chunk.chunk_index,
                 "filename": chunk.document.filename if chunk.document else "Unknown",
                 "content": chunk.content,
                 "score": float(score),
@@ -139,6 +189,40 @@ class RAGPipeline:
             })
         return hits
     
+    def _diversify(self, hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        MMR nad RRF kandidatima: izbacuje gotovo identične susjedne chunk-ove
+        (chunk overlap) koji bi inače zauzeli top_k i prompt tokene. Relevantnost je
+        fuzijski score; embeddinzi se učitavaju jednim upitom samo za kandidate.
+        """
+        with span("rag.mmr", candidates=len(hits), top_k=top_k):
+            if settings.RAG_MMR_LAMBDA >= 1.0 or len(hits) <= top_k:
+                selected = hits[:top_k]
+            else:
+                embeddings = self.search_service.load_embeddings([hit["chunk_id"] for hit in hits])
+                embedded = [hit for hit in hits if hit["chunk_id"] in embeddings]
+                if len(embedded) <= top_k:
+                    selected = hits[:top_k]
+                else:
+                    order = mmr_select(
+                        np.array([hit.get("fusion_score", 1.0) for hit in embedded], dtype=np.float32),
+                        np.vstack([embeddings[hit["chunk_id"]] for hit in embedded]),
+                        top_k,
+                        settings.RAG_MMR_LAMBDA
+                    )
+                    selected = [embedded[i] for i in order]
+        
+        return self._expand([{key: value for key, value in hit.items() if key != "fusion_score"} for hit in selected])
+    
+    def _expand(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Opciono: ±RAG_NEIGHBOR_WINDOW susjednih chunk-ova po hitu (jedan upit), spojeni prozori."""
+        window = settings.RAG_NEIGHBOR_WINDOW
+        if window <= 0 or not hits:
+            return hits
+        with span("rag.expand", hits=len(hits), window=window):
+            neighbors = self.search_service.fetch_neighbors(hits, window)
+            return expand_hits(hits, neighbors, window)
+    
     def _convert_hits_to_citations(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Konvertuj hits u citations format (backward compatibility).
@@ -155,22 +239,13 @@ class RAGPipeline:
             for hit in hits
         ]
     
-    async def _get_embedding(self, text: str) -> List[float]:
-        """Generiši embedding vektor za tekst sa fallback-om."""
+    async def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embeddinzi (float32 matrica n x dim) za sve tekstove jednim API pozivom, sa fallback-om."""
         if not self.client:
             # Fallback: Jednostavan deterministički vektor za dev bez API ključa
-            # U produkciji OPENAI_API_KEY mora biti setovan
-            import hashlib
-            hash_digest = hashlib.sha256(text.encode()).digest()
-            # Generiši 1536-dimenzionalni vektor iz hash-a (repeating pattern)
-            base = [float(b) / 255.0 - 0.5 for b in hash_digest]  # 32 floata
-            return (base * 48)[:1536]  # Repeat do 1536 dim
+            return np.vstack([fallback_embedding(text, settings.EMBEDDINGS_DIM) for text in texts])
         
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=settings.EMBEDDINGS_MODEL
-            )
-            return response.data[0].embedding
+            return embed_texts(self.client, texts, settings.EMBEDDINGS_MODEL)
         except Exception as e:
             raise Exception(f"Failed to get embedding: {str(e)}")
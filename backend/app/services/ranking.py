@@ -0,0 +1,97 @@
+import heapq
+from itertools import repeat
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+
+def rrf_merge(
+    result_sets: List[List[Dict]],
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+    top_n: Optional[int] = None,
+    score_key: Optional[str] = None
+) -> List[Dict]:
+    """
+    Weighted Reciprocal Rank Fusion - spaja više result setova u jedan rangiran rezultat.
+
+    Args:
+        result_sets: Lista listi hitova; svaki hit treba da ima unique "chunk_id" ili "id"
+        k: RRF parametar (default 60)
+        weights: Težina po result setu (npr. originalni upit > rewrite-ovi); default 1.0
+        top_n: Vrati samo top_n (heap selekcija umjesto punog sort-a)
+        score_key: Ako je zadan, RRF score se upisuje u kopiju hita pod tim ključem
+            (postojeći "score", npr. kosinusni, ostaje netaknut)
+
+    Returns:
+        Ujedinjena lista dict-ova sortirana po RRF score-u
+    """
+    scores: Dict[str, float] = {}
+    keep: Dict[str, Dict] = {}
+
+    for results, weight in zip(result_sets, weights if weights is not None else repeat(1.0)):
+        for rank, item in enumerate(results, start=1):
+            cid = item.get("chunk_id") or item.get("id")
+            if not cid:
+                continue
+            keep.setdefault(cid, item)
+            scores[cid] = scores.get(cid, 0.0) + weight / (k + rank)
+
+    if top_n is not None and top_n < len(scores):
+        ranked = heapq.nlargest(top_n, scores.items(), key=itemgetter(1))
+    else:
+        ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)
+    if score_key is None:
+        return [keep[cid] for cid, _ in ranked]
+    return [{**keep[cid], score_key: score} for cid, score in ranked]
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    candidates: np.ndarray,
+    top_k: int,
+    lambda_: float = 0.7
+) -> List[int]:
+    """
+    Maximal Marginal Relevance nad matricom kandidata (n, dim).
+
+    Bira indekse koji maksimizuju lambda * rel(c) - (1 - lambda) * max sim(c, izabrani).
+    Relevantnost je fuzijski (RRF) score normalizovan na [0, 1], pa MMR poštuje rang
+    svih leg-ova/upita umjesto da ga zamijeni kosinusom prema jednom upitu.
+    Maksimalna sličnost sa izabranim se održava inkrementalno (jedan mat-vec po koraku),
+    pa je cijena O(top_k * n * dim) - nekoliko ms za 1000 kandidata.
+
+    Args:
+        relevance: Score kandidata (n,), npr. RRF; normalizuje se dijeljenjem sa maksimumom
+        candidates: Embeddinzi kandidata (n, dim), redoslijed = ulazni rang
+        top_k: Broj kandidata za izbor
+        lambda_: 1.0 = čista relevantnost, 0.0 = čista raznolikost
+
+    Returns:
+        Indeksi izabranih kandidata po redoslijedu izbora
+    """
+    matrix = np.asarray(candidates, dtype=np.float32)
+    n = len(matrix)
+    if n == 0 or top_k <= 0:
+        return []
+
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    relevance = relevance / max(float(relevance.max()), 1e-12)
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    for step in range(min(top_k, n)):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_ * relevance - (1.0 - lambda_) * max_sim
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, matrix @ matrix[best], out=max_sim)
+
+    return selected
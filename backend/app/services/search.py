@@ -1,101 +1,715 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import text, func, select, desc
-from typing import List, Tuple, Dict, Any
+from typing import List, Set, Tuple, Dict, Any
 from app.models.chunk import DocumentChunk
 from app.models.document import Document
-from pgvector.sqlalchemy import Vector
+from app.schemas.chat import SearchFilters
+from app.services.lexical_index import get_lexical_index
+from app.services.ranking import rrf_merge  # noqa: F401 - re-export
+from app.services.tracing import span
+from app.services.vector_index import get_vector_index
+from app.services.vectors import as_vector
+from app.core.config import settings
+from app.core.indexes import ann_expression, ann_query_expression
+import numpy as np
+import json
 import uuid
 
 
-def rrf_merge(result_sets: List[List[Dict]], k: int = 60) -> List[Dict]:
-    """
-    Reciprocal Rank Fusion - spaja više result setova u jedan rangiran rezultat.
-    
-    Args:
-        result_sets: Lista listi hitova; svaki hit treba da ima unique "chunk_id" ili "id"
-        k: RRF parametar (default 60)
-    
-    Returns:
-        Ujedinjena lista dict-ova sortirana po RRF score-u
-    """
-    scores: dict[str, float] = {}
-    keep: dict[str, Dict] = {}
-    
-    for results in result_sets:
-        for rank, item in enumerate(results, start=1):
-            cid = item.get("chunk_id") or item.get("id")
-            if not cid:
-                continue
-            keep[cid] = item
-            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
-    
-    # Sort po zbirnim score
-    merged_ids = sorted(scores.keys(), key=lambda x: scores[x], reverse=True)
-    return [keep[cid] for cid in merged_ids]
+# Preciznost -> parametri ANN pretrage; veće vrijednosti = bolji recall, sporiji upit
+EF_SEARCH_BY_PRECISION = {"fast": 20, "balanced": 40, "high": 200}
+PROBES_BY_PRECISION = {"fast": 1, "balanced": 10, "high": 40}
 
 
 class SearchService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, owner_id: uuid.UUID | str | None = None):
+        """
+        Args:
+            db: SQLAlchemy sesija
+            owner_id: Tenant (documents.created_by) na koji je pretraga ograničena;
+                None = bez tenant filtera (interni pozivi)
+        """
         self.db = db
+        self.owner_id = str(owner_id) if owner_id else None
+    
+    def _scope_filter(self, filters: SearchFilters | None = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Tenant + status + korisnički filteri koji se guraju u sam ANN/FTS upit.
+        owner_id je denormalizovan na chunk, pa filter ne zavisi od JOIN-a.
+        
+        Metadata filteri koriste @> (GIN jsonb_path_ops) i metadata->>'document_date'
+        (BTREE expression indeks), vidi db/init/05_metadata_filters.sql.
+        
+        Dedup chunk-ovi postoje samo jednom (chunk_links): chunk prolazi dokument filtere
+        ako ih prolazi njegov dokument ili bilo koji dokument koji ga linkuje.
+        """
+        clauses = ["d.status = 'ready'"]
+        params: Dict[str, Any] = {}
+        if self.owner_id:
+            clauses.append("dc.owner_id = CAST(:owner_id AS uuid)")
+            params["owner_id"] = self.owner_id
+        
+        if filters is None:
+            return " AND ".join(clauses), params
+        
+        own = self._document_clauses(filters, params, "d", "dc.document_id")
+        if own:
+            linked = self._document_clauses(filters, params, "ld", "l.document_id")
+            clauses.append(f"""(({" AND ".join(own)}) OR EXISTS (
+                SELECT 1 FROM chunk_links l
+                JOIN documents ld ON ld.id = l.document_id
+                WHERE l.canonical_chunk_id = dc.id AND ld.status = 'ready' AND {" AND ".join(linked)}
+            ))""")
+        
+        return " AND ".join(clauses), params
+    
+    @staticmethod
+    def _document_clauses(filters: SearchFilters, params: Dict[str, Any], doc: str, document_id: str) -> List[str]:
+        """Dokument-level filteri nad aliasom doc (documents) i izrazom document_id."""
+        clauses = []
+        if filters.document_ids:
+            clauses.append(f"{document_id} = ANY(CAST(:document_ids AS uuid[]))")
+            params["document_ids"] = [str(d) for d in filters.document_ids]
+        if filters.doc_type:
+            clauses.append(f"{doc}.metadata @> CAST(:doc_type AS jsonb)")
+            params["doc_type"] = json.dumps({"doc_type": filters.doc_type})
+        if filters.date_from:
+            clauses.append(f"{doc}.metadata->>'document_date' >= :date_from")
+            params["date_from"] = filters.date_from.isoformat()
+        if filters.date_to:
+            clauses.append(f"{doc}.metadata->>'document_date' <= :date_to")
+            params["date_to"] = filters.date_to.isoformat()
+        if filters.tags:
+            # Bilo koji tag: OR nad @> (BitmapOr nad oba GIN indeksa)
+            tag_clauses = []
+            for i, tag in enumerate(filters.tags):
+                tag_clauses.append(f"{doc}.metadata @> CAST(:tag_doc_{i} AS jsonb)")
+                tag_clauses.append(f"dc.metadata @> CAST(:tag_chunk_{i} AS jsonb)")
+                params[f"tag_doc_{i}"] = json.dumps({"tags": [tag]}, ensure_ascii=False)
+                params[f"tag_chunk_{i}"] = json.dumps({"keywords": [tag]}, ensure_ascii=False)
+            clauses.append("(" + " OR ".join(tag_clauses) + ")")
+        return clauses
     
     async def hybrid_search(
         self,
         query: str,
         top_k: int = 5,
-        query_embedding: List[float] | None = None
+        query_embedding: np.ndarray | None = None,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
     ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        filters.min_score se primjenjuje na kosinusnu sličnost vektorskog leg-a;
+        kod čisto tekstualne pretrage na rank.
+        Sa embedding-om pretraga je vektorska; keyword leg se dodaje (RRF) samo uz HYBRID_SEARCH.
+        """
         results = []
         
-        if query_embedding:
-            results = self._vector_search(query_embedding, top_k)
+        if query_embedding is not None and query and settings.HYBRID_SEARCH:
+            # Oba leg-a (semantički + keyword) spojena RRF-om
+            vector_hits = self._vector_search(query_embedding, top_k, precision, filters)
+            text_hits = self._text_search(query, top_k, filters, apply_min_score=False)
+            with span("search.fuse", vector=len(vector_hits), text=len(text_hits)):
+                vector_rows = [(str(chunk.id), score) for chunk, score in vector_hits]
+                text_rows = [(str(chunk.id), score) for chunk, score in text_hits]
+                chunks = {str(chunk.id): chunk for chunk, _ in vector_hits + text_hits}
+                similarity = self._similarities([query_embedding], [vector_rows], [text_rows])
+                results = [
+                    (chunks[chunk_id], score)
+                    for chunk_id, score in self._fuse(vector_rows, text_rows, similarity[0], top_k)
+                ]
+        elif query_embedding is not None:
+            results = self._vector_search(query_embedding, top_k, precision, filters)
         else:
-            results = self._text_search(query, top_k)
+            results = self._text_search(query, top_k, filters)
         
         return results
     
-    def _vector_search(self, embedding: List[float], top_k: int) -> List[Tuple[DocumentChunk, float]]:
-        from pgvector.sqlalchemy import Vector
+    @staticmethod
+    def _fuse(
+        vector_rows: List[Tuple[str, float]],
+        text_rows: List[Tuple[str, float]],
+        similarity: Dict[str, float],
+        top_k: int,
+        k: int = 60
+    ) -> List[Tuple[str, float]]:
+        """
+        RRF rang nad (chunk_id, score) leg-ovima. Score rezultata ostaje kosinusna
+        sličnost (prikaz u citatima, min_score), ne RRF vrijednost (~0.016).
+        """
+        scores: Dict[str, float] = {}
+        for leg in (vector_rows, text_rows):
+            for rank, (chunk_id, _) in enumerate(leg, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
         
-        embedding_str = str(embedding)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        return [(chunk_id, similarity.get(chunk_id, 0.0)) for chunk_id in ranked]
+    
+    def _similarities(
+        self,
+        query_embeddings,
+        vector_rows: List[List[Tuple[str, float]]],
+        text_rows: List[List[Tuple[str, float]]]
+    ) -> List[Dict[str, float]]:
+        """
+        Kosinusna sličnost po upitu za sve hitove fuzije: vektorski leg je već ima,
+        za hitove samo iz keyword leg-a računa se jednim upitom nad document_chunks.
+        """
+        similarity = [dict(rows) for rows in vector_rows]
+        ords, ids = [], []
+        for ord_, (known, rows) in enumerate(zip(similarity, text_rows), start=1):
+            for chunk_id, _ in rows:
+                if chunk_id not in known:
+                    ords.append(ord_)
+                    ids.append(chunk_id)
+        if not ids:
+            return similarity
         
-        query_sql = text("""
-            SELECT dc.id, dc.document_id, dc.content, dc.chunk_index, dc.metadata, dc.created_at,
-                   1 - (dc.embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM document_chunks dc
+        rows = self.db.execute(text("""
+            SELECT p.ord, dc.id, 1 - (dc.embedding <=> (CAST(:embeddings AS vector[]))[p.ord]) AS similarity
+            FROM unnest(CAST(:ords AS int[]), CAST(:ids AS uuid[])) AS p(ord, id)
+            JOIN document_chunks dc ON dc.id = p.id
             WHERE dc.embedding IS NOT NULL
+        """), {
+            "embeddings": [as_vector(embedding) for embedding in query_embeddings],
+            "ords": ords,
+            "ids": ids,
+        }).fetchall()
+        for row in rows:
+            similarity[row.ord - 1][str(row.id)] = float(row.similarity)
+        return similarity
+    
+    def _set_ann_params(self, top_k: int, precision: str | None):
+        """
+        Postavi ANN parametre samo za tekuću transakciju (SET LOCAL semantika).
+        ef_search mora biti >= top_k, inače HNSW vraća manje od top_k rezultata.
+        """
+        precision = precision or settings.VECTOR_SEARCH_PRECISION
+        configs: Dict[str, str] = {}
+        if settings.VECTOR_INDEX_TYPE == "ivfflat":
+            configs["ivfflat.probes"] = str(PROBES_BY_PRECISION.get(precision, PROBES_BY_PRECISION["balanced"]))
+        else:
+            # Kod shortlist moda indeks mora vratiti sve kandidate za rerank (hnsw max 1000)
+            wanted = top_k if settings.VECTOR_SHORTLIST == "none" else max(settings.VECTOR_RERANK_CANDIDATES, top_k)
+            ef_search = min(max(EF_SEARCH_BY_PRECISION.get(precision, EF_SEARCH_BY_PRECISION["balanced"]), wanted), 1000)
+            configs["hnsw.ef_search"] = str(ef_search)
+        
+        # Iterativni scan: indeks se skenira dalje dok tenant/status filter ne popuni top_k
+        if settings.VECTOR_ITERATIVE_SCAN != "off":
+            # ivfflat podržava samo relaxed_order
+            mode = "relaxed_order" if settings.VECTOR_INDEX_TYPE == "ivfflat" else settings.VECTOR_ITERATIVE_SCAN
+            configs[f"{settings.VECTOR_INDEX_TYPE}.iterative_scan"] = mode
+        
+        # Svi parametri u jednom round-trip-u
+        calls = ", ".join(f"set_config(:name_{i}, :value_{i}, true)" for i in range(len(configs)))
+        params: Dict[str, str] = {}
+        for i, (name, value) in enumerate(configs.items()):
+            params[f"name_{i}"] = name
+            params[f"value_{i}"] = value
+        self.db.execute(text(f"SELECT {calls}"), params)
+    
+    def _ann_sql(self, top_k: int, filters: SearchFilters | None = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        ANN upit za konfigurisani VECTOR_SHORTLIST mod.
+        
+        none: direktan ANN nad full-precision indeksom.
+        halfvec/binary: kompaktni indeks bira VECTOR_RERANK_CANDIDATES kandidata,
+        koji se zatim rerankuju exact cosine udaljenošću na full-precision vektorima.
+        """
+        scope_sql, scope_params = self._scope_filter(filters)
+        params: Dict[str, Any] = {"top_k": top_k, **scope_params}
+        # min_score kao gornja granica udaljenosti (1 - cosine similarity)
+        params["max_distance"] = 1 - filters.min_score if filters and filters.min_score is not None else 2.0
+        
+        if settings.VECTOR_SHORTLIST == "none":
+            # MATERIALIZED CTE + ponovni ORDER BY: relaxed_order iterativni scan
+            # može vratiti redove blago van redoslijeda
+            return text(f"""
+                WITH ann AS MATERIALIZED (
+                    SELECT dc.id, dc.embedding <=> CAST(:embedding AS vector) AS distance
+                    FROM document_chunks dc
+                    JOIN documents d ON d.id = dc.document_id
+                    WHERE dc.embedding IS NOT NULL AND {scope_sql}
+                    ORDER BY dc.embedding <=> CAST(:embedding AS vector)
+                    LIMIT :top_k
+                )
+                SELECT id, 1 - distance AS similarity FROM ann
+                WHERE distance <= :max_distance
+                ORDER BY distance
+            """), params
+        
+        expr, _, op = ann_expression("dc")
+        params["candidates"] = max(settings.VECTOR_RERANK_CANDIDATES, top_k)
+        return text(f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT dc.id, dc.embedding
+                FROM document_chunks dc
+                JOIN documents d ON d.id = dc.document_id
+                WHERE dc.embedding IS NOT NULL AND {scope_sql}
+                ORDER BY {expr} {op} {ann_query_expression(":embedding")}
+                LIMIT :candidates
+            ),
+            reranked AS (
+                SELECT id, embedding <=> CAST(:embedding AS vector) AS distance
+                FROM candidates
+                ORDER BY distance
+                LIMIT :top_k
+            )
+            SELECT id, 1 - distance AS similarity FROM reranked
+            WHERE distance <= :max_distance
+            ORDER BY distance
+        """), params
+    
+    def _batch_ann_sql(self, top_k: int, filters: SearchFilters | None = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Isti ANN upit kao _ann_sql, ali za niz query vektora: unnest(vector[]) WITH ORDINALITY
+        + LATERAL top-k po upitu (nested loop nad ANN index scan-om), jedan round-trip.
+        """
+        scope_sql, scope_params = self._scope_filter(filters)
+        params: Dict[str, Any] = {"top_k": top_k, **scope_params}
+        params["max_distance"] = 1 - filters.min_score if filters and filters.min_score is not None else 2.0
+        
+        if settings.VECTOR_SHORTLIST == "none":
+            lateral = f"""
+                SELECT dc.id, dc.embedding <=> q.embedding AS distance
+                FROM document_chunks dc
+                JOIN documents d ON d.id = dc.document_id
+                WHERE dc.embedding IS NOT NULL AND {scope_sql}
+                ORDER BY dc.embedding <=> q.embedding
+                LIMIT :top_k
+            """
+        else:
+            expr, _, op = ann_expression("dc")
+            params["candidates"] = max(settings.VECTOR_RERANK_CANDIDATES, top_k)
+            lateral = f"""
+                SELECT c.id, c.embedding <=> q.embedding AS distance
+                FROM (
+                    SELECT dc.id, dc.embedding
+                    FROM document_chunks dc
+                    JOIN documents d ON d.id = dc.document_id
+                    WHERE dc.embedding IS NOT NULL AND {scope_sql}
+                    ORDER BY {expr} {op} {ann_query_expression("q.embedding")}
+                    LIMIT :candidates
+                ) c
+                ORDER BY distance
+                LIMIT :top_k
+            """
+        
+        return text(f"""
+            WITH q AS MATERIALIZED (
+                SELECT embedding, ord
+                FROM unnest(CAST(:embeddings AS vector[])) WITH ORDINALITY AS t(embedding, ord)
+            )
+            SELECT q.ord, hit.id, 1 - hit.distance AS similarity
+            FROM q
+            CROSS JOIN LATERAL ({lateral}) hit
+            WHERE hit.distance <= :max_distance
+            ORDER BY q.ord, hit.distance
+        """), params
+    
+    async def batch_hybrid_search(
+        self,
+        queries: List[str],
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """
+        hybrid_search za više upita odjednom (RAG rewrite-ovi): vektorski leg je jedan
+        SQL iskaz za sve upite, keyword leg takođe (samo uz HYBRID_SEARCH), a hidratacija
+        jedan upit za sve ID-jeve.
+        
+        Returns:
+            Rangirana lista (chunk, score) po upitu, istim redoslijedom kao queries
+        """
+        vector_rows = self._batch_vector_rows(query_embeddings, top_k, precision, filters)
+        text_rows = None
+        if settings.HYBRID_SEARCH and any(queries):
+            text_rows = self._batch_text_rows(queries, top_k, filters)
+        
+        chunks = self._load_chunks(
+            {chunk_id for rows in vector_rows + (text_rows or []) for chunk_id, _ in rows},
+            filters
+        )
+        
+        def hydrate(rows: List[Tuple[str, float]]) -> List[Tuple[DocumentChunk, float]]:
+            return [(chunks[chunk_id], score) for chunk_id, score in rows if chunk_id in chunks][:top_k]
+        
+        if text_rows is None:
+            return [hydrate(rows) for rows in vector_rows]
+        
+        with span("search.fuse", queries=len(queries)):
+            # Filtrirani (nehidrirani) ID-jevi ne ulaze u rang
+            vector_rows = [[row for row in rows if row[0] in chunks] for rows in vector_rows]
+            text_rows = [[row for row in rows if row[0] in chunks] if query else [] for query, rows in zip(queries, text_rows)]
+            similarity = self._similarities(query_embeddings, vector_rows, text_rows)
+            return [
+                hydrate(self._fuse(vector_leg, text_leg, sims, top_k))
+                for vector_leg, text_leg, sims in zip(vector_rows, text_rows, similarity)
+            ]
+    
+    def _batch_vector_rows(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
+    ) -> List[List[Tuple[str, float]]]:
+        query_vecs = [as_vector(embedding) for embedding in query_embeddings]
+        
+        index = get_vector_index()
+        if index is not None:
+            ef = EF_SEARCH_BY_PRECISION.get(precision or settings.VECTOR_SEARCH_PRECISION, EF_SEARCH_BY_PRECISION["balanced"])
+            allowed_ids = self._allowed_chunk_ids(filters)
+            with span("search.local_ann", queries=len(query_vecs), top_k=top_k, ef=ef):
+                results = [
+                    index.search(q, self._local_candidates(top_k), owner_id=self.owner_id, ef=ef, allowed_ids=allowed_ids)
+                    for q in query_vecs
+                ]
+            if filters and filters.min_score is not None:
+                results = [[hit for hit in hits if hit[1] >= filters.min_score] for hits in results]
+            return results
+        
+        self._set_ann_params(top_k, precision)
+        query_sql, sql_params = self._batch_ann_sql(top_k, filters)
+        with span("search.vector_sql", queries=len(query_vecs), top_k=top_k, shortlist=settings.VECTOR_SHORTLIST):
+            rows = self.db.execute(query_sql, {"embeddings": query_vecs, **sql_params}).fetchall()
+        
+        results: List[List[Tuple[str, float]]] = [[] for _ in query_vecs]
+        for row in rows:
+            results[row.ord - 1].append((str(row.id), float(row.similarity)))
+        return results
+    
+    def _batch_text_rows(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: SearchFilters | None = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Keyword leg za sve upite (u fuziji se min_score ne primjenjuje na rank)."""
+        index = get_lexical_index()
+        if index is not None:
+            allowed_ids = self._allowed_chunk_ids(filters)
+            with span("search.bm25", queries=len(queries), top_k=top_k):
+                return [
+                    index.search(query, self._local_candidates(top_k), owner_id=self.owner_id, allowed_ids=allowed_ids)
+                    if query else []
+                    for query in queries
+                ]
+        
+        scope_sql, scope_params = self._scope_filter(filters)
+        search_query = text(f"""
+            SELECT q.ord, hit.id, hit.rank
+            FROM unnest(CAST(:queries AS text[])) WITH ORDINALITY AS q(query, ord)
+            CROSS JOIN LATERAL (
+                SELECT dc.id, ts_rank(dc.search_vector, plainto_tsquery('simple', q.query)) AS rank
+                FROM document_chunks dc
+                JOIN documents d ON d.id = dc.document_id
+                WHERE dc.search_vector @@ plainto_tsquery('simple', q.query)
+                  AND {scope_sql}
+                ORDER BY rank DESC
+                LIMIT :limit
+            ) hit
+            ORDER BY q.ord, hit.rank DESC
+        """)
+        
+        with span("search.text_sql", queries=len(queries), top_k=top_k):
+            rows = self.db.execute(
+                search_query,
+                {"queries": list(queries), "limit": top_k, **scope_params}
+            ).fetchall()
+        
+        results: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        for row in rows:
+            results[row.ord - 1].append((str(row.id), float(row.rank) if row.rank else 0.0))
+        return results
+    
+    def load_embeddings(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Embeddinzi samo za zadane chunk-ove (npr. MMR kandidate), jedan upit."""
+        if not chunk_ids:
+            return {}
+        with span("search.load_embeddings", rows=len(chunk_ids)):
+            rows = self.db.execute(
+                text("""
+                    SELECT id, embedding FROM document_chunks
+                    WHERE id = ANY(CAST(:ids AS uuid[])) AND embedding IS NOT NULL
+                """),
+                {"ids": list(chunk_ids)}
+            ).fetchall()
+        return {str(row.id): as_vector(row.embedding) for row in rows}
+    
+    def fetch_neighbors(self, hits: List[Dict[str, Any]], window: int) -> Dict[str, Dict[int, str]]:
+        """
+        Susjedni chunk-ovi (±window) svih hitova u jednom upitu nad
+        idx_chunks_document_chunk (document_id, chunk_index). Pozicije dedup
+        duplikata (chunk_links) se popunjavaju sadržajem kanonskog chunk-a.
+        
+        Returns:
+            document_id -> {chunk_index: content}
+        """
+        windows = [
+            (str(hit["document_id"]), hit["chunk_index"] - window, hit["chunk_index"] + window)
+            for hit in hits
+            if hit.get("document_id") and hit.get("chunk_index") is not None
+        ]
+        if not windows or window <= 0:
+            return {}
+        
+        params: Dict[str, Any] = {
+            "document_ids": [w[0] for w in windows],
+            "lo": [w[1] for w in windows],
+            "hi": [w[2] for w in windows],
+        }
+        owner_sql = link_owner_sql = ""
+        if self.owner_id:
+            owner_sql = "AND dc.owner_id = CAST(:owner_id AS uuid)"
+            link_owner_sql = "AND l.owner_id = CAST(:owner_id AS uuid)"
+            params["owner_id"] = self.owner_id
+        
+        with span("search.neighbors", windows=len(windows)):
+            rows = self.db.execute(text(f"""
+                WITH w AS MATERIALIZED (
+                    SELECT *
+                    FROM unnest(
+                        CAST(:document_ids AS uuid[]),
+                        CAST(:lo AS int[]),
+                        CAST(:hi AS int[])
+                    ) AS w(document_id, lo, hi)
+                )
+                SELECT dc.document_id, dc.chunk_index, dc.content
+                FROM w
+                JOIN document_chunks dc
+                  ON dc.document_id = w.document_id
+                 AND dc.chunk_index BETWEEN w.lo AND w.hi
+                WHERE TRUE {owner_sql}
+                UNION
+                SELECT l.document_id, l.chunk_index, dc.content
+                FROM w
+                JOIN chunk_links l
+                  ON l.document_id = w.document_id
+                 AND l.chunk_index BETWEEN w.lo AND w.hi
+                JOIN document_chunks dc ON dc.id = l.canonical_chunk_id
+                WHERE TRUE {link_owner_sql}
+            """), params).fetchall()
+        
+        neighbors: Dict[str, Dict[int, str]] = {}
+        for row in rows:
+            neighbors.setdefault(str(row.document_id), {})[row.chunk_index] = row.content
+        return neighbors
+    
+    def recall_at_k(self, query_embeddings: List[np.ndarray], top_k: int = 10) -> Dict[str, Any]:
+        """
+        Izmjeri recall@k aktivnog ANN moda (VECTOR_SHORTLIST, precision) naspram exact pretrage.
+        Exact referenca se dobija sa isključenim index scan-om u istoj transakciji.
+        """
+        scope_sql, scope_params = self._scope_filter()
+        exact_sql = text(f"""
+            SELECT dc.id
+            FROM document_chunks dc
+            JOIN documents d ON d.id = dc.document_id
+            WHERE dc.embedding IS NOT NULL AND {scope_sql}
             ORDER BY dc.embedding <=> CAST(:embedding AS vector)
             LIMIT :top_k
         """)
         
-        result = self.db.execute(query_sql, {"embedding": embedding_str, "top_k": top_k})
+        recalls = []
+        for embedding in query_embeddings:
+            query_vec = as_vector(embedding)
+            approx = {row.id for row in self._vector_rows(query_vec, top_k)}
+            
+            self.db.execute(text("SELECT set_config('enable_indexscan', 'off', true)"))
+            exact = {
+                row.id for row in self.db.execute(
+                    exact_sql, {"embedding": query_vec, "top_k": top_k, **scope_params}
+                )
+            }
+            self.db.execute(text("SELECT set_config('enable_indexscan', 'on', true)"))
+            
+            if exact:
+                recalls.append(len(approx & exact) / len(exact))
+        
+        return {
+            "mode": settings.VECTOR_SHORTLIST,
+            "top_k": top_k,
+            "queries": len(recalls),
+            "recall_at_k": sum(recalls) / len(recalls) if recalls else None,
+        }
+    
+    def _vector_rows(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
+    ):
+        self._set_ann_params(top_k, precision)
+        query_sql, sql_params = self._ann_sql(top_k, filters)
+        return self.db.execute(query_sql, {"embedding": query_vec, **sql_params}).fetchall()
+    
+    def _vector_search(
+        self,
+        embedding: np.ndarray,
+        top_k: int,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
+    ) -> List[Tuple[DocumentChunk, float]]:
+        # float32 buffer -> binarni pgvector parametar (bez str()/parsiranja teksta)
+        query_vec = as_vector(embedding)
+        
+        if get_vector_index() is not None:
+            return self._local_vector_search(query_vec, top_k, precision, filters)
+        
+        with span("search.vector_sql", top_k=top_k, shortlist=settings.VECTOR_SHORTLIST):
+            result = self._vector_rows(query_vec, top_k, precision, filters)
         
         chunks_with_scores = []
-        for row in result:
-            chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == row.id).first()
-            if chunk:
-                chunks_with_scores.append((chunk, float(row.similarity)))
+        with span("search.hydrate", rows=len(result)):
+            for row in result:
+                chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == row.id).first()
+                if chunk:
+                    chunks_with_scores.append((chunk, float(row.similarity)))
         
         return chunks_with_scores
     
-    def _text_search(self, query: str, top_k: int) -> List[Tuple[DocumentChunk, float]]:
-        search_query = text("""
-            SELECT dc.*, 
-                   ts_rank(to_tsvector('simple', dc.content), plainto_tsquery('simple', :query)) as rank
+    def _local_vector_search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        precision: str | None = None,
+        filters: SearchFilters | None = None
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        VECTOR_BACKEND=hnsw: ANN u procesu (tenant i metadata filteri tokom pretrage),
+        pa jedna hidratacija iz baze koja još provjerava status dokumenta.
+        """
+        ef = EF_SEARCH_BY_PRECISION.get(precision or settings.VECTOR_SEARCH_PRECISION, EF_SEARCH_BY_PRECISION["balanced"])
+        allowed_ids = self._allowed_chunk_ids(filters)
+        
+        with span("search.local_ann", top_k=top_k, ef=ef):
+            hits = get_vector_index().search(
+                query_vec, self._local_candidates(top_k), owner_id=self.owner_id, ef=ef, allowed_ids=allowed_ids
+            )
+        
+        if filters and filters.min_score is not None:
+            hits = [(chunk_id, score) for chunk_id, score in hits if score >= filters.min_score]
+        return self._hydrate_hits(hits, top_k, filters)
+    
+    @staticmethod
+    def _local_candidates(top_k: int) -> int:
+        # Over-fetch jer status dokumenta (npr. processing) važi tek pri hidrataciji
+        return top_k * 2
+    
+    def _allowed_chunk_ids(self, filters: SearchFilters | None) -> Set[str] | None:
+        """
+        Chunk ID-jevi koji prolaze dokument/metadata filtere, za in-process indekse
+        (hnsw/bm25) koji ih primjenjuju prije top-k. None = nema takvih filtera.
+        """
+        if filters is None or not (
+            filters.document_ids or filters.doc_type or filters.date_from or filters.date_to or filters.tags
+        ):
+            return None
+        
+        scope_sql, scope_params = self._scope_filter(filters)
+        with span("search.allowed_ids"):
+            rows = self.db.execute(text(f"""
+                SELECT dc.id
+                FROM document_chunks dc
+                JOIN documents d ON d.id = dc.document_id
+                WHERE {scope_sql}
+            """), scope_params).scalars().all()
+        return {str(chunk_id) for chunk_id in rows}
+    
+    def _load_chunks(self, chunk_ids, filters: SearchFilters | None = None) -> Dict[str, DocumentChunk]:
+        """Jedan upit za sve chunk ID-jeve, uz scope filter (status, tenant, metadata)."""
+        if not chunk_ids:
+            return {}
+        
+        dc = aliased(DocumentChunk, name="dc")
+        d = aliased(Document, name="d")
+        scope_sql, scope_params = self._scope_filter(filters)
+        
+        with span("search.hydrate", rows=len(chunk_ids)):
+            chunks = (
+                self.db.query(dc)
+                .join(d, d.id == dc.document_id)
+                .filter(dc.id.in_(list(chunk_ids)), text(scope_sql))
+                .params(**scope_params)
+                .all()
+            )
+        return {str(chunk.id): chunk for chunk in chunks}
+    
+    def _hydrate_hits(
+        self,
+        hits: List[Tuple[str, float]],
+        top_k: int,
+        filters: SearchFilters | None = None
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """(chunk_id, score) hitovi in-process indeksa -> (chunk, score), redoslijed zadržan."""
+        by_id = self._load_chunks({chunk_id for chunk_id, _ in hits}, filters)
+        return [
+            (by_id[chunk_id], score) for chunk_id, score in hits if chunk_id in by_id
+        ][:top_k]
+    
+    def _text_search(
+        self,
+        query: str,
+        top_k: int,
+        filters: SearchFilters | None = None,
+        apply_min_score: bool = True
+    ) -> List[Tuple[DocumentChunk, float]]:
+        min_score = filters.min_score if filters and apply_min_score else None
+        
+        if get_lexical_index() is not None:
+            return self._bm25_search(query, top_k, filters, min_score)
+        
+        scope_sql, scope_params = self._scope_filter(filters)
+        
+        # search_vector je GENERATED STORED (db/init/04_search_vector.sql): GIN indeks za @@,
+        # ts_rank čita težine (filename/sekcija > keywords > tekst) bez ponovnog parsiranja
+        search_query = text(f"""
+            SELECT dc.id,
+                   ts_rank(dc.search_vector, q.query) as rank
             FROM document_chunks dc
-            WHERE to_tsvector('simple', dc.content) @@ plainto_tsquery('simple', :query)
+            JOIN documents d ON d.id = dc.document_id
+            CROSS JOIN plainto_tsquery('simple', :query) AS q(query)
+            WHERE dc.search_vector @@ q.query
+              AND {scope_sql}
             ORDER BY rank DESC
             LIMIT :limit
         """)
         
-        result = self.db.execute(
-            search_query,
-            {"query": query, "limit": top_k}
-        )
+        with span("search.text_sql", top_k=top_k):
+            result = self.db.execute(
+                search_query,
+                {"query": query, "limit": top_k, **scope_params}
+            ).fetchall()
         
         chunks_with_scores = []
-        for row in result:
-            chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == row.id).first()
-            if chunk:
-                chunks_with_scores.append((chunk, float(row.rank) if row.rank else 0.0))
+        with span("search.hydrate", rows=len(result)):
+            for row in result:
+                chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == row.id).first()
+                if chunk:
+                    chunks_with_scores.append((chunk, float(row.rank) if row.rank else 0.0))
         
+        if min_score is not None:
+            chunks_with_scores = [(chunk, score) for chunk, score in chunks_with_scores if score >= min_score]
         return chunks_with_scores
+    
+    def _bm25_search(
+        self,
+        query: str,
+        top_k: int,
+        filters: SearchFilters | None = None,
+        min_score: float | None = None
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """LEXICAL_BACKEND=bm25: BM25 top-k u procesu (uz metadata filtere), pa jedna hidratacija."""
+        allowed_ids = self._allowed_chunk_ids(filters)
+        with span("search.bm25", top_k=top_k):
+            hits = get_lexical_index().search(
+                query, self._local_candidates(top_k), owner_id=self.owner_id, allowed_ids=allowed_ids
+            )
+        
+        if min_score is not None:
+            hits = [(chunk_id, score) for chunk_id, score in hits if score >= min_score]
+        return self._hydrate_hits(hits, top_k, filters)
@@ -0,0 +1,210 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Aktivni tracer za trenutni request (asyncio task / thread)
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "rag_current_tracer", default=None
+)
+
+# Histogram bucket-i u sekundama (LLM pozivi su u sekundama, pgvector u ms)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class Span:
+    """Jedan izmjereni stage pipeline-a."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "start_perf", "end_perf", "attributes")
+
+    def __init__(self, name: str, span_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.start_perf = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.end_perf: Optional[int] = None
+
+    @property
+    def duration_ms(self) -> float:
+        if self.end_perf is None:
+            return 0.0
+        return (self.end_perf - self.start_perf) / 1_000_000
+
+
+class StageHistogram:
+    """
+    Minimalni Prometheus histogram (cumulative bucket-i) po stage labeli.
+    Thread-safe, bez eksterne zavisnosti.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            counts = self._counts.get(stage)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+                self._counts[stage] = counts
+                self._sums[stage] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # +Inf
+            self._sums[stage] += seconds
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for stage in sorted(self._counts):
+                counts = self._counts[stage]
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'{self.name}_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+                lines.append(f'{self.name}_count{{stage="{stage}"}} {counts[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+stage_histogram = StageHistogram(
+    "rag_stage_duration_seconds",
+    "Trajanje pojedinih stage-ova RAG pipeline-a",
+)
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format za /metrics endpoint."""
+    return stage_histogram.render()
+
+
+class Tracer:
+    """
+    Lagani span recorder za jedan RAG request.
+
+    Koristi se kao:
+        tracer = Tracer()
+        with tracer.activate():
+            with span("rag.plan"):
+                ...
+    Završeni span-ovi se automatski upisuju u Prometheus histogram.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self._stack: List[Span] = []
+
+    @contextmanager
+    def activate(self):
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        parent_id = self._stack[-1].span_id if self._stack else None
+        sp = Span(name, os.urandom(8).hex(), parent_id, attributes)
+        self._stack.append(sp)
+        try:
+            yield sp
+        finally:
+            sp.end_perf = time.perf_counter_ns()
+            sp.end_ns = sp.start_ns + (sp.end_perf - sp.start_perf)
+            self._stack.pop()
+            self.spans.append(sp)
+            stage_histogram.observe(name, sp.duration_ms / 1000)
+
+    def summary(self) -> Dict[str, Any]:
+        """Kompaktni timings blok za ChatResponse (debug)."""
+        stages: Dict[str, float] = {}
+        for sp in self.spans:
+            stages[sp.name] = round(stages.get(sp.name, 0.0) + sp.duration_ms, 3)
+
+        roots = [sp for sp in self.spans if sp.parent_id is None]
+        total_ms = sum(sp.duration_ms for sp in roots)
+
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(total_ms, 3),
+            "stages": stages,
+            "spans": [
+                {
+                    "name": sp.name,
+                    "span_id": sp.span_id,
+                    "parent_id": sp.parent_id,
+                    "duration_ms": round(sp.duration_ms, 3),
+                    "attributes": sp.attributes,
+                }
+                for sp in sorted(self.spans, key=lambda s: s.start_perf)
+            ],
+        }
+
+    def to_otel(self, service_name: str = "multirag-backend") -> Dict[str, Any]:
+        """
+        Export u OTLP/JSON oblik (resourceSpans) kompatibilan sa OpenTelemetry collector-om.
+        """
+        def _attr(key: str, value: Any) -> Dict[str, Any]:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otel_spans = []
+        for sp in self.spans:
+            otel_spans.append({
+                "traceId": self.trace_id,
+                "spanId": sp.span_id,
+                "parentSpanId": sp.parent_id or "",
+                "name": sp.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(sp.start_ns),
+                "endTimeUnixNano": str(sp.end_ns or sp.start_ns),
+                "attributes": [_attr(k, v) for k, v in sp.attributes.items()],
+            })
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attr("service.name", service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.services.tracing"},
+                    "spans": otel_spans,
+                }],
+            }]
+        }
+
+
+def get_current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Span na aktivnom tracer-u; no-op ako tracing nije aktivan.
+    Omogućava servisima (npr. SearchService) da mjere pod-stage-ove bez
+    prosljeđivanja tracer-a kroz potpise.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, **attributes) as sp:
+        yield sp
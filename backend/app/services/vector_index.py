@@ -0,0 +1,600 @@
+import heapq
+import json
+import math
+import os
+import random
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.file_lock import ReadWriteLock, file_lock
+from app.services.vectors import as_vector
+
+
+class VectorIndex(ABC):
+    """
+    Pluggable ANN indeks iza SearchService-a.
+    ID-jevi su chunk UUID-ovi (str), rezultati su (chunk_id, cosine similarity).
+    """
+
+    @abstractmethod
+    def add(self, ids: Sequence[str], vectors: np.ndarray, owner_id: Optional[str] = None) -> int:
+        """Dodaj vektore (inkrementalno, iz ingest path-a). Vraća broj dodanih."""
+
+    @abstractmethod
+    def delete(self, ids: Sequence[str]) -> int:
+        """Označi vektore kao obrisane (tombstone). Vraća broj označenih."""
+
+    @abstractmethod
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        owner_id: Optional[str] = None,
+        ef: Optional[int] = None,
+        allowed_ids: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Najbližih top_k vektora, opciono ograničeno na tenant-a i na allowed_ids
+        (chunk-ovi koji prolaze metadata filtere; filter važi tokom pretrage, ne nakon top-k).
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Broj živih (ne-obrisanih) vektora."""
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = as_vector(vectors)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.float32(1e-12))
+
+
+def _uuid_bytes(value) -> bytes:
+    return uuid.UUID(str(value)).bytes
+
+
+class HNSWVectorIndex(VectorIndex):
+    """
+    In-process HNSW (cosine) sa memory-mapped perzistencijom.
+
+    Layout direktorija:
+        vectors.bin  (capacity, dim) float32, L2 normalizovano
+        links0.bin   (capacity, 2M) uint32 susjedi na nivou 0 (node + 1, 0 = prazno)
+        levels.bin   (capacity,) int8 najviši nivo čvora
+        ids.bin      (capacity, 16) uint8 chunk UUID
+        owners.bin   (capacity, 16) uint8 owner UUID (nule = bez vlasnika)
+        deleted.bin  (capacity,) bool tombstone
+        upper.npz    snapshot susjeda na nivoima >= 1 (mali - ~N/M čvorova)
+        upper.log    izmjene nivoa >= 1 nakon snapshot-a (zapisi fiksne dužine)
+        meta.json    count, capacity, entry point, max_level, upper generacija/broj log zapisa
+
+    Sve worker procese dijele iste stranice (MAP_SHARED). Upisi su serijalizovani
+    flock-om na lock fajlu, a pretraga drži dijeljeni flock; čitaoci ponovo učitaju meta
+    i samo novi dio upper.log-a kada se meta.json promijeni. Pretrage unutar procesa idu
+    paralelno (read lock).
+    """
+
+    MAX_LEVEL = 16
+    # allowed_ids do ovoliko čvorova: egzaktna pretraga (jedno matrično množenje) umjesto grafa
+    EXACT_SEARCH_LIMIT = 20000
+    # upper.log se sažima u upper.npz kad ima više zapisa od max(ovoga, broja upper čvorova)
+    UPPER_COMPACT_MIN = 4096
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        m: int = 16,
+        ef_construction: int = 64,
+        initial_capacity: int = 1024
+    ):
+        self.path = path
+        self.dim = dim
+        self.m = m
+        self.ef_construction = ef_construction
+        self._ml = 1.0 / math.log(max(m, 2))
+        self._rw = ReadWriteLock()
+        self._meta_mtime: Optional[int] = None
+
+        self.count = 0
+        self.capacity = 0
+        self.entry = -1
+        self.max_level = -1
+        self._upper: Dict[int, Dict[int, np.ndarray]] = {}
+        self._upper_dirty: set = set()
+        self._upper_generation = 0
+        self._upper_records = 0
+        self._id_map: Dict[str, int] = {}
+        self._id_map_size = 0
+        self._owner_cache: Dict[bytes, Tuple[int, np.ndarray]] = {}
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._file("meta.json")):
+            self._reload()
+        else:
+            self._open_arrays(initial_capacity)
+
+    # ------------------------------------------------------------------ storage
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open_array(self, name: str, dtype, tail: Tuple[int, ...], capacity: int) -> np.memmap:
+        filename = self._file(f"{name}.bin")
+        itemsize = np.dtype(dtype).itemsize * int(np.prod(tail)) if tail else np.dtype(dtype).itemsize
+        size = capacity * itemsize
+        with open(filename, "ab") as f:
+            if os.path.getsize(filename) < size:
+                f.truncate(size)
+        return np.memmap(filename, dtype=dtype, mode="r+", shape=(capacity,) + tail)
+
+    def _open_arrays(self, capacity: int):
+        self.vectors = self._open_array("vectors", np.float32, (self.dim,), capacity)
+        self.links0 = self._open_array("links0", np.uint32, (2 * self.m,), capacity)
+        self.levels = self._open_array("levels", np.int8, (), capacity)
+        self.ids = self._open_array("ids", np.uint8, (16,), capacity)
+        self.owners = self._open_array("owners", np.uint8, (16,), capacity)
+        self.deleted = self._open_array("deleted", np.bool_, (), capacity)
+        self.capacity = capacity
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._flush_arrays()
+        self._open_arrays(capacity)
+
+    def _flush_arrays(self):
+        for arr in (self.vectors, self.links0, self.levels, self.ids, self.owners, self.deleted):
+            arr.flush()
+
+    def _upper_record_dtype(self) -> np.dtype:
+        return np.dtype([("level", "<i4"), ("node", "<u4"), ("links", "<u4", (self.m,))])
+
+    def _apply_upper_records(self, records: np.ndarray):
+        for level, node, links in zip(records["level"].tolist(), records["node"].tolist(), records["links"]):
+            self._upper.setdefault(level, {})[node] = (links[links > 0] - 1).astype(np.int64)
+
+    def _append_upper_log(self):
+        """Izmijenjeni upper čvorovi na kraj upper.log-a umjesto prepisivanja cijelog upper.npz."""
+        records = np.zeros(len(self._upper_dirty), dtype=self._upper_record_dtype())
+        for row, (level, node) in enumerate(sorted(self._upper_dirty)):
+            nbrs = self._upper[level][node]
+            records[row]["level"] = level
+            records[row]["node"] = node
+            records[row]["links"][:len(nbrs)] = nbrs + 1
+        log_file = self._file("upper.log")
+        with open(log_file, "ab") as f:
+            # Zapis koji je prethodni pisac prekinuo prije meta.json-a se prepisuje
+            f.truncate(self._upper_records * records.dtype.itemsize)
+            f.write(records.tobytes())
+        self._upper_records += len(records)
+        self._upper_dirty.clear()
+
+    def _compact_upper(self):
+        """Snapshot svih upper nivoa u upper.npz; nova generacija, prazan upper.log."""
+        upper = {}
+        for level, nodes in self._upper.items():
+            node_ids = np.fromiter(nodes.keys(), dtype=np.uint32, count=len(nodes))
+            links = np.zeros((len(nodes), self.m), dtype=np.uint32)
+            for row, node in enumerate(node_ids):
+                nbrs = nodes[int(node)]
+                links[row, :len(nbrs)] = nbrs + 1
+            upper[f"nodes_{level}"] = node_ids
+            upper[f"links_{level}"] = links
+        tmp = self._file("upper.npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **upper)
+        os.replace(tmp, self._file("upper.npz"))
+        with open(self._file("upper.log"), "wb"):
+            pass
+        self._upper_generation += 1
+        self._upper_records = 0
+        self._upper_dirty.clear()
+
+    def _save(self):
+        """Flush memmap-ova, upper.log (ili sažimanje u upper.npz) i atomski upis meta.json."""
+        self._flush_arrays()
+
+        if self._upper_dirty:
+            self._append_upper_log()
+        upper_nodes = sum(len(nodes) for nodes in self._upper.values())
+        if self._upper_records > max(self.UPPER_COMPACT_MIN, upper_nodes):
+            self._compact_upper()
+
+        meta = {
+            "dim": self.dim,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "count": self.count,
+            "capacity": self.capacity,
+            "entry": self.entry,
+            "max_level": self.max_level,
+            "upper_generation": self._upper_generation,
+            "upper_records": self._upper_records,
+        }
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+
+    def _reload(self):
+        """Učitaj stanje koje je upisao (možda drugi) proces."""
+        meta_file = self._file("meta.json")
+        self._meta_mtime = os.stat(meta_file).st_mtime_ns
+        with open(meta_file) as f:
+            meta = json.load(f)
+
+        self.dim = meta["dim"]
+        self.m = meta["m"]
+        self.ef_construction = meta["ef_construction"]
+        self._ml = 1.0 / math.log(max(self.m, 2))
+        if meta["capacity"] != self.capacity:
+            self._open_arrays(meta["capacity"])
+        self.count = meta["count"]
+        self.entry = meta["entry"]
+        self.max_level = meta["max_level"]
+        self._upper_dirty.clear()
+
+        generation = meta.get("upper_generation", 0)
+        records = meta.get("upper_records", 0)
+        if generation == self._upper_generation and records >= self._upper_records and self._upper:
+            # Ista generacija snapshot-a: dovoljan je novi dio upper.log-a
+            start = self._upper_records
+        else:
+            self._load_upper_snapshot()
+            start = 0
+        self._read_upper_log(start, records)
+        self._upper_generation = generation
+        self._upper_records = records
+
+        # id map se dopunjava samo za nove čvorove
+        if self._id_map_size > self.count:
+            self._id_map, self._id_map_size = {}, 0
+        for node in range(self._id_map_size, self.count):
+            self._id_map[str(uuid.UUID(bytes=self.ids[node].tobytes()))] = node
+        self._id_map_size = self.count
+
+    def _read_upper_log(self, start: int, end: int):
+        if end <= start:
+            return
+        dtype = self._upper_record_dtype()
+        with open(self._file("upper.log"), "rb") as f:
+            f.seek(start * dtype.itemsize)
+            data = f.read((end - start) * dtype.itemsize)
+        self._apply_upper_records(np.frombuffer(data, dtype=dtype))
+
+    def _load_upper_snapshot(self):
+        self._upper = {}
+        upper_file = self._file("upper.npz")
+        if os.path.exists(upper_file):
+            with np.load(upper_file) as data:
+                for key in data.files:
+                    if not key.startswith("nodes_"):
+                        continue
+                    level = int(key[len("nodes_"):])
+                    nodes = data[key]
+                    links = data[f"links_{level}"]
+                    self._upper[level] = {
+                        int(node): (row[row > 0] - 1).astype(np.int64)
+                        for node, row in zip(nodes, links)
+                    }
+
+    def _stale(self) -> bool:
+        meta_file = self._file("meta.json")
+        return os.path.exists(meta_file) and os.stat(meta_file).st_mtime_ns != self._meta_mtime
+
+    def _refresh(self):
+        if self._stale():
+            self._reload()
+
+    @contextmanager
+    def _read(self):
+        """
+        Dijeljeno čitanje: pretrage istog procesa idu paralelno, a dijeljeni flock drži
+        pisca iz drugog procesa van sve do kraja pretrage (pisac proširuje memmap-ove i
+        prepravlja susjede postojećih čvorova). Kad je drugi proces promijenio indeks,
+        reload se radi pod write lock-om, pa se čitanje ponovi.
+        """
+        while True:
+            if self._stale():
+                with self._rw.write():
+                    with file_lock(self._file("lock"), shared=True):
+                        self._refresh()
+            with self._rw.read():
+                with file_lock(self._file("lock"), shared=True):
+                    # Pisac je mogao završiti između reload-a i flock-a
+                    if not self._stale():
+                        yield
+                        return
+
+    @contextmanager
+    def _write(self):
+        """Ekskluzivan upis: write lock + flock, svježe stanje prije, perzistencija poslije."""
+        with self._rw.write():
+            with file_lock(self._file("lock")):
+                self._refresh()
+                yield
+                self._save()
+
+    # ------------------------------------------------------------------ graph
+
+    def _links(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            row = self.links0[node]
+            return row[row > 0].astype(np.int64) - 1
+        return self._upper.get(level, {}).get(node, np.empty(0, dtype=np.int64))
+
+    def _set_links(self, node: int, level: int, neighbors: np.ndarray):
+        neighbors = np.asarray(neighbors, dtype=np.int64)
+        if level == 0:
+            row = np.zeros(2 * self.m, dtype=np.uint32)
+            row[:len(neighbors)] = neighbors + 1
+            self.links0[node] = row
+        else:
+            self._upper.setdefault(level, {})[node] = neighbors
+            self._upper_dirty.add((level, node))
+
+    def _connect(self, node: int, neighbor: int, level: int):
+        """Dodaj node u listu susjeda; pri prelivu zadrži najbliže (vektorizovano)."""
+        links = self._links(neighbor, level)
+        if node in links:
+            return
+        max_links = 2 * self.m if level == 0 else self.m
+        candidates = np.append(links, node)
+        if len(candidates) > max_links:
+            dists = 1.0 - self.vectors[candidates] @ self.vectors[neighbor]
+            candidates = candidates[np.argsort(dists)[:max_links]]
+        self._set_links(neighbor, level, candidates)
+
+    def _greedy(self, query: np.ndarray, entry: int, level: int) -> int:
+        current = entry
+        current_dist = 1.0 - float(self.vectors[current] @ query)
+        while True:
+            nbrs = self._links(current, level)
+            if not len(nbrs):
+                return current
+            dists = 1.0 - self.vectors[nbrs] @ query
+            best = int(np.argmin(dists))
+            if dists[best] >= current_dist:
+                return current
+            current, current_dist = int(nbrs[best]), float(dists[best])
+
+    def _search_layer(
+        self,
+        query: np.ndarray,
+        entry_points: List[int],
+        ef: int,
+        level: int,
+        accept=None
+    ) -> List[Tuple[float, int]]:
+        """
+        Best-first pretraga jednog nivoa. Distance za sve neposjećene susjede
+        jednog čvora računaju se jednim matričnim množenjem.
+        accept filtrira samo rezultate (tombstone/tenant), ne i navigaciju.
+        """
+        visited = set(entry_points)
+        dists = (1.0 - self.vectors[entry_points] @ query).tolist()
+        candidates = list(zip(dists, entry_points))
+        heapq.heapify(candidates)
+        results: List[Tuple[float, int]] = []
+        for d, n in candidates:
+            if accept is None or accept(n):
+                heapq.heappush(results, (-d, n))
+
+        while candidates:
+            dist, node = heapq.heappop(candidates)
+            if len(results) >= ef and dist > -results[0][0]:
+                break
+
+            nbrs = [n for n in self._links(node, level).tolist() if n not in visited]
+            if not nbrs:
+                continue
+            visited.update(nbrs)
+
+            worst = -results[0][0] if len(results) >= ef else math.inf
+            for d, n in zip((1.0 - self.vectors[nbrs] @ query).tolist(), nbrs):
+                if d < worst:
+                    heapq.heappush(candidates, (d, n))
+                    if accept is None or accept(n):
+                        heapq.heappush(results, (-d, n))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+                        if len(results) >= ef:
+                            worst = -results[0][0]
+
+        return sorted((-d, n) for d, n in results)
+
+    def _insert(self, chunk_id: str, vector: np.ndarray, owner: bytes):
+        node = self.count
+        self._ensure_capacity(node + 1)
+
+        level = min(int(-math.log(1.0 - random.random()) * self._ml), self.MAX_LEVEL)
+        self.vectors[node] = vector
+        self.ids[node] = np.frombuffer(_uuid_bytes(chunk_id), dtype=np.uint8)
+        self.owners[node] = np.frombuffer(owner, dtype=np.uint8)
+        self.deleted[node] = False
+        self.levels[node] = level
+        self.links0[node] = 0
+        self.count += 1
+        self._id_map[chunk_id] = node
+        self._id_map_size = self.count
+
+        if self.entry < 0:
+            self.entry, self.max_level = node, level
+            return
+
+        entry = self.entry
+        for lvl in range(self.max_level, level, -1):
+            entry = self._greedy(vector, entry, lvl)
+
+        entry_points = [entry]
+        for lvl in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vector, entry_points, self.ef_construction, lvl)
+            neighbors = [n for _, n in found[:self.m]]
+            self._set_links(node, lvl, np.array(neighbors, dtype=np.int64))
+            for nbr in neighbors:
+                self._connect(node, nbr, lvl)
+            entry_points = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+
+    # ------------------------------------------------------------------ API
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, owner_id: Optional[str] = None) -> int:
+        if not len(ids):
+            return 0
+        vectors = _normalize(np.atleast_2d(vectors))
+        owner = _uuid_bytes(owner_id) if owner_id else bytes(16)
+
+        added = 0
+        with self._write():
+            for chunk_id, vector in zip(ids, vectors):
+                chunk_id = str(chunk_id)
+                if chunk_id in self._id_map:
+                    continue
+                self._insert(chunk_id, vector, owner)
+                added += 1
+        return added
+
+    def delete(self, ids: Sequence[str]) -> int:
+        removed = 0
+        with self._write():
+            for chunk_id in ids:
+                node = self._id_map.get(str(chunk_id))
+                if node is not None and not self.deleted[node]:
+                    self.deleted[node] = True
+                    removed += 1
+        return removed
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        owner_id: Optional[str] = None,
+        ef: Optional[int] = None,
+        allowed_ids: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        with self._read():
+            if self.entry < 0:
+                return []
+
+            q = _normalize(query)
+            ef = max(ef or 0, top_k)
+            deleted = self.deleted
+            owner = _uuid_bytes(owner_id) if owner_id else None
+            owners = self.owners
+
+            if allowed_ids is not None or owner is not None:
+                if allowed_ids is not None:
+                    nodes = np.fromiter(
+                        (node for node in map(self._id_map.get, map(str, allowed_ids)) if node is not None),
+                        dtype=np.int64
+                    )
+                    if owner is not None:
+                        nodes = nodes[(owners[nodes] == np.frombuffer(owner, dtype=np.uint8)).all(axis=1)]
+                else:
+                    nodes = self._owner_nodes(owner)
+                nodes = nodes[~deleted[nodes]]
+                if not len(nodes):
+                    return []
+                if len(nodes) <= self.EXACT_SEARCH_LIMIT:
+                    return self._exact_search(q, nodes, top_k)
+                allowed = np.zeros(self.count, dtype=np.bool_)
+                allowed[nodes] = True
+                accept = allowed.__getitem__
+                # Selektivan filter (ili mali tenant u dijeljenom indeksu): širi beam
+                # proporcionalno udjelu čvorova da top_k prihvaćenih bude dostižno
+                ef = min(self.count, int(ef * self.count / len(nodes)))
+            else:
+                accept = lambda n: not deleted[n]
+
+            entry = self.entry
+            for lvl in range(self.max_level, 0, -1):
+                entry = self._greedy(q, entry, lvl)
+
+            found = self._search_layer(q, [entry], ef, 0, accept)
+            return [
+                (str(uuid.UUID(bytes=self.ids[n].tobytes())), 1.0 - d)
+                for d, n in found[:top_k]
+            ]
+
+    def _owner_nodes(self, owner: bytes) -> np.ndarray:
+        """Čvorovi vlasnika (sa tombstone-ovima); keš se dopunjava samo za čvorove dodane od prošlog poziva."""
+        size, nodes = self._owner_cache.get(owner, (0, np.empty(0, dtype=np.int64)))
+        if size > self.count:
+            size, nodes = 0, np.empty(0, dtype=np.int64)
+        if size < self.count:
+            match = (self.owners[size:self.count] == np.frombuffer(owner, dtype=np.uint8)).all(axis=1)
+            nodes = np.concatenate([nodes, np.flatnonzero(match) + size])
+            self._owner_cache[owner] = (self.count, nodes)
+        return nodes
+
+    def _exact_search(self, q: np.ndarray, nodes: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        sims = self.vectors[nodes] @ q
+        if len(sims) > top_k:
+            top = np.argpartition(-sims, top_k - 1)[:top_k]
+            nodes, sims = nodes[top], sims[top]
+        order = np.argsort(-sims)
+        return [
+            (str(uuid.UUID(bytes=self.ids[n].tobytes())), float(sim))
+            for n, sim in zip(nodes[order], sims[order])
+        ]
+
+    def __len__(self) -> int:
+        with self._read():
+            return int(self.count - np.count_nonzero(self.deleted[:self.count]))
+
+    def build_from_db(self, db, batch_size: int = 1000) -> int:
+        """
+        Inicijalno punjenje iz document_chunks (npr. pri prelasku sa pgvector backend-a).
+        Gradi samo jedan proces (neblokirajući flock na build.lock); ostali vraćaju 0.
+        """
+        from sqlalchemy import text
+
+        with file_lock(self._file("build.lock"), blocking=False) as acquired:
+            if not acquired or len(self):
+                return 0
+
+            result = db.execute(text(
+                "SELECT id, owner_id, embedding FROM document_chunks WHERE embedding IS NOT NULL"
+            )).yield_per(batch_size)
+
+            added = 0
+            for rows in result.partitions():
+                by_owner: Dict[Optional[str], Tuple[List[str], List[np.ndarray]]] = {}
+                for row in rows:
+                    ids, vecs = by_owner.setdefault(str(row.owner_id) if row.owner_id else None, ([], []))
+                    ids.append(str(row.id))
+                    vecs.append(as_vector(row.embedding))
+                for owner_id, (ids, vecs) in by_owner.items():
+                    added += self.add(ids, np.vstack(vecs), owner_id)
+            return added
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """Procesni singleton; None kada je VECTOR_BACKEND=pgvector."""
+    global _index
+    if settings.VECTOR_BACKEND != "hnsw":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = HNSWVectorIndex(
+                settings.VECTOR_INDEX_DIR,
+                dim=settings.EMBEDDINGS_DIM,
+                m=settings.HNSW_M,
+                ef_construction=settings.HNSW_EF_CONSTRUCTION,
+            )
+        return _index
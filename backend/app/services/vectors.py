@@ -0,0 +1,69 @@
+import base64
+import hashlib
+from typing import Any, List, Sequence
+import numpy as np
+
+
+def as_vector(values: Any) -> np.ndarray:
+    """Normalizuj embedding u contiguous float32 buffer (bez kopije ako već jeste)."""
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+def decode_embedding(raw: Any) -> np.ndarray:
+    """
+    Dekodiraj OpenAI embedding.
+    Uz encoding_format="base64" API vraća little-endian float32 bajtove - čitamo ih
+    direktno u NumPy buffer, bez JSON liste i Python float objekata.
+    """
+    if isinstance(raw, str):
+        return np.frombuffer(base64.b64decode(raw), dtype="<f4")
+    return as_vector(raw)
+
+
+def embed_texts(client, texts: Sequence[str], model: str) -> np.ndarray:
+    """
+    Batch embedding poziv; vraća (n, dim) float32 matricu.
+    Redovi matrice se direktno vežu kao binarni pgvector parametri.
+    """
+    resp = client.embeddings.create(
+        input=list(texts),
+        model=model,
+        encoding_format="base64"
+    )
+    items = sorted(resp.data, key=lambda d: d.index)
+    if not items:
+        return np.empty((0, 0), dtype=np.float32)
+
+    first = decode_embedding(items[0].embedding)
+    matrix = np.empty((len(items), first.shape[0]), dtype=np.float32)
+    matrix[0] = first
+    for i, item in enumerate(items[1:], start=1):
+        matrix[i] = decode_embedding(item.embedding)
+    return matrix
+
+
+def shortlist_vector(embedding: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Matryoshka skraćenje: prvih dim dimenzija, ponovo L2 normalizovano
+    (ekvivalent text-embedding-3 pozivu sa dimensions=dim).
+    """
+    prefix = as_vector(embedding)[..., :dim]
+    norm = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.maximum(norm, np.float32(1e-12))
+
+
+def fallback_embedding(text: str, dim: int) -> np.ndarray:
+    """
+    Deterministički dev vektor (bez API ključa): SHA-256 digest ponovljen do dim.
+    U produkciji OPENAI_API_KEY mora biti setovan.
+    """
+    digest = np.frombuffer(hashlib.sha256(text.encode()).digest(), dtype=np.uint8)
+    base = digest.astype(np.float32) / np.float32(255.0) - np.float32(0.5)
+    return np.resize(base, dim)
+
+
+def stack_embeddings(embeddings: List[Any]) -> np.ndarray:
+    """Složi listu embeddinga u jednu (n, dim) float32 matricu."""
+    if isinstance(embeddings, np.ndarray):
+        return as_vector(embeddings)
+    return as_vector(np.vstack([as_vector(e) for e in embeddings])) if embeddings else np.empty((0, 0), dtype=np.float32)
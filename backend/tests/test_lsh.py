@@ -0,0 +1,61 @@
+import numpy as np
+
+from app.agents.ingest.lsh import (
+    UnionFind,
+    band_hashes,
+    candidate_pairs,
+    find_duplicate_clusters,
+    optimal_params,
+)
+from app.agents.ingest.minhash import MinHasher
+
+
+def test_optimal_params_default_threshold():
+    assert optimal_params(0.85, 128) == (8, 16)
+
+
+def test_optimal_params_follow_threshold():
+    for threshold in (0.5, 0.7, 0.9):
+        bands, rows = optimal_params(threshold, 128)
+        assert bands * rows <= 128
+    # Viši prag pomjera S-krivu udesno: više redova po bandu
+    assert optimal_params(0.5, 128)[1] < optimal_params(0.9, 128)[1]
+
+
+def test_band_hashes_are_stable():
+    signatures = np.arange(2 * 128, dtype=np.uint32).reshape(2, 128)
+    hashes = band_hashes(signatures, 8, 16)
+    assert hashes.shape == (2, 8) and hashes.dtype == np.uint64
+    assert np.array_equal(hashes, band_hashes(signatures.copy(), 8, 16))
+    # Isti redovi u različitim bandovima daju različit hash
+    same = np.zeros((1, 128), dtype=np.uint32)
+    assert len(set(band_hashes(same, 8, 16)[0].tolist())) == 8
+
+
+def test_candidate_pairs_star_and_chain():
+    hashes = np.array([[1], [2], [1], [1], [2]], dtype=np.uint64)
+    pairs = {tuple(pair) for pair in candidate_pairs(hashes).tolist()}
+    assert pairs == {(0, 2), (2, 3), (0, 3), (1, 4)}
+
+
+def test_union_find_representative_is_smallest():
+    clusters = UnionFind(6)
+    for a, b in ((4, 5), (3, 5), (1, 2)):
+        clusters.union(a, b)
+    assert [clusters.representative(i) for i in range(6)] == [0, 1, 1, 3, 3, 3]
+
+
+def test_duplicate_clusters_on_known_set():
+    base = " ".join(f"rijec{i}" for i in range(200))
+    other = " ".join(f"drugo{i}" for i in range(200))
+    texts = [
+        base,
+        other,
+        base + " dodatak",
+        other.replace("drugo17 ", "promjena "),
+        "potpuno nepovezan tekst bez ponavljanja",
+        base,
+    ]
+    signatures = MinHasher(num_perm=128).signatures(texts)
+    assert find_duplicate_clusters(signatures, 0.85) == {2: 0, 3: 1, 5: 0}
+    assert find_duplicate_clusters(signatures[:1], 0.85) == {}
@@ -0,0 +1,56 @@
+import random
+
+import numpy as np
+
+from app.agents.ingest.minhash import MinHasher, estimate_jaccard, normalize_text
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = normalize_text(text).split()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: str, b: str) -> float:
+    sa, sb = _shingles(a), _shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def _pairs(count: int = 40, length: int = 300, seed: int = 7):
+    rng = random.Random(seed)
+    vocabulary = [f"rijec{i}" for i in range(2000)]
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(length)]
+        other = list(words)
+        # Zamjena dijela riječi daje parove širokog raspona sličnosti
+        for position in rng.sample(range(length), rng.randint(0, length // 3)):
+            other[position] = rng.choice(vocabulary)
+        yield " ".join(words), " ".join(other)
+
+
+def test_estimate_tracks_exact_jaccard():
+    hasher = MinHasher(num_perm=128)
+    errors = []
+    for a, b in _pairs():
+        signatures = hasher.signatures([a, b])
+        errors.append(estimate_jaccard(signatures[0], signatures[1]) - _jaccard(a, b))
+    errors = np.abs(errors)
+    # Std. greška procjene sa 128 permutacija je <= 0.045
+    assert errors.max() < 0.15
+    assert errors.mean() < 0.04
+
+
+def test_identical_and_disjoint_texts():
+    hasher = MinHasher(num_perm=128)
+    same = "Ovo je isti tekst, samo sa Drugom interpunkcijom!"
+    signatures = hasher.signatures([same, same.lower().replace(",", ""), "potpuno drugačije riječi ovdje"])
+    assert estimate_jaccard(signatures[0], signatures[1]) == 1.0
+    assert estimate_jaccard(signatures[0], signatures[2]) < 0.1
+
+
+def test_signatures_are_stable_and_blocked_consistently():
+    texts = [a for a, _ in _pairs(count=5)]
+    first = MinHasher(num_perm=64).signatures(texts)
+    assert first.shape == (5, 64) and first.dtype == np.uint32
+    assert np.array_equal(first, MinHasher(num_perm=64).signatures(texts))
+    # Signature chunk-a ne zavisi od ostalih chunk-ova u bloku
+    assert np.array_equal(first[3], MinHasher(num_perm=64).signatures(texts[3:4])[0])
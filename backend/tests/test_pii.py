@@ -0,0 +1,102 @@
+import re
+
+import pytest
+
+from app.agents.ingest.pii import PIIScanner, PII_STATS_KEYS, mask_texts
+
+
+def _luhn(digits: str) -> bool:
+    values = [int(d) for d in digits]
+    for i in range(len(values) - 2, -1, -2):
+        values[i] *= 2
+        if values[i] > 9:
+            values[i] -= 9
+    return sum(values) % 10 == 0
+
+
+def _old_mask(text: str) -> str:
+    """Raniji PolicyAgent: odvojeni re.sub prolazi (email, telefoni, JMBG, kartica, IBAN)."""
+    def email(match):
+        local, domain = match.group(0).split('@')
+        return f"{local[0]}***@{domain}"
+
+    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', email, text)
+
+    def phone(match):
+        value = match.group(0)
+        if len(value.replace(' ', '').replace('-', '').replace('.', '')) >= 8:
+            return "[PHONE_XXX" + value[-3:] + "]"
+        return value
+
+    for pattern in (
+        r'\+387\s?\d{2}\s?\d{3}\s?\d{3,4}',
+        r'\b06[0-9]\s?\d{3}\s?\d{3,4}\b',
+        r'\+\d{1,4}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}',
+    ):
+        text = re.sub(pattern, phone, text)
+
+    def jmbg(match):
+        value = match.group(0)
+        if 1 <= int(value[0:2]) <= 31 and 1 <= int(value[2:4]) <= 12:
+            return f"{value[0:2]}***********"
+        return value
+
+    text = re.sub(r'\b\d{13}\b', jmbg, text)
+
+    def card(match):
+        digits = re.sub(r'[\s\-]', '', match.group(0))
+        if len(digits) == 16 and _luhn(digits):
+            return "****-****-****-" + digits[-4:]
+        return match.group(0)
+
+    text = re.sub(r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b', card, text)
+
+    def iban(match):
+        value = match.group(0)
+        digits = re.sub(r'[\s\-]', '', value)[2:]
+        return f"{value[0:2]}** **** **** **** {digits[-4:]}"
+
+    return re.sub(
+        r'\b[A-Z]{2}\d{2}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b', iban, text, flags=re.IGNORECASE
+    )
+
+
+FIXTURES = [
+    "Kontakt: ime.prezime+tag@firma.ba, tel. +387 61 123 079",
+    "Mobitel 061 234 567 ili 062-345-678",
+    "Pozovite +1 (555) 123-4567 ili +44 20 7946 0958",
+    "JMBG: 0101990123456, neispravan 3213990123456",
+    "Kartica 4111 1111 1111 1111, neispravna 4111-1111-1111-1112, bez razmaka 4111111111111111",
+    "Račun BA39 1290 0794 0102 8495 i DE89370400440532013000",
+    "IBAN sa Luhn ciframa: BA39 4111 1111 1111 1111 / ba39-4111-1111-1111-1111",
+    "Zalijepljeni brojevi 079+064491971 i +387 61 123 079+064491971",
+    "a@b.com,+387 62 111 222; datum 12.03.2024.",
+    "Bez PII: broj 12 i + (",
+]
+
+
+@pytest.mark.parametrize("text", FIXTURES)
+def test_matches_old_passes(text):
+    assert PIIScanner().mask(text)[0] == _old_mask(text)
+
+
+def test_iban_with_luhn_tail_is_masked_as_card():
+    masked, counts = PIIScanner().mask("BA39 4111 1111 1111 1111")
+    assert masked == "BA39 ****-****-****-1111"
+    assert counts["credit_cards"] == 1 and counts["iban"] == 0
+
+
+def test_glued_plus_is_kept():
+    assert PIIScanner().mask("079+064491971")[0] == "079+[PHONE_XXX971]"
+
+
+def test_mask_texts_counts():
+    masked, totals = mask_texts(PIIScanner().types, FIXTURES)
+    assert masked == [_old_mask(text) for text in FIXTURES]
+    assert list(totals) == list(PII_STATS_KEYS)
+    assert totals == {"emails": 2, "phones": 8, "jmbg": 1, "credit_cards": 4, "iban": 1}
+
+
+def test_disabled_types_are_left_intact():
+    text = "a@b.com 061 234 567"
+    assert PIIScanner(["phones"]).mask(text)[0] == "a@b.com [PHONE_XXX567]"
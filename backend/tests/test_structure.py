@@ -0,0 +1,76 @@
+import asyncio
+import random
+import re
+
+import pytest
+
+from app.agents.ingest.structure import StructureAgent
+from app.agents.ingest.types import DocumentSegment, IngestContext
+
+
+def _old_chunks(text: str, chunk_size: int, chunk_overlap: int):
+    """Raniji chunker: lista rečenica, chunk += " " + rečenica, overlap iz kopije kraja chunk-a."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+
+    def overlap(chunk: str) -> str:
+        if len(chunk) <= chunk_overlap:
+            return chunk
+        tail = chunk[-chunk_overlap:]
+        match = re.search(r'[.!?]\s+', tail)
+        return tail[match.end():] if match else tail
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if len(current) + len(sentence) > chunk_size and current:
+            chunks.append((current.strip(), len(current)))
+            current = overlap(current) + " " + sentence
+        else:
+            current += " " + sentence if current else sentence
+    if current.strip():
+        chunks.append((current.strip(), len(current)))
+    return chunks
+
+
+def _segments(seed: int):
+    rng = random.Random(seed)
+    words = [f"rijec{i}" for i in range(300)] + ["x" * 250]
+
+    def sentence() -> str:
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 40)))
+        return text + rng.choice([".", "!", "?", "", " .", "\n"])
+
+    segments = []
+    for i in range(rng.randint(1, 60)):
+        if rng.random() < 0.2:
+            text = rng.choice([f"Naslov {i}", f"  1.{i} Uvod \n"])
+            segments.append(DocumentSegment(text=text, segment_type="heading", level=1))
+        else:
+            text = rng.choice([" ", "\n", "  "]).join(sentence() for _ in range(rng.randint(1, 10)))
+            segments.append(DocumentSegment(text=text, segment_type="paragraph", level=0))
+    return segments
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (300, 50), (120, 10)])
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_old_chunker_on_multi_segment_text(seed, chunk_size, chunk_overlap):
+    agent = StructureAgent(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    text, headings = agent._join_segments(_segments(seed))
+    chunks = [(chunk.text, chunk.metadata["char_count"]) for chunk in agent._iter_chunks(text, headings)]
+    assert chunks == _old_chunks(text, chunk_size, chunk_overlap)
+
+
+def test_section_is_heading_of_first_new_sentence():
+    segments = [
+        DocumentSegment(text="Uvod", segment_type="heading", level=1),
+        DocumentSegment(text="Prva rečenica je ovdje. " * 4, segment_type="paragraph", level=0),
+        DocumentSegment(text="Zaključak", segment_type="heading", level=1),
+        DocumentSegment(text="Druga rečenica je ovdje. " * 4, segment_type="paragraph", level=0),
+    ]
+    context = IngestContext(document_id="d", file_path="", filename="f", user_id=None)
+    context.segments.extend(segments)
+    asyncio.run(StructureAgent(chunk_size=120, chunk_overlap=30)._create_chunks(context))
+
+    assert [chunk.chunk_index for chunk in context.chunks] == list(range(len(context.chunks)))
+    assert context.chunks[0].metadata["section"] == "Uvod"
+    assert context.chunks[-1].metadata["section"] == "Zaključak"
@@ -0,0 +1,15 @@
+-- Tenant scoping: denormalizovan owner_id na document_chunks
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS owner_id UUID REFERENCES users(id) ON DELETE CASCADE;
+
+-- Backfill iz documents.created_by za postojeće chunk-ove
+UPDATE document_chunks dc
+SET owner_id = d.created_by
+FROM documents d
+WHERE d.id = dc.document_id
+  AND dc.owner_id IS NULL;
+
+-- Mali tenanti: planner filtrira po owner_id pa radi exact scan nad tenant-ovim chunk-ovima.
+-- Veliki tenanti dobijaju parcijalni HNSW indeks (vidi app/core/indexes.ensure_tenant_vector_index).
+CREATE INDEX IF NOT EXISTS idx_chunks_owner_id ON document_chunks(owner_id);
@@ -0,0 +1,15 @@
+-- Matryoshka shortlist: prvih 256 dimenzija text-embedding-3 embeddinga (L2 normalizovano)
+-- 256 je default EMBEDDINGS_SHORTLIST_DIM; druga vrijednost: `python -m app.manage vector-index`
+-- mijenja tip kolone i ponovo računa vrijednosti (app/core/indexes.ensure_shortlist_column)
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f); zahtijeva pgvector >= 0.7
+ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS embedding_short vector(256);
+
+-- Backfill postojećih chunk-ova iz full-precision embeddinga
+UPDATE document_chunks
+SET embedding_short = l2_normalize(subvector(embedding, 1, 256))::vector(256)
+WHERE embedding IS NOT NULL
+  AND embedding_short IS NULL;
+
+-- ANN indeks nad embedding_short gradi app/core/indexes.ensure_vector_index na startu
+-- kada je VECTOR_SHORTLIST=matryoshka (idx_chunks_embedding tada pokriva shortlist kolonu).
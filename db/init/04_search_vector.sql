@@ -0,0 +1,27 @@
+-- Weighted full-text pretraga: tsvector se računa jednom pri upisu (GENERATED STORED)
+-- umjesto to_tsvector('simple', content) u WHERE i ts_rank za svaki red pri upitu.
+-- Težine: A = filename + naslov sekcije, B = keywords, D = tekst chunk-a
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+
+-- Backfill filename u metadata postojećih chunk-ova (novi ga dobijaju pri ingestu)
+UPDATE document_chunks dc
+SET metadata = COALESCE(dc.metadata, '{}'::jsonb) || jsonb_build_object('filename', d.filename)
+FROM documents d
+WHERE d.id = dc.document_id
+  AND NOT (COALESCE(dc.metadata, '{}'::jsonb) ? 'filename');
+
+-- ADD COLUMN ... STORED prepisuje tabelu i izračunava vrijednost za postojeće redove
+ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', COALESCE(metadata->>'filename', '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(metadata->>'section', '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(metadata->>'keywords', '')), 'B') ||
+        setweight(to_tsvector('simple', content), 'D')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_chunks_search_vector ON document_chunks USING gin (search_vector);
+
+-- Stari expression indeks više ne koristi nijedan upit
+DROP INDEX IF EXISTS idx_chunks_content_trgm;
+
+ANALYZE document_chunks;
@@ -0,0 +1,11 @@
+-- Strukturisani filteri pretrage (SearchFilters): doc_type, tags, document_date
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+
+-- @> containment (doc_type, tags) - jsonb_path_ops je manji i brži od default opclass-a
+CREATE INDEX IF NOT EXISTS idx_documents_metadata ON documents USING gin (metadata jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_chunks_metadata ON document_chunks USING gin (metadata jsonb_path_ops);
+
+-- Range filter po datumu dokumenta (ISO YYYY-MM-DD se poredi leksikografski)
+CREATE INDEX IF NOT EXISTS idx_documents_document_date ON documents ((metadata->>'document_date'));
+
+ANALYZE documents;
@@ -0,0 +1,6 @@
+-- Neighbour expansion: susjedni chunk-ovi hita (document_id, chunk_index BETWEEN lo AND hi)
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+CREATE INDEX IF NOT EXISTS idx_chunks_document_chunk ON document_chunks(document_id, chunk_index);
+
+-- Kompozitni indeks pokriva i upite samo po document_id
+DROP INDEX IF EXISTS idx_chunks_document_id;
@@ -0,0 +1,18 @@
+-- Cross-document deduplikacija: MinHash signature i LSH band hash-evi indeksiranih chunk-ova
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+CREATE TABLE IF NOT EXISTS chunk_minhash (
+    chunk_id UUID PRIMARY KEY REFERENCES document_chunks(id) ON DELETE CASCADE,
+    owner_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    -- uint32 x num_perm, little-endian
+    signature BYTEA NOT NULL
+);
+
+-- band_hash je uint64 reinterpretiran kao BIGINT
+CREATE TABLE IF NOT EXISTS chunk_lsh_bands (
+    band_hash BIGINT NOT NULL,
+    chunk_id UUID NOT NULL REFERENCES chunk_minhash(chunk_id) ON DELETE CASCADE,
+    PRIMARY KEY (band_hash, chunk_id)
+);
+
+-- CASCADE brisanje po chunk_id
+CREATE INDEX IF NOT EXISTS idx_chunk_lsh_bands_chunk ON chunk_lsh_bands(chunk_id);
@@ -0,0 +1,27 @@
+-- Cross-document dedup linkovi: pozicija dokumenta čiji je chunk duplikat već indeksiranog chunk-a
+-- Idempotentno - može se pokrenuti i nad postojećom bazom (psql -f)
+CREATE TABLE IF NOT EXISTS chunk_links (
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    -- Brisanje dokumenta kanonskog chunk-a prvo ga seli na jedan od linkova (chunk_store.promote_linked_chunks);
+    -- CASCADE važi samo kad se brišu i svi dokumenti koji ga linkuju
+    canonical_chunk_id UUID NOT NULL REFERENCES document_chunks(id) ON DELETE CASCADE,
+    owner_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    PRIMARY KEY (document_id, chunk_index)
+);
+
+-- Filteri (document_ids) i promocija idu od kanonskog chunk-a ka linkovima
+CREATE INDEX IF NOT EXISTS idx_chunk_links_canonical ON chunk_links(canonical_chunk_id);
+
+-- LSH šeme (bands x rows) pod kojima su upisani chunk_lsh_bands; promjena DEDUP_THRESHOLD
+-- dodaje novu šemu, a upiti hash-iraju signature i po starim šemama
+CREATE TABLE IF NOT EXISTS chunk_lsh_schemes (
+    lsh_bands SMALLINT NOT NULL,
+    lsh_rows SMALLINT NOT NULL,
+    PRIMARY KEY (lsh_bands, lsh_rows)
+);
+
+-- Band-ovi upisani prije ove tabele: default DEDUP_THRESHOLD=0.85, num_perm=128 -> 8 x 16
+INSERT INTO chunk_lsh_schemes (lsh_bands, lsh_rows)
+SELECT 8, 16 WHERE EXISTS (SELECT 1 FROM chunk_lsh_bands)
+ON CONFLICT DO NOTHING;
@@ -21,6 +21,8 @@ export interface ChatResponse {
   query: string
   verdict?: Verdict
   summary?: string
+  timings?: Record<string, any>
+  context_usage?: Record<string, any>
 }
 
 export interface SearchResponse {